@@ -0,0 +1,33 @@
+"""
+Скрипты для замеров производительности.
+Запуск из корня проекта: python -m benchmarks.<имя_скрипта>
+"""
+import os
+from contextlib import contextmanager
+
+
+def setup_django():
+    """
+    Инициализация django для запуска бенчмарка как отдельного скрипта.
+    """
+
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """
+    Временная тестовая база данных, которая удаляется после замера.
+    """
+
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,118 @@
+"""
+Сравнение расчета статистики выполнения привычек на NumPy (habits.analytics) с наивной агрегацией через ORM
+(отдельные запросы по каждой привычке).
+
+Пример: python -m benchmarks.analytics --habits 100 --days 1000
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from benchmarks import setup_django, test_database
+
+END = date(2023, 12, 31)
+
+
+def create_completions(habits, days):
+    from django.db import connection
+
+    from habits.models import Habit, HabitCompletion
+    from users.models import User
+
+    user = User.objects.create(email='bench@test.ru')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {Habit._meta.db_table} '
+            '(user_id, place, time_to_action, action, is_pleasant_habit, periodicity, time_to_complete, '
+            'is_publish, utc_minute, updated_at, current_streak, best_streak) '
+            "SELECT %s, 'дома', make_time(n %% 24, 0, 0), 'зарядка ' || n, false, "
+            "CASE WHEN n %% 5 = 0 THEN 'monday' ELSE 'daily' END, '00:02', false, 0, now(), 0, 0 "
+            'FROM generate_series(1, %s) AS n',
+            [user.pk, habits]
+        )
+        # пропускаем каждый седьмой день, чтобы распределение по дням недели было неравномерным
+        cursor.execute(
+            f'INSERT INTO {HabitCompletion._meta.db_table} (habit_id, date, created_at) '
+            'SELECT habit.id, %s::date - day, now() '
+            f'FROM {Habit._meta.db_table} AS habit CROSS JOIN generate_series(0, %s) AS day '
+            'WHERE (habit.id + day) %% 7 <> 0',
+            [END, days - 1]
+        )
+        cursor.execute(f'ANALYZE {HabitCompletion._meta.db_table}')
+    return user
+
+
+def naive_analytics(user, habits, start, end):
+    """
+    Та же статистика через агрегацию ORM: по несколько запросов на каждую привычку.
+    """
+
+    from django.db.models import Count
+    from django.db.models.functions import ExtractIsoWeekDay, TruncWeek
+
+    from habits.models import HabitCompletion
+    from habits.schedule import WEEKDAYS
+
+    result = {'weekdays': [0] * 7, 'hours': [0] * 24, 'habits': []}
+    completed_total = expected_total = 0
+    for habit in habits:
+        completions = HabitCompletion.objects.filter(habit_id=habit['pk'], date__range=(start, end))
+        count = completions.count()
+        if habit['periodicity'] in WEEKDAYS:
+            completed = completions.annotate(week=TruncWeek('date')).values('week').distinct().count()
+            expected = ((end - timedelta(days=end.weekday())) - (start - timedelta(days=start.weekday()))).days // 7 + 1
+        else:
+            completed = count
+            expected = (end - start).days + 1
+        weekdays = [0] * 7
+        for row in completions.annotate(weekday=ExtractIsoWeekDay('date')).values('weekday').annotate(n=Count('pk')):
+            weekdays[row['weekday'] - 1] = row['n']
+            result['weekdays'][row['weekday'] - 1] += row['n']
+        result['hours'][habit['time_to_action'].hour] += count
+        completed_total += completed
+        expected_total += expected
+        result['habits'].append({'pk': habit['pk'], 'completions': count, 'completion_rate': completed / expected,
+                                 'weekdays': weekdays})
+    result['completion_rate'] = completed_total / expected_total
+    return result
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--habits', type=int, default=100)
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from habits.analytics import habit_analytics
+    from habits.models import Habit, HabitCompletion
+
+    with test_database():
+        user = create_completions(args.habits, args.days)
+        start = END - timedelta(days=args.days - 1)
+        habits = list(Habit.objects.filter(user=user).order_by('pk').values(
+            'pk', 'action', 'periodicity', 'time_to_action'
+        ))
+        print(f'выполнений: {HabitCompletion.objects.count()}')
+
+        numpy_time, fast = measure(lambda: habit_analytics(habits, start, END), args.repeat)
+        naive_time, naive = measure(lambda: naive_analytics(user, habits, start, END), args.repeat)
+
+        assert fast['weekdays'] == naive['weekdays'] and fast['hours'] == naive['hours']
+        print(f'NumPy: {numpy_time * 1000:8.1f} мс')
+        print(f'ORM:   {naive_time * 1000:8.1f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Потоковая выгрузка привычек пользователя (habit/export/) в сравнении с обходом списка привычек
+по страницам: время до первого байта, общее время, размер ответа и пик памяти Python.
+
+Пример: python -m benchmarks.export --habits 5000 --days 365
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks import setup_django, test_database
+from benchmarks.analytics import create_completions
+
+
+def measure_export(client, params, headers):
+    from django.urls import reverse
+
+    started = time.perf_counter()
+    response = client.get(reverse('habits:habit-export'), params, HTTP_HOST='localhost', **headers)
+    content = iter(response.streaming_content)
+    size = len(next(content))
+    first_byte = time.perf_counter() - started
+    size += sum(len(chunk) for chunk in content)
+    total = time.perf_counter() - started
+    return first_byte, total, size
+
+
+def measure_pages(client, page_size):
+    from django.urls import reverse
+
+    started = time.perf_counter()
+    url, params, size, first_byte = reverse('habits:habit-list'), {'page_size': page_size}, 0, None
+    while url:
+        response = client.get(url, params, HTTP_HOST='localhost')
+        first_byte = first_byte or time.perf_counter() - started
+        size += len(response.content)
+        url, params = response.json()['next'], None
+    total = time.perf_counter() - started
+    return first_byte, total, size
+
+
+def peak_memory(function):
+    """
+    Пик памяти Python при выполнении function. Замеряется отдельным проходом: tracemalloc сильно замедляет код.
+    """
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--habits', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from rest_framework.test import APIClient
+
+    from habits.models import HabitCompletion
+
+    with test_database():
+        user = create_completions(args.habits, args.days)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        print(f'привычек: {args.habits}, выполнений: {HabitCompletion.objects.count()}')
+
+        cases = [
+            ('NDJSON', lambda: measure_export(client, {}, {})),
+            ('NDJSON gzip', lambda: measure_export(client, {}, {'HTTP_ACCEPT_ENCODING': 'gzip'})),
+            ('CSV', lambda: measure_export(client, {'format': 'csv'}, {})),
+            ('CSV gzip', lambda: measure_export(client, {'format': 'csv'}, {'HTTP_ACCEPT_ENCODING': 'gzip'})),
+            (f'список по {args.page_size} (без выполнений)', lambda: measure_pages(client, args.page_size)),
+        ]
+        print(f'{"":32} {"TTFB, мс":>10} {"всего, мс":>10} {"размер, КБ":>11} {"пик памяти, КБ":>15}')
+        for name, function in cases:
+            first_byte, total, size = function()
+            peak = peak_memory(function)
+            print(f'{name:32} {first_byte * 1000:10.1f} {total * 1000:10.1f} {size / 1024:11.0f} {peak / 1024:15.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик запросов локального telegram-сервера.
+    Поддерживает методы sendMessage и getUpdates, параметры принимаются как из query string, так и из тела запроса.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.handle_method()
+
+    def do_POST(self):
+        self.handle_method()
+
+    def handle_method(self):
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length).decode()
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                params.update(json.loads(body))
+            else:
+                params.update(parse_qsl(body))
+
+        method = parts.path.rsplit('/', 1)[-1]
+        status, payload = self.server.telegram.dispatch(method, params)
+        self.send_json(status, payload)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTelegramServer:
+    """
+    Локальный сервер, имитирующий Bot API telegram, для тестов и бенчмарков.
+
+    latency - искусственная задержка ответа в секундах;
+    failing_chats - chat_id, для которых сервер отвечает ошибкой 400;
+    global_rate, chat_rate - ограничения сообщений в секунду всего и в один чат,
+    при превышении сервер, как и telegram, отвечает 429 с retry_after.
+    """
+
+    def __init__(self, latency=0.0, failing_chats=(), global_rate=None, chat_rate=None):
+        self.latency = latency
+        self.failing_chats = {str(chat_id) for chat_id in failing_chats}
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.sent_at = []
+        self.rate_limited = 0
+        self.messages = []
+        self.updates = []
+        self.requests = []
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeTelegramHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.telegram = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def dispatch(self, method, params):
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.requests.append((method, params))
+
+        if method == 'sendMessage':
+            return self.send_message(params)
+        if method == 'getUpdates':
+            return self.get_updates(params)
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+
+    def send_message(self, params):
+        chat_id = str(params.get('chat_id'))
+        if chat_id in self.failing_chats:
+            return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: chat not found'}
+
+        with self.lock:
+            if self.is_rate_limited(chat_id):
+                self.rate_limited += 1
+                return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                             'parameters': {'retry_after': 1}}
+
+            self.sent_at.append((time.monotonic(), chat_id))
+            self.messages.append((chat_id, params.get('text')))
+            message_id = len(self.messages)
+        return 200, {'ok': True, 'result': {'message_id': message_id, 'chat': {'id': chat_id}}}
+
+    def is_rate_limited(self, chat_id):
+        """
+        Проверка ограничений по сообщениям, отправленным за последнюю секунду.
+        """
+
+        window_start = time.monotonic() - 1
+        self.sent_at = [(sent_at, chat) for sent_at, chat in self.sent_at if sent_at > window_start]
+        recent = [chat for _, chat in self.sent_at]
+        if self.global_rate is not None and len(recent) >= self.global_rate:
+            return True
+        return self.chat_rate is not None and recent.count(chat_id) >= self.chat_rate
+
+    def add_message_update(self, user_id, username, text='/start'):
+        """
+        Добавление входящего сообщения от пользователя в лог обновлений бота.
+        """
+
+        with self.lock:
+            update_id = len(self.updates) + 1
+            self.updates.append({
+                'update_id': update_id,
+                'message': {'message_id': update_id, 'from': {'id': user_id, 'username': username}, 'text': text},
+            })
+        return update_id
+
+    def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        with self.lock:
+            result = [update for update in self.updates if update['update_id'] >= offset]
+        return 200, {'ok': True, 'result': result}
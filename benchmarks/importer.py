@@ -0,0 +1,76 @@
+"""
+Скорость загрузки привычек из локального файла (habits.importer) в NDJSON и CSV при разном размере пачки.
+
+Пример: python -m benchmarks.importer --rows 100000 --batch-sizes 500 1000 5000
+"""
+import argparse
+import csv
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import setup_django, test_database
+
+FIELDS = ('place', 'time_to_action', 'action', 'is_pleasant_habit', 'periodicity', 'reward', 'time_to_complete',
+          'is_publish')
+
+
+def habit_rows(count):
+    periodicity = ('daily', 'monday', 'friday')
+    for n in range(count):
+        yield {
+            'place': 'дома', 'time_to_action': f'{n % 24:02}:{n % 60:02}', 'action': f'зарядка {n}',
+            'is_pleasant_habit': False, 'periodicity': periodicity[n % 3], 'reward': 'чай' if n % 2 else None,
+            # каждая сотая строка с ошибкой: время выполнения больше 120 секунд
+            'time_to_complete': '00:05:00' if n % 100 == 99 else '00:01:30', 'is_publish': False,
+        }
+
+
+def write_files(directory, count):
+    ndjson_path, csv_path = Path(directory) / 'habits.ndjson', Path(directory) / 'habits.csv'
+    with ndjson_path.open('w') as ndjson_file, csv_path.open('w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, FIELDS)
+        writer.writeheader()
+        for row in habit_rows(count):
+            ndjson_file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            writer.writerow(row)
+    return ndjson_path, csv_path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[500, 1000, 5000])
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+
+    from habits.importer import run_import
+    from habits.models import Habit, HabitImport
+    from users.models import User
+
+    with test_database(), tempfile.TemporaryDirectory() as directory:
+        user = User.objects.create(email='bench@test.ru')
+        files = write_files(directory, args.rows)
+
+        print(f'{"":16} {"пачка":>6} {"время, с":>9} {"строк/с":>9} {"загружено":>10} {"ошибок":>7}')
+        for path in files:
+            file_format = path.suffix[1:]
+            for batch_size in args.batch_sizes:
+                habit_import = HabitImport.objects.create(user=user, format=file_format)
+                started = time.perf_counter()
+                with path.open('rb') as stream:
+                    run_import(habit_import, stream, batch_size)
+                elapsed = time.perf_counter() - started
+                print(f'{file_format:16} {batch_size:6} {elapsed:9.2f} {args.rows / elapsed:9.0f} '
+                      f'{habit_import.imported:10} {habit_import.failed:7}')
+                # без сигналов удаления ORM, которые загружают каждую привычку
+                with connection.cursor() as cursor:
+                    cursor.execute(f'TRUNCATE {Habit._meta.db_table} CASCADE')
+
+
+if __name__ == '__main__':
+    main()
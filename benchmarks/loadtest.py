@@ -0,0 +1,299 @@
+"""
+Нагрузочный тест API по сценариям на запущенном стенде (docker compose up): регистрация, получение токена,
+CRUD привычек и лента публичных привычек. Виртуальные пользователи работают в потоках, у каждого своя
+сессия requests, свой аккаунт и заранее созданные привычки; последовательность запросов задается --seed.
+По каждому эндпоинту считаются количество запросов, ошибки, запросы в секунду и задержки p50/p95/p99.
+Результат сохраняется как JSON-база (--save) и сравнивается с базой другого коммита (--compare):
+при росте p95 или падении пропускной способности больше --threshold скрипт завершается с кодом 1.
+Сравнивать имеет смысл запуски на одной машине с одинаковыми --users, --duration и --seed.
+
+Пример:
+    docker compose up -d
+    python -m benchmarks.loadtest --users 20 --duration 60 --save
+    python -m benchmarks.loadtest --users 20 --duration 60 --compare benchmarks/baselines/<коммит>.json
+"""
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from uuid import uuid4
+
+import requests
+
+BASELINES_DIR = Path(__file__).parent / 'baselines'
+SEARCH_WORDS = ('зарядка', 'вода', 'прогулка', 'книга', 'парк')
+PLACES = ('дома', 'в парке', 'на работе', 'в спортзале')
+
+# сценарий -> вес операции (доля запросов)
+SCENARIOS = {
+    'mixed': {
+        'register': 1, 'token': 2, 'habit_list': 25, 'habit_retrieve': 15, 'habit_create': 10, 'habit_update': 8,
+        'habit_delete': 4, 'publish_feed': 25, 'publish_search': 10,
+    },
+    'read': {'habit_list': 35, 'habit_retrieve': 25, 'publish_feed': 30, 'publish_search': 10},
+    'write': {'habit_create': 50, 'habit_update': 35, 'habit_delete': 15},
+    'auth': {'register': 30, 'token': 70},
+}
+
+
+class Recorder:
+    """
+    Задержки и ошибки по эндпоинтам, общие для всех виртуальных пользователей.
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, seconds, ok):
+        with self.lock:
+            if ok:
+                self.latencies[endpoint].append(seconds)
+            else:
+                self.errors[endpoint] += 1
+
+    def summary(self, duration):
+        result = {}
+        for endpoint in sorted({*self.latencies, *self.errors}):
+            latencies = sorted(self.latencies[endpoint])
+            result[endpoint] = {
+                'requests': len(latencies),
+                'errors': self.errors[endpoint],
+                'rps': round(len(latencies) / duration, 2),
+                **{f'p{p}': round(percentile(latencies, p) * 1000, 2) for p in (50, 95, 99)},
+            }
+        return result
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[p - 1]
+
+
+class VirtualUser:
+    """
+    Пользователь API: регистрируется, получает токен, создает привычки и выполняет операции сценария.
+    """
+
+    password = 'load-test-password'
+
+    def __init__(self, base_url, recorder, rng, run_id, number):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.rng = rng
+        self.run_id = run_id
+        self.number = number
+        self.session = requests.Session()
+        self.email = self.new_email()
+        self.habit_pks = []
+        self.created = 0
+
+    def new_email(self):
+        return f'load-{self.run_id}-{self.number}-{uuid4().hex[:8]}@test.ru'
+
+    def call(self, endpoint, method, path, expected, record=True, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', timeout=30, **kwargs)
+        except requests.RequestException:
+            response = None
+        elapsed = time.perf_counter() - started
+        ok = response is not None and response.status_code == expected
+        if record:
+            self.recorder.add(endpoint, elapsed, ok)
+        return response if ok else None
+
+    def habit_data(self):
+        self.created += 1
+        return {
+            'place': self.rng.choice(PLACES),
+            'time_to_action': f'{self.rng.randrange(24):02}:{self.rng.randrange(0, 60, 5):02}:00',
+            'action': f'{self.rng.choice(SEARCH_WORDS)} {self.number}-{self.created}',
+            'is_publish': self.rng.random() < 0.5,
+        }
+
+    def setup(self, habits):
+        """
+        Аккаунт, токен и начальные привычки. Запросы подготовки не попадают в результаты.
+        """
+
+        self.call('register', 'POST', '/user/register/', 201, record=False,
+                  json={'email': self.email, 'password': self.password})
+        self.login(record=False)
+        for _ in range(habits):
+            self.habit_create(record=False)
+
+    def login(self, record=True):
+        response = self.call('token', 'POST', '/user/token/', 200, record=record,
+                             json={'email': self.email, 'password': self.password})
+        if response is not None:
+            self.session.headers['Authorization'] = f'Bearer {response.json()["access"]}'
+
+    def register(self):
+        self.call('register', 'POST', '/user/register/', 201,
+                  json={'email': self.new_email(), 'password': self.password})
+
+    def token(self):
+        self.login()
+
+    def habit_list(self):
+        self.call('habit_list', 'GET', '/habit/', 200, params={'page_size': 20})
+
+    def habit_retrieve(self):
+        if self.habit_pks:
+            self.call('habit_retrieve', 'GET', f'/habit/{self.rng.choice(self.habit_pks)}/', 200)
+
+    def habit_create(self, record=True):
+        response = self.call('habit_create', 'POST', '/habit/', 201, record=record, json=self.habit_data())
+        if response is not None:
+            self.habit_pks.append(response.json()['pk'])
+
+    def habit_update(self):
+        if self.habit_pks:
+            self.call('habit_update', 'PATCH', f'/habit/{self.rng.choice(self.habit_pks)}/', 200,
+                      json={'place': self.rng.choice(PLACES), 'is_publish': self.rng.random() < 0.5})
+
+    def habit_delete(self):
+        # у пользователя остается хотя бы одна привычка для чтения и изменения
+        if len(self.habit_pks) > 1:
+            pk = self.habit_pks.pop(self.rng.randrange(len(self.habit_pks)))
+            self.call('habit_delete', 'DELETE', f'/habit/{pk}/', 204)
+
+    def publish_feed(self):
+        self.call('publish_feed', 'GET', '/habit/publish/', 200, params={'page_size': 20})
+
+    def publish_search(self):
+        self.call('publish_search', 'GET', '/habit/publish/', 200, params={'search': self.rng.choice(SEARCH_WORDS)})
+
+    def run(self, weights, deadline, think):
+        operations, cum_weights = list(weights), list(weights.values())
+        while time.perf_counter() < deadline:
+            getattr(self, self.rng.choices(operations, weights=cum_weights)[0])()
+            if think:
+                time.sleep(self.rng.uniform(0, 2 * think))
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_load(args):
+    recorder = Recorder()
+    run_id = uuid4().hex[:6]
+    users = [
+        VirtualUser(args.base_url, recorder, random.Random(f'{args.seed}:{number}'), run_id, number)
+        for number in range(args.users)
+    ]
+
+    started = time.perf_counter()
+    setup_threads = [threading.Thread(target=user.setup, args=(args.habits,)) for user in users]
+    for thread in setup_threads:
+        thread.start()
+    for thread in setup_threads:
+        thread.join()
+    print(f'подготовка: {args.users} пользователей по {args.habits} привычек за {time.perf_counter() - started:.1f} с')
+
+    weights = SCENARIOS[args.scenario]
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=user.run, args=(weights, deadline, args.think / 1000)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    endpoints = recorder.summary(duration)
+
+    return {
+        'commit': current_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'base_url': args.base_url,
+        'scenario': args.scenario,
+        'users': args.users,
+        'duration': round(duration, 1),
+        'seed': args.seed,
+        'rps': round(sum(stats['rps'] for stats in endpoints.values()), 2),
+        'endpoints': endpoints,
+    }
+
+
+def print_results(result):
+    print(f'{"":16} {"запросов":>9} {"ошибок":>7} {"запр/с":>8} {"p50, мс":>8} {"p95, мс":>8} {"p99, мс":>8}')
+    for endpoint, stats in result['endpoints'].items():
+        print(f'{endpoint:16} {stats["requests"]:9} {stats["errors"]:7} {stats["rps"]:8.1f} '
+              f'{stats["p50"]:8.1f} {stats["p95"]:8.1f} {stats["p99"]:8.1f}')
+    print(f'{"всего":16} {"":9} {"":7} {result["rps"]:8.1f}')
+
+
+def compare(result, baseline, threshold):
+    """
+    Сравнение с базой: изменение p95 и пропускной способности по каждому эндпоинту.
+    Возвращает список эндпоинтов с регрессией.
+    """
+
+    print(f'\nсравнение с {baseline.get("commit")} ({baseline.get("created_at")}), порог {threshold:.0%}')
+    print(f'{"":16} {"p95 база":>9} {"p95":>8} {"изм.":>7} {"запр/с база":>12} {"запр/с":>8} {"изм.":>7}')
+    regressions = []
+    for endpoint, stats in result['endpoints'].items():
+        base = baseline['endpoints'].get(endpoint)
+        if base is None:
+            continue
+        p95_change = stats['p95'] / base['p95'] - 1 if base['p95'] else 0.0
+        rps_change = stats['rps'] / base['rps'] - 1 if base['rps'] else 0.0
+        regressed = p95_change > threshold or rps_change < -threshold or stats['errors'] > base['errors']
+        if regressed:
+            regressions.append(endpoint)
+        print(f'{endpoint:16} {base["p95"]:9.1f} {stats["p95"]:8.1f} {p95_change:+7.0%} '
+              f'{base["rps"]:12.1f} {stats["rps"]:8.1f} {rps_change:+7.0%}{"  регрессия" if regressed else ""}')
+    rps_change = result['rps'] / baseline['rps'] - 1 if baseline['rps'] else 0.0
+    print(f'{"всего":16} {"":9} {"":8} {"":7} {baseline["rps"]:12.1f} {result["rps"]:8.1f} {rps_change:+7.0%}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--scenario', choices=SCENARIOS, default='mixed')
+    parser.add_argument('--users', type=int, default=20, help='Количество виртуальных пользователей (потоков).')
+    parser.add_argument('--duration', type=float, default=60, help='Длительность замера в секундах.')
+    parser.add_argument('--habits', type=int, default=10, help='Привычек у каждого пользователя до замера.')
+    parser.add_argument('--think', type=float, default=0, help='Средняя пауза между запросами в миллисекундах.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', nargs='?', const='', help='Сохранить результат как базу (по умолчанию '
+                                                            'benchmarks/baselines/<коммит>-<сценарий>.json).')
+    parser.add_argument('--compare', help='JSON-база для сравнения.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Допустимое ухудшение (доля).')
+    args = parser.parse_args()
+
+    result = run_load(args)
+    print_results(result)
+
+    if args.save is not None:
+        path = Path(args.save or BASELINES_DIR / f'{result["commit"] or "local"}-{args.scenario}.json')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(result, ensure_ascii=False, indent=2))
+        print(f'\nрезультат сохранен в {path}')
+
+    if args.compare:
+        regressions = compare(result, json.loads(Path(args.compare).read_text()), args.threshold)
+        if regressions:
+            sys.exit(f'регрессия: {", ".join(regressions)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Сравнение постраничной (OFFSET) и курсорной (keyset) пагинации публичных привычек на разной глубине.
+Строки создаются одним запросом generate_series во временной базе данных.
+
+Пример: python -m benchmarks.pagination --habits 1000000 --depths 1 100 10000 100000
+"""
+import argparse
+import time
+from base64 import b64encode
+from urllib.parse import urlencode
+
+from benchmarks import setup_django, test_database
+
+
+def create_habits(count):
+    from django.db import connection
+
+    from habits.models import Habit
+    from users.models import User
+
+    user = User.objects.create(email='bench@test.ru')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {Habit._meta.db_table} '
+            '(user_id, place, time_to_action, action, is_pleasant_habit, periodicity, time_to_complete, '
+            'is_publish, utc_minute, updated_at, current_streak, best_streak) '
+            "SELECT %s, 'дома', '08:00', 'зарядка ' || n, false, 'daily', '00:02', true, 300, now(), 0, 0 "
+            'FROM generate_series(1, %s) AS n',
+            [user.pk, count]
+        )
+        cursor.execute(f'ANALYZE {Habit._meta.db_table}')
+
+
+def cursor_for(position):
+    """
+    Курсор DRF, указывающий на страницу после строки с pk равным position.
+    """
+
+    return b64encode(urlencode({'p': position}).encode('ascii')).decode('ascii')
+
+
+def measure(paginator_class, params, repeat):
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from habits.models import Habit
+
+    request = Request(APIRequestFactory().get('/habits/publish/', params, HTTP_HOST='localhost'))
+    queryset = Habit.objects.filter(is_publish=True).order_by('pk')
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        paginator = paginator_class()
+        page = paginator.paginate_queryset(queryset, request)
+        paginator.get_paginated_response([habit.pk for habit in page])
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--habits', type=int, default=1000000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from habits.paginators import HabitCursorPaginator, MyPaginator
+
+    with test_database():
+        create_habits(args.habits)
+
+        for depth in args.depths:
+            if (depth - 1) * args.page_size >= args.habits:
+                continue
+            offset_ms = measure(MyPaginator, {'page': depth, 'page_size': args.page_size}, args.repeat)
+            cursor_ms = measure(HabitCursorPaginator, {
+                'cursor': cursor_for((depth - 1) * args.page_size), 'page_size': args.page_size
+            }, args.repeat)
+            print(f'страница {depth:<7} OFFSET: {offset_ms:8.2f} мс   keyset: {cursor_ms:8.2f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Время ответа /api/schema/: генерация схемы на каждый запрос (SpectacularAPIView)
+и готовая схема из файла build_schema (config.schema.CachedSchemaView), с gzip и без.
+
+Пример: python -m benchmarks.schema --repeat 20
+"""
+import argparse
+import io
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import setup_django
+
+
+def measure(view, request_factory, repeat, **headers):
+    timings = []
+    for _ in range(repeat):
+        request = request_factory.get('/api/schema/', **headers)
+        started = time.perf_counter()
+        response = view(request)
+        if hasattr(response, 'render'):
+            response.render()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, len(response.content)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.management import call_command
+    from django.test import override_settings
+    from drf_spectacular.views import SpectacularAPIView
+    from rest_framework.test import APIRequestFactory
+
+    from config.schema import CachedSchemaView, schema_document
+
+    request_factory = APIRequestFactory()
+    with tempfile.TemporaryDirectory() as directory, override_settings(SCHEMA_DIR=Path(directory)):
+        started = time.perf_counter()
+        call_command('build_schema', stdout=io.StringIO())
+        print(f'build_schema: {(time.perf_counter() - started) * 1000:.0f} мс')
+        schema_document.cache_clear()
+
+        cases = [
+            ('генерация на запрос', SpectacularAPIView.as_view(), {}),
+            ('файл', CachedSchemaView.as_view(), {}),
+            ('файл, gzip', CachedSchemaView.as_view(), {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+        ]
+        print(f'{"":22} {"мс":>8} {"байт":>8}')
+        for name, view, headers in cases:
+            ms, size = measure(view, request_factory, args.repeat, **headers)
+            print(f'{name:22} {ms:8.2f} {size:8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Поиск по публичным привычкам (habits.search) на большом каталоге: время запроса страницы с подсчетом количества
+(не больше SEARCH_MAX_RESULTS) для редких и частых слов. Если в PostgreSQL есть pg_trgm, действие и место
+сравниваются и по триграммам. Действия собираются из словаря: 40 глаголов, 250 существительных, 50 мест.
+
+Пример: python -m benchmarks.search --habits 1000000
+"""
+import argparse
+import time
+
+from benchmarks import setup_django, test_database
+
+VERBS = (
+    'читать', 'писать', 'бегать', 'гулять', 'убирать', 'готовить', 'слушать', 'смотреть', 'учить', 'повторять',
+    'рисовать', 'играть', 'пить', 'мыть', 'поливать', 'кормить', 'проверять', 'записывать', 'планировать', 'считать',
+    'разбирать', 'складывать', 'гладить', 'чистить', 'растягивать', 'качать', 'собирать', 'звонить', 'отвечать',
+    'медитировать', 'дышать', 'плавать', 'танцевать', 'петь', 'вязать', 'шить', 'ремонтировать', 'печь', 'жарить',
+    'варить',
+)
+NOUNS = tuple(f'{stem}{suffix}' for stem in (
+    'книг', 'стать', 'письм', 'зарядк', 'посуд', 'обед', 'музык', 'фильм', 'язык', 'слов', 'картин', 'игр', 'вод',
+    'цвет', 'кот', 'почт', 'дневник', 'план', 'бюджет', 'шкаф', 'бель', 'рубашк', 'обув', 'пресс', 'ягод', 'мам',
+    'друг', 'дыхани', 'бассейн', 'песн', 'шарф', 'плать', 'кран', 'хлеб', 'котлет', 'суп', 'газет', 'журнал',
+    'стих', 'задач', 'отчет', 'код', 'тест', 'урок', 'лекци', 'курс', 'новост', 'подкаст', 'сериал', 'гитар',
+) for suffix in ('а', 'у', 'ами', 'ой', 'е'))
+PLACES = tuple(f'{place} {n}' for place in ('дома', 'офисе', 'парке', 'спортзале', 'кухне') for n in range(10))
+
+
+def create_habits(count):
+    from django.db import connection
+
+    from habits.models import Habit
+    from users.models import User
+
+    user = User.objects.create(email='bench@test.ru')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {Habit._meta.db_table} '
+            '(user_id, place, time_to_action, action, is_pleasant_habit, periodicity, time_to_complete, '
+            'is_publish, utc_minute, updated_at, current_streak, best_streak) '
+            "SELECT %s, (%s::text[])[1 + n %% %s], '08:00', "
+            "(%s::text[])[1 + n %% %s] || ' ' || (%s::text[])[1 + (n / %s) %% %s], "
+            "false, 'daily', '00:02', true, 300, now(), 0, 0 "
+            'FROM generate_series(1, %s) AS n',
+            [user.pk, list(PLACES), len(PLACES), list(VERBS), len(VERBS), list(NOUNS), len(VERBS), len(NOUNS), count]
+        )
+        cursor.execute(f'VACUUM ANALYZE {Habit._meta.db_table}')
+
+
+def measure(text, page, repeat):
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from habits.models import Habit
+    from habits.paginators import SearchPaginator
+    from habits.search import search_habits
+    from habits.serializers import HabitReadSerializer
+
+    request = Request(APIRequestFactory().get('/habits/publish/', {'page': page}, HTTP_HOST='localhost'))
+    queryset = HabitReadSerializer.values(Habit.objects.filter(is_publish=True))
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        paginator = SearchPaginator()
+        rows = paginator.paginate_queryset(search_habits(queryset, text), request)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, paginator.page.paginator.count, [row['action'] for row in rows][:2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--habits', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+
+    from habits.search import trigram_available
+
+    queries = [
+        ('редкое сочетание', 'читать книгами'),
+        ('существительное', 'статьей'),
+        ('место', 'парке 7'),
+        ('частый глагол', 'варить'),
+        ('страница 100', 'статьей', 100),
+        # находятся только по похожим словам словаря (pg_trgm)
+        ('опечатка', 'ремонтирвать шарфом'),
+        ('начало слова', 'медитир'),
+    ]
+
+    with test_database():
+        started = time.perf_counter()
+        create_habits(args.habits)
+        print(f'привычек: {args.habits}, создание с поисковым вектором: {time.perf_counter() - started:.0f} с, '
+              f'pg_trgm: {"да" if trigram_available() else "нет"}')
+        connection.force_debug_cursor = False
+
+        print(f'{"":20} {"запрос":20} {"найдено":>8} {"мс":>7}  первые результаты')
+        for name, text, *page in queries:
+            ms, count, first = measure(text, page[0] if page else 1, args.repeat)
+            print(f'{name:20} {text:20} {count:8} {ms:7.1f}  {", ".join(first)}')
+
+
+if __name__ == '__main__':
+    main()
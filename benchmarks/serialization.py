@@ -0,0 +1,53 @@
+"""
+Сравнение сериализации страницы привычек через HabitSerializer и быстрый HabitReadSerializer по строкам values().
+Замеряется как одна сериализация, так и чтение страницы из базы вместе с сериализацией.
+
+Пример: python -m benchmarks.serialization --rows 10000
+"""
+import argparse
+import time
+
+from benchmarks import setup_django, test_database
+from benchmarks.pagination import create_habits
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from habits.models import Habit
+    from habits.serializers import HabitReadSerializer, HabitSerializer
+
+    with test_database():
+        create_habits(args.rows)
+        queryset = Habit.objects.order_by('pk')[:args.rows]
+        instances = list(queryset)
+        rows = list(HabitReadSerializer.values(queryset))
+
+        cases = [
+            ('HabitSerializer', lambda: HabitSerializer(instances, many=True).data),
+            ('HabitReadSerializer', lambda: HabitReadSerializer(rows, many=True).data),
+            ('HabitSerializer + запрос', lambda: HabitSerializer(list(queryset.all()), many=True).data),
+            ('HabitReadSerializer + запрос',
+             lambda: HabitReadSerializer(list(HabitReadSerializer.values(queryset.all())), many=True).data),
+        ]
+        for name, function in cases:
+            elapsed = measure(function, args.repeat)
+            print(f'{name:<30} {elapsed * 1000:8.1f} мс  {args.rows / elapsed:10.0f} строк/c')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Замер масштабирования рассылки уведомлений по количеству воркеров celery.
+Используется брокер в памяти, воркеры запускаются в текущем процессе, telegram имитируется локальным сервером.
+
+Пример: python -m benchmarks.sharded_dispatch --habits 2000 --workers 1 2 4 8
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from benchmarks import setup_django, test_database
+from benchmarks.fake_telegram import FakeTelegramServer
+
+# 08:00 по Москве, часовой пояс пользователей по умолчанию
+MOMENT = datetime(2023, 12, 4, 5, 0, tzinfo=timezone.utc)
+
+
+def create_habits(count):
+    from habits.models import Habit
+    from users.models import User
+
+    users = User.objects.bulk_create(
+        User(email=f'bench{index}@test.ru', telegram_id=index + 1) for index in range(count)
+    )
+    habits = [Habit(user=user, place='дома', time_to_action='08:00:00', action='зарядка') for user in users]
+    # bulk_create не вызывает save(), поэтому слоты UTC рассчитываются явно
+    for habit in habits:
+        habit.update_schedule(MOMENT)
+    Habit.objects.bulk_create(habits)
+
+
+def run(workers, shards, server):
+    from celery.contrib.testing.worker import start_worker
+    from django.test import override_settings
+
+    from config.celery import app
+    from habits.models import TaskCheckpoint
+    from habits.tasks import TELEGRAM_DISPATCH_WATERMARK, telegram_integration
+
+    # каждый прогон рассылает одну и ту же минуту заново
+    TaskCheckpoint.objects.filter(name=TELEGRAM_DISPATCH_WATERMARK).delete()
+
+    with override_settings(TG_URL=server.url, TG_SEND_SHARDS=shards, TG_SEND_CONCURRENCY=4,
+                           TG_RATE_LIMIT_GLOBAL=10 ** 6, TG_RATE_LIMIT_PER_CHAT=10 ** 6), \
+            patch('habits.tasks.timezone') as mock_timezone, \
+            start_worker(app, pool='threads', concurrency=workers, perform_ping_check=False):
+        mock_timezone.now.return_value = MOMENT
+        server.messages.clear()
+
+        started = time.perf_counter()
+        telegram_integration.delay().get(disable_sync_subtasks=False)
+        while len(server.messages) < server.expected:
+            time.sleep(0.01)
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--habits', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--shards-per-worker', type=int, default=2)
+    args = parser.parse_args()
+
+    setup_django()
+
+    # настройки celery читаются из django при первом обращении к конфигурации приложения
+    from django.conf import settings
+    settings.CELERY_BROKER_URL = 'memory://'
+    settings.CELERY_RESULT_BACKEND = 'cache+memory://'
+    settings.CELERY_BROKER_TRANSPORT_OPTIONS = {'polling_interval': 0.01}
+
+    with test_database(), FakeTelegramServer(latency=args.latency) as server:
+        create_habits(args.habits)
+        server.expected = args.habits
+
+        for workers in args.workers:
+            elapsed = run(workers, workers * args.shards_per_worker, server)
+            print(f'воркеров: {workers:<3} {args.habits} уведомлений за {elapsed:.2f} c '
+                  f'({args.habits / elapsed:.0f} уведомлений/c)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Сравнение последовательной отправки уведомлений с параллельной отправкой через TelegramSender.
+Запросы идут в локальный сервер, имитирующий telegram с заданной задержкой ответа.
+
+Пример: python -m benchmarks.telegram_sender --messages 2000 --latency 0.05 --concurrency 64
+"""
+import argparse
+import time
+
+import requests
+
+from benchmarks import setup_django
+from benchmarks.fake_telegram import FakeTelegramServer
+
+
+def run_sequential(url, messages):
+    for chat_id, text in messages:
+        requests.post(f'{url}/botTOKEN/sendMessage', params={'chat_id': chat_id, 'text': text})
+
+
+def run_concurrent(url, messages, concurrency):
+    from habits.telegram import TelegramSender
+
+    with TelegramSender(concurrency=concurrency, base_url=url, token='TOKEN', rate_limit=False) as sender:
+        results = sender.send_many(messages)
+    assert all(result.ok for result in results)
+
+
+def measure(name, func, count):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f'{name:<12} {count} сообщений за {elapsed:.2f} c ({count / elapsed:.0f} сообщений/c)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--sequential-limit', type=int, default=200,
+                        help='количество сообщений для последовательного прогона')
+    args = parser.parse_args()
+
+    setup_django()
+    messages = [(chat_id, f'привычка {chat_id}') for chat_id in range(args.messages)]
+
+    with FakeTelegramServer(latency=args.latency) as server:
+        sequential = messages[:args.sequential_limit]
+        measure('sequential', lambda: run_sequential(server.url, sequential), len(sequential))
+        measure('concurrent', lambda: run_concurrent(server.url, messages, args.concurrency), len(messages))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,8 @@ from celery import Celery
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-app = Celery('config')
+# Задачи учитывают запросы к базе и проверяют бюджет query_budget
+app = Celery('config', task_cls='config.queries:QueryBudgetTask')
 
 # Using a string here means the worker doesn't have to serialize
 # the configuration object to child processes.
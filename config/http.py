@@ -0,0 +1,24 @@
+"""
+Общие для проекта помощники HTTP: сжатие ответа и условные запросы.
+"""
+import re
+
+from django.utils.http import parse_etags
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+def accepts_gzip(request):
+    """
+    Принимает ли клиент ответ, сжатый gzip (заголовок Accept-Encoding).
+    """
+
+    return bool(ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def etag_matches(header, etag):
+    """
+    Совпадает ли etag с одним из значений заголовка If-Match или If-None-Match.
+    """
+
+    return header is not None and ('*' in parse_etags(header) or etag in parse_etags(header))
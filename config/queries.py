@@ -0,0 +1,308 @@
+"""
+Учет запросов к базе: количество и суммарное время запросов на HTTP-запрос и на задачу Celery.
+В режиме DEBUG значения отдаются в заголовках ответа, иначе копятся в счетчиках (команда query_stats).
+Представления объявляют бюджет запросов в атрибуте query_budgets (действие или метод -> количество),
+задачи - параметром query_budget декоратора. Превышение бюджета пишется в лог, а при QUERY_BUDGET_STRICT
+(в тестах) завершается ошибкой QueryBudgetExceeded. Запрос пользователя при промахе кэша аутентификации
+учитывается в количестве, но в бюджет не входит (users.authentication).
+
+Обертка выполнения запросов ставится на каждое соединение, а текущий учет хранится в переменной контекста:
+asgiref передает контекст в потоки sync_to_async, поэтому под ASGI (config/asgi.py) запросы представлений,
+выполняемых в потоках, засчитываются своему HTTP-запросу так же, как под WSGI.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from celery import Task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'queries'
+# служебные команды транзакций не считаются запросами
+TRANSACTION_COMMANDS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+current_stats = ContextVar('query_stats', default=None)
+budget_excluded = ContextVar('query_budget_excluded', default=False)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    """
+    Количество, время и текст запросов одного учета. excluded - запросы, не входящие в бюджет.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.excluded = 0
+        self.duration = 0.0
+        self.queries = []
+
+    @property
+    def budgeted(self):
+        return self.count - self.excluded
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Обертка выполнения запросов (connection.execute_wrapper). При вложенном учете (например, задача,
+    выполненная синхронно внутри другой) запрос засчитывается только самому внутреннему учету.
+    """
+
+    stats = current_stats.get()
+    if stats is None or sql.startswith(TRANSACTION_COMMANDS):
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.excluded += budget_excluded.get()
+        stats.duration += time.perf_counter() - started
+        stats.queries.append(sql)
+
+
+def install_wrapper(db_connection):
+    if count_query not in db_connection.execute_wrappers:
+        db_connection.execute_wrappers.append(count_query)
+
+
+@receiver(connection_created)
+def install_wrapper_on_connect(sender, connection, **kwargs):
+    install_wrapper(connection)
+
+
+@contextmanager
+def track_queries():
+    """
+    Учет запросов к базе в текущем контексте, в том числе выполненных в потоках sync_to_async.
+    """
+
+    install_wrapper(connection)
+    stats = QueryStats()
+    token = current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+
+
+@contextmanager
+def exclude_from_budget():
+    """
+    Запросы блока учитываются в количестве и времени, но не в бюджете.
+    """
+
+    token = budget_excluded.set(True)
+    try:
+        yield
+    finally:
+        budget_excluded.reset(token)
+
+
+def budget_message(label, budget, stats):
+    return f'{label}: {stats.budgeted} запросов к базе при бюджете {budget}'
+
+
+def check_budget(label, budget, stats):
+    """
+    Проверка бюджета запросов. Возвращает True, если бюджет превышен.
+    """
+
+    if budget is None or stats.budgeted <= budget:
+        return False
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded('\n'.join([budget_message(label, budget, stats), *stats.queries]))
+    logger.warning(budget_message(label, budget, stats))
+    return True
+
+
+@contextmanager
+def query_budget(budget, label='блок'):
+    """
+    Проверка бюджета запросов для блока кода или функции (как декоратор).
+    В отличие от assertNumQueries меньшее количество запросов ошибкой не считается.
+    """
+
+    with track_queries() as stats:
+        yield stats
+    if stats.budgeted > budget:
+        raise QueryBudgetExceeded('\n'.join([budget_message(label, budget, stats), *stats.queries]))
+
+
+class QueryMetrics:
+    """
+    Счетчики запросов по представлениям и задачам. Копятся в памяти процесса и сбрасываются в общий кэш
+    каждые flush_every записей, чтобы не обращаться к redis на каждый запрос.
+    """
+
+    flush_every = 100
+    fields = ('calls', 'queries', 'db_us', 'over_budget')
+
+    def __init__(self):
+        self.counts = {}
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def take(self, label, stats, over_budget=False):
+        """
+        Учет вызова. Возвращает накопленные счетчики, если их пора сбросить, иначе None.
+        """
+
+        with self.lock:
+            counts = self.counts.setdefault(label, dict.fromkeys(self.fields, 0))
+            counts['calls'] += 1
+            counts['queries'] += stats.count
+            counts['db_us'] += int(stats.duration * 1_000_000)
+            counts['over_budget'] += over_budget
+            self.pending += 1
+            if self.pending < self.flush_every:
+                return None
+            pending, self.counts, self.pending = self.counts, {}, 0
+        return pending
+
+    def record(self, label, stats, over_budget=False):
+        pending = self.take(label, stats, over_budget)
+        if pending is not None:
+            self.flush(pending)
+
+    async def arecord(self, label, stats, over_budget=False):
+        pending = self.take(label, stats, over_budget)
+        if pending is not None:
+            await sync_to_async(self.flush)(pending)
+
+    def flush(self, pending=None):
+        if pending is None:
+            with self.lock:
+                pending, self.counts, self.pending = self.counts, {}, 0
+        if not pending:
+            return
+
+        labels_key = f'{KEY_PREFIX}:labels'
+        labels = cache.get(labels_key, set())
+        if not labels.issuperset(pending):
+            cache.set(labels_key, labels | set(pending), None)
+        for label, counts in pending.items():
+            for field, count in counts.items():
+                if count:
+                    key = f'{KEY_PREFIX}:{label}:{field}'
+                    cache.add(key, 0, None)
+                    cache.incr(key, count)
+
+    def summary(self):
+        """
+        Сводка по всем процессам: вызовы, среднее количество запросов и время в базе, превышения бюджета.
+        """
+
+        result = {}
+        for label in sorted(cache.get(f'{KEY_PREFIX}:labels', set())):
+            counts = {field: cache.get(f'{KEY_PREFIX}:{label}:{field}', 0) for field in self.fields}
+            calls = counts['calls'] or 1
+            result[label] = {
+                'calls': counts['calls'],
+                'queries_avg': counts['queries'] / calls,
+                'db_ms_avg': counts['db_us'] / calls / 1000,
+                'over_budget': counts['over_budget'],
+            }
+        return result
+
+
+metrics = QueryMetrics()
+
+
+def view_budget(request, view_func):
+    """
+    Бюджет запросов представления: по действию ViewSet или по методу запроса для APIView.
+    """
+
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    budgets = getattr(view_class, 'query_budgets', None)
+    if not budgets:
+        return None
+    method = 'get' if request.method == 'HEAD' else request.method.lower()
+    actions = getattr(view_func, 'actions', None)
+    return budgets.get(actions.get(method) if actions else method)
+
+
+class QueryCountMiddleware:
+    """
+    Количество и время запросов к базе на HTTP-запрос: заголовки X-DB-Queries и Server-Timing в режиме DEBUG,
+    счетчики metrics в остальных случаях, проверка бюджета представления. Работает и в синхронном,
+    и в асинхронном (ASGI) режиме. Запросы потоковых ответов выполняются после выхода из middleware
+    и не учитываются.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with track_queries() as stats:
+            response = self.get_response(request)
+
+        label, over_budget = self.check(request, response, stats)
+        if label is not None and not settings.DEBUG:
+            metrics.record(label, stats, over_budget)
+        return response
+
+    async def __acall__(self, request):
+        with track_queries() as stats:
+            response = await self.get_response(request)
+
+        label, over_budget = self.check(request, response, stats)
+        if label is not None and not settings.DEBUG:
+            await metrics.arecord(label, stats, over_budget)
+        return response
+
+    @staticmethod
+    def check(request, response, stats):
+        """
+        Проверка бюджета представления и заголовки в режиме DEBUG. Возвращает метку и признак превышения.
+        """
+
+        match = request.resolver_match
+        if match is None:
+            return None, False
+        label = f'{match.view_name}:{request.method}'
+        over_budget = check_budget(label, view_budget(request, match.func), stats)
+        if settings.DEBUG:
+            response['X-DB-Queries'] = stats.count
+            response['Server-Timing'] = f'db;dur={stats.duration * 1000:.1f}'
+        return label, over_budget
+
+
+class QueryBudgetTask(Task):
+    """
+    Базовый класс задач Celery с учетом запросов к базе и проверкой бюджета из параметра query_budget.
+    """
+
+    query_budget = None
+
+    def __call__(self, *args, **kwargs):
+        with track_queries() as stats:
+            result = super().__call__(*args, **kwargs)
+
+        label = f'task:{self.name}'
+        over_budget = check_budget(label, self.query_budget, stats)
+        if not settings.DEBUG:
+            metrics.record(label, stats, over_budget)
+        return result
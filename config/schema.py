@@ -0,0 +1,93 @@
+"""
+Готовая схема OpenAPI для /api/schema/. Файлы схемы создает команда build_schema при сборке или запуске,
+представление отдает их из памяти с ETag и сжатием gzip, не разбирая представления и сериалайзеры
+на каждый запрос. Если файла нет, схема один раз генерируется в процессе.
+"""
+import gzip
+from functools import lru_cache
+from hashlib import md5
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+from django.utils.http import quote_etag
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+from rest_framework import status
+
+from config.http import accepts_gzip, etag_matches
+
+SCHEMA_RENDERERS = {
+    OpenApiYamlRenderer.format: OpenApiYamlRenderer,
+    OpenApiJsonRenderer.format: OpenApiJsonRenderer,
+}
+
+
+def schema_path(schema_format):
+    return settings.SCHEMA_DIR / f'openapi.{schema_format}'
+
+
+def generate_schema():
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    with translation.override(settings.LANGUAGE_CODE):
+        return generator.get_schema(request=None, public=True)
+
+
+def render_schema(schema, schema_format):
+    return SCHEMA_RENDERERS[schema_format]().render(schema, renderer_context={})
+
+
+class SchemaDocument:
+    """
+    Тело схемы в одном формате, его ETag и сжатая копия.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.etag = quote_etag(md5(content).hexdigest())
+        self.gzipped = gzip.compress(content, mtime=0)
+
+
+@lru_cache
+def schema_document(schema_format):
+    """
+    Схема из файла build_schema или, если его нет, сгенерированная при первом запросе.
+    """
+
+    path = schema_path(schema_format)
+    if path.is_file():
+        return SchemaDocument(path.read_bytes())
+    return SchemaDocument(render_schema(generate_schema(), schema_format))
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """
+    Схема OpenAPI из schema_document. Запросы с параметрами lang и version генерируются как в SpectacularAPIView.
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('lang') or request.GET.get('version'):
+            return super().get(request, *args, **kwargs)
+
+        renderer = request.accepted_renderer
+        document = schema_document(renderer.format)
+        headers = {'ETag': document.etag}
+        if etag_matches(request.headers.get('If-None-Match'), document.etag):
+            return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        content = document.content
+        if accepts_gzip(request):
+            content = document.gzipped
+            headers['Content-Encoding'] = 'gzip'
+        headers['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+
+        content_type = request.accepted_media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = HttpResponse(content, content_type=content_type, headers=headers)
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework_simplejwt',
@@ -54,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.queries.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -94,7 +96,10 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        # порог похожести слов по триграммам для поиска (habits.search.similar_words): при значении по умолчанию
+        # 0.6 слово с одной опечаткой не находится, 0.5 пропускает одну ошибку в слове из 7-8 букв
+        'OPTIONS': {'options': '-c pg_trgm.word_similarity_threshold=0.5'},
     }
 }
 
@@ -139,6 +144,9 @@ STATICFILES_DIRS = [
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Файлы схемы OpenAPI, которые создает команда build_schema
+SCHEMA_DIR = BASE_DIR / 'schema'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -149,7 +157,7 @@ AUTH_USER_MODEL = 'users.User'
 # Simple jwt settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -175,6 +183,9 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'Backend part healthy habit tracker',
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
+    'ENUM_NAME_OVERRIDES': {
+        'HabitImportFormatEnum': 'habits.models.HabitImportFormat',
+    },
 }
 
 # Celery Configuration Options
@@ -182,8 +193,38 @@ CELERY_TIMEZONE = "Europe/Moscow"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 
-CELERY_BROKER_URL = os.getenv('REDIS_URL')
-CELERY_RESULT_BACKEND = os.getenv('REDIS_URL')
+REDIS_URL = os.getenv('REDIS_URL')
+
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+
+# Кэш ответов: redis, если он настроен, иначе локальная память процесса
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'habit_tracker',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Время жизни закэшированных ответов публичных привычек в секундах
+HABIT_CACHE_TIMEOUT = int(os.getenv('HABIT_CACHE_TIMEOUT', 300))
+# Кэш пользователей для аутентификации: время жизни в redis и в памяти процесса (секунды), размер LRU процесса
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', 60))
+AUTH_USER_LOCAL_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_LOCAL_CACHE_TIMEOUT', 5))
+AUTH_USER_LOCAL_CACHE_SIZE = 1024
+# Превышение бюджета запросов к базе (query_budgets представлений, query_budget задач) - ошибка, а не запись в лог
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+# Сколько хранится файл прерванной загрузки привычек, которую можно продолжить
+HABIT_IMPORT_FILE_RETENTION = timedelta(days=int(os.getenv('HABIT_IMPORT_FILE_RETENTION_DAYS', 7)))
+# Через сколько загрузка в статусе running без сохраненных пачек считается зависшей (воркер остановлен)
+HABIT_IMPORT_STALE_AFTER = timedelta(minutes=int(os.getenv('HABIT_IMPORT_STALE_MINUTES', 15)))
 
 CELERY_BEAT_SCHEDULE = {
     'get_id': {
@@ -194,8 +235,29 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'habits.tasks.telegram_integration',  # Путь к задаче
         'schedule': timedelta(minutes=1),  # Расписание выполнения задачи
     },
+    'rebucket_schedule': {
+        'task': 'habits.tasks.rebucket_habit_schedule',  # Путь к задаче
+        'schedule': timedelta(minutes=15),  # Расписание выполнения задачи
+    },
+    'delete_import_files': {
+        'task': 'habits.tasks.delete_stale_import_files',  # Путь к задаче
+        'schedule': timedelta(hours=1),  # Расписание выполнения задачи
+    },
 }
 
 # Telegram integration
 TG_URL = 'https://api.telegram.org'
 TG_BOT_API = os.getenv('TG_BOT_API')
+# Количество одновременных запросов к telegram при рассылке уведомлений
+TG_SEND_CONCURRENCY = int(os.getenv('TG_SEND_CONCURRENCY', 32))
+TG_SEND_TIMEOUT = 10
+# Количество подзадач, на которые делится рассылка уведомлений одной минуты
+TG_SEND_SHARDS = int(os.getenv('TG_SEND_SHARDS', 8))
+# Максимальное количество пропущенных минут, уведомления за которые досылаются после задержки рассылки
+# (не больше суток)
+TG_CATCHUP_MINUTES = int(os.getenv('TG_CATCHUP_MINUTES', 60))
+# Ограничения telegram: запросов бота в секунду всего и сообщений в секунду в один чат
+TG_RATE_LIMIT_GLOBAL = int(os.getenv('TG_RATE_LIMIT_GLOBAL', 30))
+TG_RATE_LIMIT_PER_CHAT = int(os.getenv('TG_RATE_LIMIT_PER_CHAT', 1))
+# Сколько раз сообщение может быть отложено из-за ограничения частоты, прежде чем считается неотправленным
+TG_SEND_MAX_DEFERRALS = 10
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import F, Func, IntegerField, Value
+
+from habits.models import HabitCompletion
+from habits.schedule import WEEKDAYS
+
+# 1 января 1970 года - четверг, сдвиг для получения дня недели (0 - понедельник) из номера дня от эпохи
+EPOCH_WEEKDAY = 3
+
+
+class EpochDay(Func):
+    """
+    Номер дня от начала эпохи Unix для поля даты.
+    """
+
+    template = "(%(expressions)s - DATE '1970-01-01')"
+    output_field = IntegerField()
+
+
+def completion_arrays(habit_pks, start, end):
+    """
+    Выполнения привычек habit_pks за период [start, end] в виде массивов NumPy: идентификатор привычки
+    и номер дня от эпохи. База собирает оба столбца в массивы одним запросом, поэтому на каждое выполнение
+    не создаются объекты модели. Агрегаты одного запроса получают строки в одном порядке, так что элементы
+    массивов соответствуют друг другу.
+    """
+
+    arrays = HabitCompletion.objects.filter(habit_id__in=habit_pks, date__range=(start, end)).aggregate(
+        habit_ids=ArrayAgg('habit_id', default=Value([])),
+        days=ArrayAgg(EpochDay(F('date')), default=Value([])),
+    )
+    return np.array(arrays['habit_ids'], dtype=np.int64), np.array(arrays['days'], dtype=np.int64)
+
+
+def habit_analytics(habits, start, end):
+    """
+    Статистика выполнения привычек пользователя за период [start, end]: доля выполненных периодов,
+    распределение выполнений по дням недели и по часам, на которые назначены привычки,
+    в целом и по каждой привычке.
+    habits - список словарей привычек пользователя с ключами pk, action, periodicity, time_to_action.
+    Все агрегаты считаются векторно над массивами выполнений, без циклов по строкам.
+    """
+
+    habit_ids, days = completion_arrays([habit['pk'] for habit in habits], start, end)
+    pks = np.array([habit['pk'] for habit in habits], dtype=np.int64)
+    weekly = np.array([habit['periodicity'] in WEEKDAYS for habit in habits], dtype=bool)
+    habit_hours = np.array([habit['time_to_action'].hour for habit in habits], dtype=np.int64)
+    order = np.argsort(pks)
+    index = order[np.searchsorted(pks[order], habit_ids)] if len(pks) else np.zeros(0, dtype=np.int64)
+    count = len(habits)
+
+    weekdays = (days + EPOCH_WEEKDAY) % 7
+    weeks = (days + EPOCH_WEEKDAY) // 7
+    # период выполнения: день для ежедневных привычек и неделя для еженедельных
+    periods = np.where(weekly[index], weeks, days) if count else days
+
+    completions = np.bincount(index, minlength=count)
+    heatmap = np.bincount(index * 7 + weekdays, minlength=count * 7).reshape(count, 7)
+    hour_counts = np.bincount(habit_hours[index], minlength=24)
+
+    # выполненные периоды: уникальные пары (привычка, период)
+    span = periods.max() - periods.min() + 1 if len(periods) else 1
+    completed = np.unique(index * span + (periods - (periods.min() if len(periods) else 0)))
+    completed_periods = np.bincount(completed // span, minlength=count)
+
+    start_day, end_day = np.datetime64(start, 'D').astype(np.int64), np.datetime64(end, 'D').astype(np.int64)
+    total_days = end_day - start_day + 1
+    total_weeks = (end_day + EPOCH_WEEKDAY) // 7 - (start_day + EPOCH_WEEKDAY) // 7 + 1
+    expected_periods = np.where(weekly, total_weeks, total_days)
+    rates = completed_periods / np.maximum(expected_periods, 1)
+
+    return {
+        'start': start,
+        'end': end,
+        'completions': int(completions.sum()),
+        'completion_rate': round(float(completed_periods.sum() / max(expected_periods.sum(), 1)), 4),
+        'weekdays': heatmap.sum(axis=0).tolist(),
+        'hours': hour_counts.tolist(),
+        'habits': [
+            {
+                'pk': habit['pk'],
+                'action': habit['action'],
+                'completions': int(completions[position]),
+                'completion_rate': round(float(rates[position]), 4),
+                'weekdays': heatmap[position].tolist(),
+            }
+            for position, habit in enumerate(habits)
+        ],
+    }
+
+
+def analytics_period(today, days):
+    """
+    Период статистики из days последних дней, включая сегодняшний.
+    """
+
+    return today - timedelta(days=days - 1), today
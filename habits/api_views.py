@@ -1,13 +1,33 @@
-from drf_spectacular.utils import extend_schema_view, extend_schema
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
 from rest_framework.response import Response
 
-from habits.models import Habit
-from habits.paginators import MyPaginator
+from config.http import accepts_gzip
+from habits import cache
+from habits.analytics import analytics_period, habit_analytics
+from habits.bulk import BulkHabitMixin
+from habits.conditional import ConditionalHabitMixin
+from habits.export import EXPORT_FIELDS, batched, export_rows, flat_rows, gzip_stream
+from habits.models import Habit, HabitImport, HabitImportStatus
+from habits.paginators import HabitCursorPaginator, SearchPaginator
 from habits.permissions import IsOwner, IsPublish
-from habits.serializers import HabitSerializer, CommonDetailSerializer, CommonDetailAndStatusSerializer
+from habits.renderers import CSVRenderer, NDJSONRenderer, csv_lines, ndjson_lines, serialize_in_chunks
+from habits.search import search_habits
+from habits.serializers import HabitSerializer, CommonDetailSerializer, CommonDetailAndStatusSerializer, \
+    HabitReadSerializer, HabitCompletionSerializer, HabitBackfillSerializer, StreakSerializer, \
+    HabitAnalyticsSerializer, HabitImportCreateSerializer, HabitImportSerializer
+from habits.tasks import import_habits
 
 
 @extend_schema_view(
@@ -15,6 +35,7 @@ from habits.serializers import HabitSerializer, CommonDetailSerializer, CommonDe
         summary="Получить список привычек.",
         responses={
             status.HTTP_200_OK: HabitSerializer,
+            status.HTTP_304_NOT_MODIFIED: '',
             status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
             status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
             status.HTTP_405_METHOD_NOT_ALLOWED: CommonDetailSerializer,
@@ -24,6 +45,7 @@ from habits.serializers import HabitSerializer, CommonDetailSerializer, CommonDe
         summary="Получить существующую привычку по ее идентификатору.",
         responses={
             status.HTTP_200_OK: HabitSerializer,
+            status.HTTP_304_NOT_MODIFIED: '',
             status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
             status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
             status.HTTP_405_METHOD_NOT_ALLOWED: CommonDetailSerializer,
@@ -36,6 +58,7 @@ from habits.serializers import HabitSerializer, CommonDetailSerializer, CommonDe
             status.HTTP_400_BAD_REQUEST: CommonDetailSerializer,
             status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
             status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
+            status.HTTP_412_PRECONDITION_FAILED: CommonDetailSerializer,
         }
     ),
     partial_update=extend_schema(
@@ -46,6 +69,7 @@ from habits.serializers import HabitSerializer, CommonDetailSerializer, CommonDe
             status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
             status.HTTP_403_FORBIDDEN: CommonDetailAndStatusSerializer,
             status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
+            status.HTTP_412_PRECONDITION_FAILED: CommonDetailSerializer,
         }
     ),
     create=extend_schema(
@@ -65,17 +89,46 @@ from habits.serializers import HabitSerializer, CommonDetailSerializer, CommonDe
             status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
             status.HTTP_403_FORBIDDEN: CommonDetailAndStatusSerializer,
             status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
+            status.HTTP_412_PRECONDITION_FAILED: CommonDetailSerializer,
         }
     ),
 )
-class HabitViewSet(viewsets.ModelViewSet):
+class HabitViewSet(ConditionalHabitMixin, BulkHabitMixin, viewsets.ModelViewSet):
     serializer_class = HabitSerializer
-    pagination_class = MyPaginator
+    pagination_class = HabitCursorPaginator
+    search_pagination_class = SearchPaginator  # Результаты поиска идут по релевантности и по номерам страниц
+    search_param = 'search'
+    read_list_actions = ('list', 'publish_habits_list')
+    analytics_max_days = 366  # Максимальная длина периода статистики в днях
+    # Бюджет запросов к базе по действиям (config.queries). Количество запросов не должно зависеть
+    # от числа привычек в запросе и ответе.
+    query_budgets = {
+        'list': 4,
+        'create': 2,
+        'retrieve': 1,
+        'update': 3,
+        'partial_update': 3,
+        'destroy': 5,
+        'publish_habits_list': 5,
+        'retrieve_publish_habit': 1,
+        'complete': 4,
+        'backfill': 5,
+        'streak': 1,
+        'analytics': 2,
+        'bulk_create': 2,
+        'bulk_update': 3,
+        'bulk_destroy': 6,
+        'create_import': 3,
+        'import_detail': 2,
+    }
 
     def perform_create(self, serializer):
-        habit = serializer.save()
-        habit.user = self.request.user
-        habit.save()
+        serializer.save(user=self.request.user)
+
+    def perform_update(self, serializer):
+        # изменять можно только свои привычки, владелец уже загружен аутентификацией
+        serializer.instance.user = self.request.user
+        super().perform_update(serializer)
 
     def get_queryset(self):
         """
@@ -85,14 +138,24 @@ class HabitViewSet(viewsets.ModelViewSet):
         """
 
         if 'publish' in self.request.path:
-            return Habit.objects.filter(is_publish=True)
+            queryset = Habit.objects.filter(is_publish=True)
         else:
-            return Habit.objects.filter(user=self.request.user)
+            queryset = Habit.objects.filter(user=self.request.user)
+
+        # списки читаются строками values() для быстрого сериалайзера
+        if self.action in self.read_list_actions:
+            queryset = HabitReadSerializer.values(queryset)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in self.read_list_actions:
+            return HabitReadSerializer
+        return super().get_serializer_class()
 
     def get_permissions(self):
         if self.action == 'retrieve':
             permission_classes = [IsAuthenticated, IsOwner | IsPublish]
-        elif self.action in ['update', 'partial_update', 'destroy']:
+        elif self.action in ['update', 'partial_update', 'destroy', 'complete', 'backfill', 'streak']:
             permission_classes = [IsAuthenticated, IsOwner]
         else:
             permission_classes = [IsAuthenticated]
@@ -101,8 +164,9 @@ class HabitViewSet(viewsets.ModelViewSet):
 
     @extend_schema(
         summary="Получить список публичных привычек.",
+        parameters=[OpenApiParameter('search', str, description='Поиск по действию и месту.')],
         responses={
-            status.HTTP_200_OK: HabitSerializer,
+            status.HTTP_200_OK: HabitSerializer(many=True),
             status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
             status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
             status.HTTP_405_METHOD_NOT_ALLOWED: CommonDetailSerializer,
@@ -112,18 +176,37 @@ class HabitViewSet(viewsets.ModelViewSet):
         methods=['get'],
         detail=False,
         url_path='publish',
-        url_name='publish_list'
+        url_name='publish_list',
+        renderer_classes=[JSONRenderer, BrowsableAPIRenderer, NDJSONRenderer]
     )
     def publish_habits_list(self, request):
         """
         Логика для обработки запроса habit/publish/. Чтобы пользователи могли видеть публичные привычки.
+        Список отдается постранично, страницы кэшируются до изменения публичных привычек.
+        С параметром search возвращаются найденные привычки по убыванию релевантности (страницы по номерам,
+        не больше SEARCH_MAX_RESULTS результатов).
+        В формате NDJSON (?format=ndjson) весь каталог отдается потоком, строки читаются из базы серверным курсором
+        пачками.
         """
-        serializer = self.get_serializer(self.get_queryset(), many=True)
+        queryset = self.get_queryset().order_by('pk')
+        paginator = self.paginator
+        search = request.query_params.get(self.search_param, '').strip()
+        if search:
+            queryset = search_habits(queryset, search)
+            paginator = self.search_pagination_class()
 
-        if serializer.is_valid:
-            return Response(serializer.data)
-        else:
-            return Response(serializer.error, status=status.HTTP_400_BAD_REQUEST)
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            rows = serialize_in_chunks(queryset, self.get_serializer_class(), context=self.get_serializer_context())
+            return StreamingHttpResponse(ndjson_lines(rows), content_type=NDJSONRenderer.media_type)
+
+        key = cache.list_key(request.build_absolute_uri())
+        data, version = cache.get_versioned(key, cache.LIST_VERSION_KEY, 'list')
+        if data is None:
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = self.get_serializer(page, many=True)
+            data = paginator.get_paginated_response(serializer.data).data
+            cache.set_versioned(key, version, data)
+        return Response(data)
 
     @extend_schema(
         summary="Получить детали публичной привычки по её идентификатору.",
@@ -144,12 +227,259 @@ class HabitViewSet(viewsets.ModelViewSet):
     def retrieve_publish_habit(self, request, pk: int = None):
         """
         Логика для обработки запроса habit/<int:pk>/publish/. Чтобы пользователи могли видеть детали публичных привычек.
+        В кэш попадают только публичные привычки, при снятии публикации запись сбрасывается.
         """
 
+        key = cache.detail_key(pk)
+        data = cache.get_cached(key, 'detail')
+        if data is not None:
+            return Response(data)
+
         habit = self.get_object()
         serializer = self.get_serializer(habit)
 
         if serializer.is_valid:
+            cache.set_cached(key, serializer.data)
             return Response(serializer.data)
         else:
             return Response(serializer.error, status=status.HTTP_400_BAD_REQUEST)
+
+    def get_today(self):
+        """
+        Сегодняшняя дата в часовом поясе пользователя.
+        """
+
+        return timezone.localdate(timezone=ZoneInfo(self.request.user.timezone))
+
+    def streak_response(self, habit, status_code=status.HTTP_200_OK):
+        streak = habit.streak
+        data = {
+            'current_streak': streak.current_on(self.get_today(), habit.periodicity),
+            'best_streak': streak.best,
+            'last_completed': streak.last_completed,
+        }
+        return Response(StreakSerializer(data).data, status=status_code)
+
+    @extend_schema(
+        summary="Отметить выполнение привычки.",
+        request=HabitCompletionSerializer,
+        responses={
+            status.HTTP_201_CREATED: StreakSerializer,
+            status.HTTP_400_BAD_REQUEST: CommonDetailSerializer,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+            status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
+        }
+    )
+    @action(methods=['post'], detail=True, url_path='complete', url_name='complete')
+    def complete(self, request, pk: int = None):
+        """
+        Логика для обработки запроса habit/<int:pk>/complete/. Отмечает выполнение привычки за дату
+        (по умолчанию сегодня) и возвращает обновленные серии.
+        """
+
+        habit = self.get_object()
+        today = self.get_today()
+        serializer = HabitCompletionSerializer(data=request.data, context={'today': today})
+        serializer.is_valid(raise_exception=True)
+
+        habit.complete([serializer.validated_data.get('date', today)])
+        return self.streak_response(habit, status.HTTP_201_CREATED)
+
+    @extend_schema(
+        summary="Загрузить историю выполнений привычки.",
+        request=HabitBackfillSerializer,
+        responses={
+            status.HTTP_200_OK: StreakSerializer,
+            status.HTTP_400_BAD_REQUEST: CommonDetailSerializer,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+            status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
+        }
+    )
+    @action(methods=['post'], detail=True, url_path='completions', url_name='backfill')
+    def backfill(self, request, pk: int = None):
+        """
+        Логика для обработки запроса habit/<int:pk>/completions/. Добавляет список выполнений одной вставкой,
+        серии пересчитываются один раз.
+        """
+
+        habit = self.get_object()
+        serializer = HabitBackfillSerializer(data=request.data, context={'today': self.get_today()})
+        serializer.is_valid(raise_exception=True)
+
+        habit.complete(serializer.validated_data['dates'])
+        return self.streak_response(habit)
+
+    @extend_schema(
+        summary="Получить серии выполнений привычки.",
+        responses={
+            status.HTTP_200_OK: StreakSerializer,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+            status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
+        }
+    )
+    @action(methods=['get'], detail=True, url_path='streak', url_name='streak')
+    def streak(self, request, pk: int = None):
+        """
+        Логика для обработки запроса habit/<int:pk>/streak/. Серии хранятся в привычке, история не читается.
+        """
+
+        return self.streak_response(self.get_object())
+
+    @extend_schema(
+        summary="Получить статистику выполнения привычек пользователя.",
+        parameters=[OpenApiParameter('days', int, description='Количество последних дней (по умолчанию 90).')],
+        responses={
+            status.HTTP_200_OK: HabitAnalyticsSerializer,
+            status.HTTP_400_BAD_REQUEST: CommonDetailSerializer,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+        }
+    )
+    @action(methods=['get'], detail=False, url_path='analytics', url_name='analytics')
+    def analytics(self, request):
+        """
+        Логика для обработки запроса habit/analytics/. Доля выполненных периодов, распределение выполнений
+        по дням недели и часам за последние days дней. Результат кэшируется до новых выполнений или изменения привычек.
+        """
+
+        try:
+            days = int(request.query_params.get('days', 90))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= self.analytics_max_days:
+            return Response(
+                {'detail': f'Параметр days должен быть числом от 1 до {self.analytics_max_days}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        start, end = analytics_period(self.get_today(), days)
+        key = cache.analytics_key(request.user.pk, start, end)
+        data, version = cache.get_versioned(key, cache.analytics_version_key(request.user.pk), 'analytics')
+        if data is None:
+            habits = list(self.get_queryset().order_by('pk').values(
+                'pk', 'action', 'periodicity', 'time_to_action'
+            ))
+            data = HabitAnalyticsSerializer(habit_analytics(habits, start, end)).data
+            cache.set_versioned(key, version, data)
+        return Response(data)
+
+    @extend_schema(
+        summary="Выгрузить все привычки пользователя с историей выполнений.",
+        parameters=[OpenApiParameter('format', str, enum=['ndjson', 'csv'], description='Формат выгрузки.')],
+        responses={
+            (status.HTTP_200_OK, NDJSONRenderer.media_type): OpenApiTypes.STR,
+            (status.HTTP_200_OK, CSVRenderer.media_type): OpenApiTypes.STR,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+        }
+    )
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='export',
+        url_name='export',
+        renderer_classes=[NDJSONRenderer, CSVRenderer]
+    )
+    def export(self, request):
+        """
+        Логика для обработки запроса habit/export/. Все привычки пользователя с датами выполнений отдаются потоком
+        в формате NDJSON (по умолчанию) или CSV (?format=csv). Если клиент принимает gzip, поток сжимается на лету.
+        """
+
+        rows = export_rows(request.user)
+        if request.accepted_renderer.format == CSVRenderer.format:
+            lines = csv_lines(flat_rows(rows), EXPORT_FIELDS)
+        else:
+            lines = ndjson_lines(rows)
+
+        chunks = batched(lines)
+        gzipped = accepts_gzip(request)
+        if gzipped:
+            chunks = gzip_stream(chunks)
+
+        renderer = request.accepted_renderer
+        content_type = f'{renderer.media_type}; charset={renderer.charset}' if renderer.charset else renderer.media_type
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="habits.{renderer.format}"'
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def get_habit_import(self, import_pk):
+        return get_object_or_404(HabitImport.objects.filter(user=self.request.user), pk=import_pk)
+
+    def start_import(self, habit_import):
+        habit_import.status = HabitImportStatus.PENDING
+        habit_import.save(update_fields=['status', 'updated_at'])
+        transaction.on_commit(lambda: import_habits.delay(habit_import.pk))
+        return Response(HabitImportSerializer(habit_import).data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(
+        summary="Загрузить привычки из файла NDJSON или CSV.",
+        request={'multipart/form-data': HabitImportCreateSerializer},
+        responses={
+            status.HTTP_202_ACCEPTED: HabitImportSerializer,
+            status.HTTP_400_BAD_REQUEST: CommonDetailSerializer,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+        }
+    )
+    @action(methods=['post'], detail=False, url_path='import', url_name='import')
+    def create_import(self, request):
+        """
+        Логика для обработки запроса habit/import/. Файл сохраняется, а привычки загружаются фоновой задачей
+        пачками. Ход загрузки и ошибки по строкам возвращает habit/import/<int:import_pk>/.
+        """
+
+        serializer = HabitImportCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        habit_import = HabitImport.objects.create(
+            user=request.user, file=serializer.validated_data['file'], format=serializer.validated_data['file_format']
+        )
+        return self.start_import(habit_import)
+
+    @extend_schema(
+        summary="Получить ход загрузки привычек и ошибки по строкам.",
+        parameters=[OpenApiParameter('import_pk', int, OpenApiParameter.PATH)],
+        responses={
+            status.HTTP_200_OK: HabitImportSerializer,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+            status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
+        }
+    )
+    @action(methods=['get'], detail=False, url_path=r'import/(?P<import_pk>\d+)', url_name='import-detail')
+    def import_detail(self, request, import_pk=None):
+        return Response(HabitImportSerializer(self.get_habit_import(import_pk)).data)
+
+    @extend_schema(
+        summary="Продолжить прерванную загрузку привычек.",
+        request=None,
+        parameters=[OpenApiParameter('import_pk', int, OpenApiParameter.PATH)],
+        responses={
+            status.HTTP_202_ACCEPTED: HabitImportSerializer,
+            status.HTTP_400_BAD_REQUEST: CommonDetailSerializer,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+            status.HTTP_404_NOT_FOUND: CommonDetailSerializer,
+        }
+    )
+    @action(methods=['post'], detail=False, url_path=r'import/(?P<import_pk>\d+)/resume', url_name='import-resume')
+    def import_resume(self, request, import_pk=None):
+        """
+        Логика для обработки запроса habit/import/<int:import_pk>/resume/. Загрузка продолжается
+        с первой необработанной строки. Продолжить можно загрузку, завершенную ошибкой, и зависшую
+        (см. HabitImportQuerySet.resumable()).
+        """
+
+        habit_import = self.get_habit_import(import_pk)
+        if not habit_import.file:
+            return Response(
+                {'detail': 'Файл загрузки уже удален, загрузите файл заново.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        # загрузка (в том числе зависшая) переводится в pending, только если с момента чтения ее не изменил воркер
+        claimed = HabitImport.objects.resumable().filter(
+            pk=habit_import.pk, updated_at=habit_import.updated_at
+        ).update(status=HabitImportStatus.PENDING, updated_at=timezone.now())
+        if not claimed:
+            return Response(
+                {'detail': 'Продолжить можно только прерванную загрузку.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return self.start_import(habit_import)
@@ -0,0 +1,197 @@
+from django.db import transaction
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from habits import cache
+from habits.models import Habit
+from habits.serializers import BulkDeleteSerializer, CommonDetailSerializer, HabitSerializer
+from habits.signals import attach_published_dependants
+
+
+def related_habit_ids(items):
+    """
+    Идентификаторы связанных привычек из элементов запроса, некорректные значения пропускаются
+    (ошибку по ним вернет поле сериалайзера).
+    """
+
+    ids = set()
+    for item in items:
+        value = item.get('related_habit') if isinstance(item, dict) else None
+        if value is not None and not isinstance(value, bool):
+            try:
+                ids.add(int(value))
+            except (TypeError, ValueError):
+                pass
+    return ids
+
+
+def is_pk(value):
+    """
+    Проверка идентификатора привычки из запроса: только целое число (bool в Python - тоже int).
+    """
+
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class BulkHabitMixin:
+    """
+    Массовые операции с привычками текущего пользователя по адресу habit/bulk/:
+    POST - создание списка привычек, PATCH - изменение списка привычек (в каждом элементе указывается pk),
+    DELETE - удаление привычек по списку pks.
+
+    Весь список проверяется за один проход, связанные привычки загружаются одним запросом.
+    Если хотя бы один элемент не прошел проверку, ничего не сохраняется, а в ответе 400 возвращается
+    список ошибок по элементам в порядке запроса (для корректных элементов - пустой словарь).
+    Изменения сохраняются одним bulk_create / bulk_update / delete в транзакции.
+    """
+
+    bulk_max_items = 100  # Максимальное количество элементов в одном запросе
+
+    def get_bulk_items(self):
+        items = self.request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'non_field_errors': ['Ожидается непустой список привычек.']})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError(
+                {'non_field_errors': [f'Количество элементов не должно превышать {self.bulk_max_items}.']}
+            )
+        return items
+
+    def get_bulk_serializer_context(self, items):
+        context = self.get_serializer_context()
+        related_habits = self.get_serializer_class()(context=context).fields['related_habit'].get_queryset()
+        context['related_habits'] = related_habits.in_bulk(related_habit_ids(items))
+        return context
+
+    def validate_bulk(self, items, instances=None):
+        """
+        Проверка элементов списка. Возвращает сериалайзеры элементов или выбрасывает ошибку со списком ошибок.
+        """
+
+        context = self.get_bulk_serializer_context(items)
+        serializers, errors, seen = [], [], set()
+        for item in items:
+            if instances is None:
+                serializer = self.get_serializer_class()(data=item, context=context)
+            else:
+                pk = item.get('pk') if isinstance(item, dict) else None
+                if not is_pk(pk):
+                    serializers.append(None)
+                    errors.append({'pk': ['Ожидается целочисленный идентификатор привычки.']})
+                    continue
+                error = 'Привычка указана несколько раз.' if pk in seen else 'Привычка не найдена.'
+                instance = instances.get(pk) if pk not in seen else None
+                seen.add(pk)
+                if instance is None:
+                    serializers.append(None)
+                    errors.append({'pk': [error]})
+                    continue
+                serializer = self.get_serializer_class()(instance, data=item, partial=True, context=context)
+            serializer.is_valid()
+            serializers.append(serializer)
+            errors.append(serializer.errors)
+
+        if any(errors):
+            raise ValidationError(errors)
+        return serializers
+
+    @extend_schema(
+        summary="Создание списка привычек.",
+        request=HabitSerializer(many=True),
+        responses={
+            status.HTTP_201_CREATED: HabitSerializer(many=True),
+            status.HTTP_400_BAD_REQUEST: CommonDetailSerializer,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+        }
+    )
+    @action(methods=['post'], detail=False, url_path='bulk', url_name='bulk')
+    def bulk_create(self, request):
+        serializers = self.validate_bulk(self.get_bulk_items())
+
+        now = timezone.now()
+        habits = []
+        for serializer in serializers:
+            habit = Habit(**serializer.validated_data, user=request.user)
+            # bulk_create не вызывает save(), поэтому слот UTC рассчитывается явно
+            habit.update_schedule(now, request.user.timezone)
+            habits.append(habit)
+
+        with transaction.atomic():
+            Habit.objects.bulk_create(habits)
+            cache.invalidate(*[habit.pk for habit in habits if habit.is_publish])
+            cache.invalidate_analytics(request.user.pk)
+
+        return Response(self.get_serializer(habits, many=True).data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        summary="Частичное изменение списка привычек.",
+        request=HabitSerializer(many=True),
+        responses={
+            status.HTTP_200_OK: HabitSerializer(many=True),
+            status.HTTP_400_BAD_REQUEST: CommonDetailSerializer,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+        }
+    )
+    @bulk_create.mapping.patch
+    def bulk_update(self, request):
+        items = self.get_bulk_items()
+        pks = {item.get('pk') for item in items if isinstance(item, dict) and is_pk(item.get('pk'))}
+        instances = self.get_queryset().in_bulk(pks)
+        serializers = self.validate_bulk(items, instances)
+
+        now = timezone.now()
+        habits, fields, published = [], {'utc_minute', 'utc_weekday', 'updated_at'}, []
+        for serializer in serializers:
+            habit = serializer.instance
+            was_published = habit.is_publish
+            for field, value in serializer.validated_data.items():
+                setattr(habit, field, value)
+                fields.add(field)
+            # bulk_update не вызывает save() и не обновляет поля auto_now, часовой пояс владельца
+            # передается явно, чтобы не запрашивать владельца для каждой привычки
+            habit.update_schedule(now, request.user.timezone)
+            habit.updated_at = now
+            # кэш сбрасывается и для привычек, которые перестали быть публичными
+            if was_published or habit.is_publish:
+                published.append(habit.pk)
+            habits.append(habit)
+
+        with transaction.atomic():
+            Habit.objects.bulk_update(habits, sorted(fields))
+            cache.invalidate(*published)
+            cache.invalidate_analytics(request.user.pk)
+
+        return Response(self.get_serializer(habits, many=True).data)
+
+    @extend_schema(
+        summary="Удаление списка привычек.",
+        request=BulkDeleteSerializer,
+        responses={
+            status.HTTP_204_NO_CONTENT: '',
+            status.HTTP_400_BAD_REQUEST: CommonDetailSerializer,
+            status.HTTP_401_UNAUTHORIZED: CommonDetailSerializer,
+        }
+    )
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request):
+        pks = request.data.get('pks') if isinstance(request.data, dict) else None
+        if not isinstance(pks, list) or not pks or not all(is_pk(pk) for pk in pks):
+            raise ValidationError({'pks': ['Ожидается непустой список идентификаторов привычек.']})
+        if len(pks) > self.bulk_max_items:
+            raise ValidationError({'pks': [f'Количество элементов не должно превышать {self.bulk_max_items}.']})
+
+        with transaction.atomic():
+            habits = self.get_queryset().filter(pk__in=pks)
+            found = set(habits.values_list('pk', flat=True))
+            missing = [pk for pk in pks if pk not in found]
+            if missing:
+                raise ValidationError({'pks': [f'Привычки не найдены: {missing}.']})
+            # сигналы удаления сбрасывают кэш публичных привычек, зависимые привычки собраны заранее
+            with attach_published_dependants(found):
+                habits.delete()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,155 @@
+import threading
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'habits:publish'
+LIST_VERSION_KEY = f'{KEY_PREFIX}:list:version'
+ANALYTICS_PREFIX = 'habits:analytics'
+KINDS = ('list', 'detail', 'analytics')
+OUTCOMES = ('hit', 'miss')
+
+
+def list_key(url):
+    return f'{KEY_PREFIX}:list:{url}'
+
+
+def detail_key(pk):
+    return f'{KEY_PREFIX}:detail:{pk}'
+
+
+class CacheStats:
+    """
+    Счетчики попаданий в кэш привычек. Копятся в памяти процесса и сбрасываются в общий кэш
+    каждые flush_every запросов, чтобы не обращаться к redis лишний раз при каждом попадании.
+    """
+
+    flush_every = 100
+
+    def __init__(self):
+        self.counts = self.empty()
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def empty():
+        return {(kind, outcome): 0 for kind in KINDS for outcome in OUTCOMES}
+
+    def record(self, kind, outcome):
+        with self.lock:
+            self.counts[kind, outcome] += 1
+            self.pending += 1
+            if self.pending < self.flush_every:
+                return
+            counts, self.counts, self.pending = self.counts, self.empty(), 0
+        self.flush(counts)
+
+    def flush(self, counts=None):
+        if counts is None:
+            with self.lock:
+                counts, self.counts, self.pending = self.counts, self.empty(), 0
+        for (kind, outcome), count in counts.items():
+            if count:
+                key = f'{KEY_PREFIX}:stats:{kind}:{outcome}'
+                cache.add(key, 0, None)
+                cache.incr(key, count)
+
+    @staticmethod
+    def summary():
+        """
+        Сводка по всем процессам: попадания, промахи и доля попаданий для списка и деталей публичных привычек
+        и статистики.
+        """
+
+        result = {}
+        for kind in KINDS:
+            hits = cache.get(f'{KEY_PREFIX}:stats:{kind}:hit', 0)
+            misses = cache.get(f'{KEY_PREFIX}:stats:{kind}:miss', 0)
+            total = hits + misses
+            result[kind] = {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
+        return result
+
+
+cache_stats = CacheStats()
+
+
+def stats():
+    """
+    Статистика кэша с учетом еще не сброшенных счетчиков текущего процесса.
+    """
+
+    cache_stats.flush()
+    return cache_stats.summary()
+
+
+def get_cached(key, kind):
+    """
+    Данные ответа из кэша или None. Попадания и промахи считаются отдельно для списка, деталей и статистики.
+    """
+
+    data = cache.get(key)
+    cache_stats.record(kind, 'hit' if data is not None else 'miss')
+    return data
+
+
+def set_cached(key, data):
+    cache.set(key, data, settings.HABIT_CACHE_TIMEOUT)
+
+
+def get_versioned(key, version_key, kind):
+    """
+    Данные из кэша, сохраненные при текущей версии version_key, и сама версия. Версия и данные читаются
+    одним обращением к кэшу. Версия меняется при изменении данных (invalidate(), invalidate_analytics()),
+    поэтому записи прежних версий сразу перестают использоваться. Возвращенную версию нужно передать
+    в set_versioned(): данные, прочитанные до смены версии, сохранятся со старой версией и не будут отданы.
+    """
+
+    values = cache.get_many([version_key, key])
+    version = values.get(version_key)
+    if version is None:
+        version = cache.get_or_set(version_key, uuid4().hex, None)
+    entry = values.get(key)
+    data = entry[1] if entry is not None and entry[0] == version else None
+    cache_stats.record(kind, 'hit' if data is not None else 'miss')
+    return data, version
+
+
+def set_versioned(key, version, data):
+    cache.set(key, (version, data), settings.HABIT_CACHE_TIMEOUT)
+
+
+def invalidate(*pks):
+    """
+    Сброс кэша деталей привычек pks и всех страниц списка.
+    Сброс выполняется сразу и повторно после фиксации транзакции, чтобы запрос, прочитавший
+    старые данные до фиксации, не оставил их в кэше.
+    """
+
+    def drop():
+        cache.delete_many([detail_key(pk) for pk in pks])
+        cache.set(LIST_VERSION_KEY, uuid4().hex, None)
+
+    drop()
+    transaction.on_commit(drop)
+
+
+def analytics_key(user_id, *params):
+    return ':'.join([ANALYTICS_PREFIX, str(user_id), *map(str, params)])
+
+
+def analytics_version_key(user_id):
+    """
+    Ключ версии статистики пользователя. Версия меняется при новых выполнениях и изменении привычек пользователя.
+    """
+
+    return f'{ANALYTICS_PREFIX}:version:{user_id}'
+
+
+def invalidate_analytics(user_id):
+    def drop():
+        cache.set(analytics_version_key(user_id), uuid4().hex, None)
+
+    drop()
+    transaction.on_commit(drop)
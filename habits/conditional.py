@@ -0,0 +1,100 @@
+from contextlib import nullcontext
+from hashlib import md5
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from config.http import etag_matches
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Привычка была изменена, получите актуальную версию.'
+    default_code = 'precondition_failed'
+
+
+def make_etag(*parts):
+    return quote_etag(md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def habit_etag(habit):
+    """
+    ETag привычки по времени последнего изменения. Связанная привычка учитывается отдельно,
+    так как при ее удалении ссылка обнуляется без обновления updated_at.
+    """
+
+    return make_etag(habit.pk, habit.updated_at.isoformat(), habit.related_habit_id)
+
+
+def list_etag(queryset, query_string=''):
+    """
+    ETag списка привычек по количеству записей и последнему изменению без сериализации строк.
+    """
+
+    state = queryset.order_by().aggregate(
+        count=Count('pk'), related=Count('related_habit'), updated_at=Max('updated_at')
+    )
+    return make_etag(state['count'], state['related'], state['updated_at'], query_string)
+
+
+class ConditionalHabitMixin:
+    """
+    Условные запросы для привычек пользователя.
+    list и retrieve отдают ETag и отвечают 304 без тела, если он совпал с If-None-Match.
+    update, partial_update и destroy при заголовке If-Match проверяют, что привычка не изменилась
+    (оптимистическая блокировка), иначе отвечают 412. Проверка и запись выполняются в одной транзакции
+    с блокировкой строки (select_for_update), поэтому второй запрос с тем же ETag дождется первого и получит 412.
+    """
+
+    conditional_actions = ('update', 'partial_update', 'destroy')
+
+    def not_modified(self, etag):
+        if etag_matches(self.request.headers.get('If-None-Match'), etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    def list(self, request, *args, **kwargs):
+        etag = list_etag(self.filter_queryset(self.get_queryset()), request.META.get('QUERY_STRING', ''))
+        response = self.not_modified(etag) or super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        habit = self.get_object()
+        etag = habit_etag(habit)
+        response = self.not_modified(etag) or Response(self.get_serializer(habit).data)
+        response['ETag'] = etag
+        return response
+
+    def is_conditional_write(self):
+        return self.action in self.conditional_actions and self.request.headers.get('If-Match') is not None
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.is_conditional_write():
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def conditional_write(self):
+        return transaction.atomic() if self.is_conditional_write() else nullcontext()
+
+    def update(self, request, *args, **kwargs):
+        with self.conditional_write():
+            return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        with self.conditional_write():
+            return super().destroy(request, *args, **kwargs)
+
+    def get_object(self):
+        habit = super().get_object()
+        if self.is_conditional_write() and not etag_matches(self.request.headers['If-Match'], habit_etag(habit)):
+            raise PreconditionFailed()
+        return habit
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.headers = {**self.headers, 'ETag': habit_etag(serializer.instance)}
@@ -0,0 +1,73 @@
+import zlib
+from itertools import islice
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.db.models import F, Func, TextField, Value
+
+from habits.models import Habit, HabitCompletion
+from habits.serializers import HabitReadSerializer
+
+# поля выгрузки: поля привычки как в списке и даты выполнений
+EXPORT_FIELDS = (*HabitReadSerializer.sources, 'completions')
+
+
+def completion_dates(habit_pks):
+    """
+    Даты выполнений привычек habit_pks одной строкой через пробел на привычку: {pk привычки: 'ГГГГ-ММ-ДД ...'}.
+    Даты склеиваются в базе, поэтому на каждое выполнение не создаются объекты Python.
+    """
+
+    day = Func(F('date'), Value('YYYY-MM-DD'), function='TO_CHAR', output_field=TextField())
+    rows = HabitCompletion.objects.filter(habit_id__in=habit_pks).values('habit_id').annotate(
+        dates=StringAgg(day, ' ', ordering='date')
+    ).values_list('habit_id', 'dates')
+    return dict(rows)
+
+
+def export_rows(user, chunk_size=100):
+    """
+    Поток привычек пользователя с историей выполнений для выгрузки.
+    Привычки читаются серверным курсором пачками по chunk_size, выполнения загружаются одним запросом
+    на пачку, поэтому память не зависит от размера аккаунта, а первые строки отдаются сразу.
+    """
+
+    habits = HabitReadSerializer.values(Habit.objects.filter(user=user).order_by('pk')).iterator(chunk_size=chunk_size)
+    serializer = HabitReadSerializer()
+
+    while chunk := list(islice(habits, chunk_size)):
+        dates = completion_dates([row['pk'] for row in chunk])
+        for row in chunk:
+            data = serializer.to_representation(row)
+            data['completions'] = dates.get(row['pk'], '').split()
+            yield data
+
+
+def flat_rows(rows):
+    """
+    Строки для CSV: даты выполнений записываются в одну ячейку через пробел.
+    """
+
+    for row in rows:
+        yield {**row, 'completions': ' '.join(row['completions'])}
+
+
+def batched(lines, size=100):
+    """
+    Склеивание строк ответа в блоки по size строк, чтобы не отправлять клиенту каждую строку отдельно.
+    """
+
+    lines = iter(lines)
+    while batch := ''.join(islice(lines, size)):
+        yield batch.encode()
+
+
+def gzip_stream(chunks, level=6):
+    """
+    Сжатие потока блоков в gzip на лету. После каждого блока сжатые данные сбрасываются клиенту,
+    поэтому первые строки приходят сразу, а не после заполнения буфера компрессора.
+    """
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
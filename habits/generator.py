@@ -0,0 +1,248 @@
+"""
+Генерация синтетических пользователей и привычек для замеров и репетиции миграций на объеме продакшена.
+Данные делятся на части по batch_size пользователей, каждая часть строится своим генератором случайных чисел
+(seed, номер части), поэтому результат не зависит от числа процессов. Первичные ключи резервируются заранее
+сдвигом последовательностей: привычки связываются без чтения вставленных строк, части загружаются через COPY
+параллельно в отдельных процессах, а строки, созданные приложением во время генерации, получают ключи
+после зарезервированного диапазона.
+Пользователи по умолчанию создаются без telegram. С telegram_share id чатов берутся за пределами диапазона
+настоящих id telegram, а username содержит недопустимый в telegram дефис, поэтому напоминания не могут уйти
+в чужие чаты даже с настоящим токеном бота. Адреса почты в домене example.com.
+Генератор предназначен для стендов и локальных баз, а не для рабочей базы.
+"""
+import multiprocessing
+from datetime import time, timedelta
+from functools import partial
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from habits import cache
+from habits.importer import COPY_COLUMNS, copy_rows
+from habits.models import Habit, HabitPeriodicity
+from habits.schedule import MINUTES_IN_DAY, utc_slot
+from users.models import User, UserRole
+
+USER_COLUMNS = (
+    'id', 'password', 'is_superuser', 'first_name', 'last_name', 'is_staff', 'is_active', 'date_joined', 'email',
+    'telegram', 'telegram_id', 'timezone', 'role', 'token_version',
+)
+HABIT_COLUMNS = ('id', *COPY_COLUMNS)
+
+# часовой пояс -> доля пользователей
+TIMEZONES = {
+    'Europe/Moscow': 0.55, 'Asia/Yekaterinburg': 0.1, 'Asia/Novosibirsk': 0.07, 'Asia/Almaty': 0.06,
+    'Europe/Samara': 0.05, 'Europe/Minsk': 0.05, 'Asia/Vladivostok': 0.04, 'Europe/Kaliningrad': 0.03, 'UTC': 0.05,
+}
+# ежедневные привычки встречаются чаще, остальное поровну по дням недели
+PERIODICITY = {HabitPeriodicity.DAILY: 0.65, **{day: 0.05 for day in HabitPeriodicity.values[1:]}}
+# утренний и вечерний пик: (доля, среднее и отклонение в минутах), остальные привычки распределены по суткам
+TIME_PEAKS = ((0.45, 7.5 * 60, 60), (0.35, 20 * 60, 90))
+
+USEFUL_ACTIONS = (
+    'сделать зарядку', 'выпить стакан воды', 'прочитать 10 страниц книги', 'выучить 5 новых слов', 'помыть посуду',
+    'разобрать почту', 'пройти 1000 шагов', 'сделать планку', 'записать расходы', 'полить цветы',
+    'заполнить дневник', 'убрать рабочий стол', 'сделать растяжку', 'повторить урок', 'выключить телефон',
+)
+PLEASANT_ACTIONS = (
+    'выпить кофе', 'послушать любимую песню', 'съесть ягоды', 'посмотреть серию сериала', 'погладить кота',
+    'позвонить другу', 'принять ванну', 'поиграть на гитаре',
+)
+PLACES = ('дома', 'на кухне', 'в парке', 'в офисе', 'в спортзале', 'в транспорте', 'на балконе', 'в библиотеке')
+REWARDS = ('десерт', 'час отдыха', 'новая книга', 'прогулка', 'кино')
+TIMES_TO_COMPLETE = (time(second=30), time(minute=1), time(minute=1, second=30), time(minute=2))
+
+PLEASANT_SHARE = 0.25
+# доли полезных привычек со связанной приятной привычкой и с вознаграждением
+RELATED_SHARE = 0.4
+REWARD_SHARE = 0.3
+# id пользователей и чатов telegram занимают не больше 52 бит, сгенерированные id начинаются за этим пределом
+FAKE_TELEGRAM_ID_BASE = 2 ** 52
+
+
+def plan_parts(users, habits, batch_size, first_user_id, first_habit_id):
+    """
+    Части генерации: (номер, первый id пользователя, пользователей, первый id привычки, привычек).
+    Привычки распределяются по частям пропорционально числу пользователей.
+    """
+
+    parts = []
+    for number, start in enumerate(range(0, users, batch_size)):
+        end = min(start + batch_size, users)
+        habit_start, habit_end = habits * start // users, habits * end // users
+        parts.append(
+            (number, first_user_id + start, end - start, first_habit_id + habit_start, habit_end - habit_start)
+        )
+    return parts
+
+
+def user_rows(rng, first_id, count, password, telegram_share, now):
+    """
+    Строки пользователей и их часовые пояса. telegram_share - доля пользователей с username и id telegram,
+    которые не совпадают ни с одним настоящим чатом.
+    """
+
+    ids = range(first_id, first_id + count)
+    zones = rng.choice(list(TIMEZONES), count, p=list(TIMEZONES.values())).tolist()
+    telegram = (rng.random(count) < telegram_share).tolist()
+    joined = rng.integers(0, 2 * 365 * 24 * 3600, count).tolist()
+
+    rows = [
+        (
+            pk, password, False, '', '', False, True, now - timedelta(seconds=seconds), f'user{pk}@example.com',
+            f'generated-{pk}' if has_telegram else None, FAKE_TELEGRAM_ID_BASE + pk if has_telegram else None,
+            zone, UserRole.MEMBER, 0,
+        )
+        for pk, zone, has_telegram, seconds in zip(ids, zones, telegram, joined)
+    ]
+    return rows, zones
+
+
+def action_minutes(rng, count):
+    """
+    Минута суток выполнения привычек: утренний и вечерний пик и равномерный фон, с шагом 5 минут.
+    """
+
+    shares = [share for share, _, _ in TIME_PEAKS]
+    component = rng.choice(len(TIME_PEAKS) + 1, count, p=[*shares, 1 - sum(shares)])
+    minutes = rng.uniform(0, MINUTES_IN_DAY, count)
+    for number, (_, mean, deviation) in enumerate(TIME_PEAKS):
+        peak = component == number
+        minutes[peak] = rng.normal(mean, deviation, peak.sum())
+    return (np.round(minutes / 5).astype(int) * 5 % MINUTES_IN_DAY).tolist()
+
+
+def habit_rows(rng, first_id, user_ids, zones, count, public_share, now):
+    """
+    Строки привычек. Число привычек у пользователей неравномерно (логнормальное распределение),
+    полезные привычки связываются только с приятными привычками того же пользователя.
+    """
+
+    weights = rng.lognormal(0, 1, len(user_ids))
+    owners = np.repeat(np.arange(len(user_ids)), rng.multinomial(count, weights / weights.sum())).tolist()
+    pleasant = (rng.random(count) < PLEASANT_SHARE).tolist()
+    extras = rng.random(count).tolist()
+    minutes = action_minutes(rng, count)
+    periodicity = rng.choice(list(PERIODICITY), count, p=list(PERIODICITY.values())).tolist()
+    published = (rng.random(count) < public_share).tolist()
+    places = rng.integers(0, len(PLACES), count).tolist()
+    actions = rng.integers(0, max(len(USEFUL_ACTIONS), len(PLEASANT_ACTIONS)), count).tolist()
+    rewards = rng.integers(0, len(REWARDS), count).tolist()
+    durations = rng.integers(0, len(TIMES_TO_COMPLETE), count).tolist()
+    choices = rng.random(count).tolist()
+
+    pleasant_ids = {}
+    for pk, owner, is_pleasant in zip(range(first_id, first_id + count), owners, pleasant):
+        if is_pleasant:
+            pleasant_ids.setdefault(owner, []).append(pk)
+
+    slots, rows = {}, []
+    for number, owner in enumerate(owners):
+        is_pleasant, extra = pleasant[number], extras[number]
+        related_habit = reward = None
+        if not is_pleasant and extra < RELATED_SHARE and owner in pleasant_ids:
+            candidates = pleasant_ids[owner]
+            related_habit = candidates[int(choices[number] * len(candidates))]
+        elif not is_pleasant and extra >= 1 - REWARD_SHARE:
+            reward = REWARDS[rewards[number]]
+
+        actions_list = PLEASANT_ACTIONS if is_pleasant else USEFUL_ACTIONS
+        time_to_action = time(*divmod(minutes[number], 60))
+        slot_key = time_to_action, periodicity[number], zones[owner]
+        if slot_key not in slots:
+            slots[slot_key] = utc_slot(*slot_key, now)
+        utc_minute, utc_weekday = slots[slot_key]
+
+        rows.append((
+            first_id + number, user_ids[owner], PLACES[places[number]], time_to_action,
+            actions_list[actions[number] % len(actions_list)], is_pleasant, related_habit, periodicity[number], reward,
+            TIMES_TO_COMPLETE[durations[number]], published[number], utc_minute, utc_weekday, now, 0, 0,
+        ))
+    return rows
+
+
+def load_part(part, seed, password, public_share, telegram_share, now):
+    """
+    Генерация и загрузка одной части через COPY в одной транзакции. Возвращает число пользователей и привычек.
+    """
+
+    number, first_user_id, users, first_habit_id, habits = part
+    rng = np.random.default_rng([seed, number])
+    users_data, zones = user_rows(rng, first_user_id, users, password, telegram_share, now)
+    habits_data = habit_rows(rng, first_habit_id, [row[0] for row in users_data], zones, habits, public_share, now)
+
+    with transaction.atomic():
+        copy_rows(User, USER_COLUMNS, users_data)
+        copy_rows(Habit, HABIT_COLUMNS, habits_data)
+    return users, habits
+
+
+def load_part_in_process(part, **options):
+    try:
+        return load_part(part, **options)
+    finally:
+        connection.close()
+
+
+def reserve_ids(model, count):
+    """
+    Резервирование count первичных ключей модели сдвигом последовательности до загрузки строк.
+    На время резервирования таблица блокируется от вставок. Возвращает первый зарезервированный ключ.
+    """
+
+    table, column = model._meta.db_table, model._meta.pk.column
+    quoted_table, quoted_column = connection.ops.quote_name(table), connection.ops.quote_name(column)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {quoted_table} IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, column])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            f'SELECT GREATEST((SELECT COALESCE(MAX({quoted_column}), 0) FROM {quoted_table}), '
+            f'(SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM {sequence}))'
+        )
+        last_id = cursor.fetchone()[0]
+        if count:
+            cursor.execute('SELECT setval(%s, %s)', [sequence, last_id + count])
+    return last_id + 1
+
+
+def generate_data(users, habits, seed=0, batch_size=10000, workers=1, password='qwe123', public_share=0.2,
+                  telegram_share=0.0, progress=None):
+    """
+    Генерация users пользователей и habits привычек. При workers > 1 части загружаются параллельно
+    в дочерних процессах. progress вызывается с числом загруженных пользователей и привычек после каждой части.
+    Возвращает (пользователей, привычек).
+    """
+
+    now = timezone.now()
+    first_user_id = reserve_ids(User, users)
+    first_habit_id = reserve_ids(Habit, habits)
+    parts = plan_parts(users, habits, batch_size, first_user_id, first_habit_id)
+    options = {
+        'seed': seed, 'password': make_password(password), 'public_share': public_share,
+        'telegram_share': telegram_share, 'now': now,
+    }
+
+    loaded_users = loaded_habits = 0
+    if workers > 1 and len(parts) > 1:
+        # дочерние процессы не должны использовать соединение родителя
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            for part_users, part_habits in pool.imap_unordered(partial(load_part_in_process, **options), parts):
+                loaded_users, loaded_habits = loaded_users + part_users, loaded_habits + part_habits
+                if progress:
+                    progress(loaded_users, loaded_habits)
+    else:
+        for part in parts:
+            part_users, part_habits = load_part(part, **options)
+            loaded_users, loaded_habits = loaded_users + part_users, loaded_habits + part_habits
+            if progress:
+                progress(loaded_users, loaded_habits)
+
+    with connection.cursor() as cursor:
+        for model in (User, Habit):
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+    cache.invalidate()
+    return loaded_users, loaded_habits
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from config.schema import SCHEMA_RENDERERS, generate_schema, render_schema, schema_path
+
+
+class Command(BaseCommand):
+    help = 'Создание файлов схемы OpenAPI (YAML и JSON), которые отдает /api/schema/ без генерации на каждый запрос.'
+
+    def handle(self, *args, **options):
+        settings.SCHEMA_DIR.mkdir(parents=True, exist_ok=True)
+        schema = generate_schema()
+        for schema_format in SCHEMA_RENDERERS:
+            path = schema_path(schema_format)
+            path.write_bytes(render_schema(schema, schema_format))
+            self.stdout.write(f'Схема записана в {path}.')
@@ -0,0 +1,50 @@
+import os
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from habits.generator import generate_data
+
+
+class Command(BaseCommand):
+    help = ('Генерация синтетических пользователей и привычек для замеров и репетиции миграций. '
+            'Данные загружаются через COPY частями в нескольких процессах и полностью определяются --seed '
+            'и состоянием базы. Только для стендов и локальных баз, не для рабочей базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Количество пользователей.')
+        parser.add_argument('--habits', type=int, default=10000, help='Количество привычек.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000, help='Пользователей в одной части.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Количество процессов загрузки.')
+        parser.add_argument('--password', default='qwe123', help='Пароль всех созданных пользователей.')
+        parser.add_argument('--public-share', type=float, default=0.2, help='Доля публичных привычек.')
+        parser.add_argument('--with-telegram', action='store_true',
+                            help='Заполнить telegram у части пользователей. id чатов и username не совпадают '
+                                 'с настоящими, telegram отклонит отправку в такие чаты.')
+        parser.add_argument('--telegram-share', type=float, default=0.6,
+                            help='Доля пользователей с подключенным telegram при --with-telegram.')
+
+    def handle(self, *args, **options):
+        if options['users'] <= 0 and options['habits'] > 0:
+            raise CommandError('Привычки генерируются только вместе с пользователями, укажите --users.')
+        if options['batch_size'] <= 0:
+            raise CommandError('Размер части --batch-size должен быть больше нуля.')
+
+        started = time.perf_counter()
+
+        def progress(users, habits):
+            self.stdout.write(f'Загружено {users} пользователей и {habits} привычек за '
+                              f'{time.perf_counter() - started:.1f} с.')
+
+        users, habits = generate_data(
+            options['users'], options['habits'], seed=options['seed'], batch_size=options['batch_size'],
+            workers=options['workers'], password=options['password'], public_share=options['public_share'],
+            telegram_share=options['telegram_share'] if options['with_telegram'] else 0.0,
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Создано {users} пользователей и {habits} привычек за {elapsed:.1f} с '
+            f'({(users + habits) / elapsed:.0f} строк/с).'
+        )
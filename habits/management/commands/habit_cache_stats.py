@@ -0,0 +1,12 @@
+import json
+
+from django.core.management import BaseCommand
+
+from habits import cache
+
+
+class Command(BaseCommand):
+    help = 'Статистика кэша привычек (попадания, промахи, доля попаданий) в формате JSON.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(cache.stats()))
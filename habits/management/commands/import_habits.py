@@ -0,0 +1,51 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management import BaseCommand, CommandError
+
+from habits.importer import run_import
+from habits.models import HabitImport, HabitImportFormat
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Загрузка привычек пользователя из локального файла NDJSON или CSV пачками с продолжением после сбоя.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу NDJSON (.ndjson, .jsonl) или CSV (.csv).')
+        parser.add_argument('--user', help='Email пользователя, которому загружаются привычки.')
+        parser.add_argument('--format', choices=HabitImportFormat.values,
+                            help='Формат файла (по умолчанию по расширению).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_create.')
+        parser.add_argument('--resume', type=int, help='Номер прерванной загрузки, которую нужно продолжить.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден.')
+
+        if options['resume']:
+            habit_import = HabitImport.objects.select_related('user').filter(pk=options['resume']).first()
+            if habit_import is None:
+                raise CommandError(f'Загрузка {options["resume"]} не найдена.')
+        else:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError('Укажите email существующего пользователя в --user.')
+            file_format = options['format'] or HabitImportFormat.from_name(path.name)
+            if file_format is None:
+                raise CommandError('Не удалось определить формат файла, укажите --format.')
+            habit_import = HabitImport.objects.create(user=user, format=file_format)
+
+        started = time.perf_counter()
+        with path.open('rb') as stream:
+            run_import(habit_import, stream, options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        for error in habit_import.errors.iterator():
+            self.stderr.write(json.dumps({'row': error.row, 'errors': error.errors}, ensure_ascii=False))
+        self.stdout.write(
+            f'Загрузка {habit_import.pk}: обработано {habit_import.processed}, загружено {habit_import.imported}, '
+            f'с ошибками {habit_import.failed} за {elapsed:.1f} с.'
+        )
@@ -0,0 +1,13 @@
+import json
+
+from django.core.management import BaseCommand
+
+from config.queries import metrics
+
+
+class Command(BaseCommand):
+    help = ('Статистика запросов к базе по представлениям и задачам (вызовы, среднее количество запросов и время, '
+            'превышения бюджета) в формате JSON.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(metrics.summary(), ensure_ascii=False))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0004_alter_habit_user'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['time_to_action', 'periodicity'], name='habit_schedule_idx'),
+        ),
+    ]
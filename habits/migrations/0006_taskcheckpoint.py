@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0005_habit_schedule_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='название')),
+                ('value', models.BigIntegerField(default=0, verbose_name='значение')),
+            ],
+            options={
+                'verbose_name': 'контрольная точка задачи',
+                'verbose_name_plural': 'контрольные точки задач',
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:59
+
+from datetime import time
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import ExtractHour, ExtractMinute, Mod
+from django.utils import timezone
+
+# Расчет слота повторяет habits.schedule.utc_slot на момент миграции: код приложения в миграцию не импортируется,
+# чтобы его изменения не меняли уже примененную миграцию.
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+MINUTES_IN_DAY = 24 * 60
+
+
+def slot_expressions(offset):
+    """
+    Выражения минуты и дня недели UTC для часового пояса со смещением offset минут.
+    Смещение меньше суток, поэтому локальное время переходит не больше чем на один день.
+    """
+
+    local_minute = ExtractHour('time_to_action') * 60 + ExtractMinute('time_to_action')
+    utc_minute = Mod(local_minute - offset + MINUTES_IN_DAY, MINUTES_IN_DAY)
+
+    if offset > 0:
+        # время раньше смещения приходится на предыдущий день UTC
+        shifted, day_shift = {'time_to_action__lt': time(*divmod(offset, 60))}, -1
+    elif offset < 0:
+        shifted, day_shift = {'time_to_action__gte': time(*divmod(MINUTES_IN_DAY + offset, 60))}, 1
+    else:
+        shifted, day_shift = None, 0
+
+    whens = []
+    for index, day in enumerate(WEEKDAYS):
+        if shifted:
+            whens.append(models.When(periodicity=day, **shifted, then=models.Value((index + day_shift) % 7)))
+        whens.append(models.When(periodicity=day, then=models.Value(index)))
+    utc_weekday = models.Case(*whens, default=models.Value(None), output_field=models.SmallIntegerField())
+    return {'utc_minute': utc_minute, 'utc_weekday': utc_weekday}
+
+
+def fill_utc_slots(apps, schema_editor):
+    """
+    Слоты UTC считаются в базе: один UPDATE на каждый часовой пояс пользователей, без загрузки привычек в память.
+    """
+
+    Habit = apps.get_model('habits', 'Habit')
+    User = apps.get_model('users', 'User')
+
+    now = timezone.now()
+    groups = [(tz_name, {'user__timezone': tz_name})
+              for tz_name in User.objects.order_by().values_list('timezone', flat=True).distinct()]
+    groups.append((settings.TIME_ZONE, {'user__isnull': True}))
+
+    for tz_name, lookup in groups:
+        offset = int(now.astimezone(ZoneInfo(tz_name)).utcoffset().total_seconds()) // 60
+        Habit.objects.filter(**lookup).update(**slot_expressions(offset))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0006_taskcheckpoint'),
+        ('users', '0004_user_timezone'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='habit',
+            name='habit_schedule_idx',
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='utc_minute',
+            field=models.SmallIntegerField(default=0, editable=False, verbose_name='минута суток отправки уведомления (UTC)'),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='utc_weekday',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True, verbose_name='день недели отправки уведомления (UTC)'),
+        ),
+        migrations.RunPython(fill_utc_slots, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['utc_minute', 'utc_weekday'], name='habit_utc_slot_idx'),
+        ),
+    ]
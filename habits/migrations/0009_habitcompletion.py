@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0008_habit_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='best_streak',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='лучшая серия выполнений'),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='current_streak',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='текущая серия выполнений'),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='last_completed',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='дата последнего выполнения'),
+        ),
+        migrations.CreateModel(
+            name='HabitCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='дата выполнения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='дата создания')),
+                ('habit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completions', to='habits.habit', verbose_name='привычка')),
+            ],
+            options={
+                'verbose_name': 'выполнение привычки',
+                'verbose_name_plural': 'выполнения привычек',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='habitcompletion',
+            constraint=models.UniqueConstraint(fields=('habit', 'date'), name='habit_completion_date_uniq'),
+        ),
+    ]
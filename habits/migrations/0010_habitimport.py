@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('habits', '0009_habitcompletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HabitImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(blank=True, upload_to='imports/', verbose_name='файл')),
+                ('format', models.CharField(choices=[('ndjson', 'ndjson'), ('csv', 'csv')], max_length=6, verbose_name='формат файла')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='pending', max_length=7, verbose_name='статус')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='обработано строк')),
+                ('imported', models.PositiveIntegerField(default=0, verbose_name='загружено привычек')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='строк с ошибками')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='дата изменения')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='habit_imports', to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'загрузка привычек',
+                'verbose_name_plural': 'загрузки привычек',
+            },
+        ),
+        migrations.CreateModel(
+            name='HabitImportError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.PositiveIntegerField(verbose_name='номер строки')),
+                ('errors', models.JSONField(verbose_name='ошибки')),
+                ('habit_import', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='errors', to='habits.habitimport', verbose_name='загрузка')),
+            ],
+            options={
+                'verbose_name': 'ошибка загрузки привычек',
+                'verbose_name_plural': 'ошибки загрузки привычек',
+                'ordering': ('row',),
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:23
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+# Поисковый вектор хранится в колонке и пересчитывается триггером при вставке и изменении действия или места,
+# поэтому он заполняется и при bulk_create, и при загрузке через COPY.
+SEARCH_VECTOR_TRIGGER = """
+CREATE FUNCTION habits_habit_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := setweight(to_tsvector('russian', coalesce(NEW.action, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(NEW.place, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER habits_habit_search_vector
+BEFORE INSERT OR UPDATE OF action, place, search_vector ON habits_habit
+FOR EACH ROW EXECUTE FUNCTION habits_habit_search_vector();
+
+UPDATE habits_habit SET search_vector = NULL;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER habits_habit_search_vector ON habits_habit;
+DROP FUNCTION habits_habit_search_vector();
+"""
+
+# Триграммный индекс для поиска по части слова и с опечатками. Расширение pg_trgm входит в contrib
+# и может отсутствовать в сборке PostgreSQL, тогда индекс не создается, а поиск работает только по словам.
+TRIGRAM_INDEX = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS habit_publish_action_trgm_idx ON habits_habit
+            USING gin (action gin_trgm_ops) WHERE is_publish;
+    END IF;
+END
+$$;
+"""
+
+DROP_TRIGRAM_INDEX = 'DROP INDEX IF EXISTS habit_publish_action_trgm_idx;'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0010_habitimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True, verbose_name='поисковый вектор'),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+        migrations.AddIndex(
+            model_name='habit',
+            index=django.contrib.postgres.indexes.GinIndex(condition=models.Q(('is_publish', True)), fields=['search_vector'], name='habit_publish_search_idx'),
+        ),
+        migrations.RunSQL(TRIGRAM_INDEX, DROP_TRIGRAM_INDEX),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:40
+
+from django.db import migrations
+
+# Триграммный индекс по месту, как habit_publish_action_trgm_idx по действию (миграция 0011_habit_search):
+# создается, только если установлено расширение pg_trgm.
+TRIGRAM_INDEX = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS habit_publish_place_trgm_idx ON habits_habit
+            USING gin (place gin_trgm_ops) WHERE is_publish;
+    END IF;
+END
+$$;
+"""
+
+DROP_TRIGRAM_INDEX = 'DROP INDEX IF EXISTS habit_publish_place_trgm_idx;'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0011_habit_search'),
+    ]
+
+    operations = [
+        migrations.RunSQL(TRIGRAM_INDEX, DROP_TRIGRAM_INDEX),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:05
+
+from django.db import migrations
+
+# Поиск идет только по опубликованным привычкам (индекс habit_publish_search_idx тоже частичный), поэтому вектор
+# считается только для них: to_tsvector на каждую строку заметно замедлял загрузку из файла, где привычки
+# в основном личные. Триггер срабатывает и при изменении признака публикации.
+SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION habits_habit_search_vector() RETURNS trigger AS $$
+BEGIN
+    IF NEW.is_publish THEN
+        NEW.search_vector := setweight(to_tsvector('russian', coalesce(NEW.action, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.place, '')), 'B');
+    ELSE
+        NEW.search_vector := NULL;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER habits_habit_search_vector ON habits_habit;
+CREATE TRIGGER habits_habit_search_vector
+BEFORE INSERT OR UPDATE OF action, place, is_publish, search_vector ON habits_habit
+FOR EACH ROW EXECUTE FUNCTION habits_habit_search_vector();
+
+UPDATE habits_habit SET search_vector = NULL WHERE NOT is_publish;
+"""
+
+# прежний триггер из миграции 0011_habit_search
+ALL_HABITS_SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION habits_habit_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := setweight(to_tsvector('russian', coalesce(NEW.action, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(NEW.place, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER habits_habit_search_vector ON habits_habit;
+CREATE TRIGGER habits_habit_search_vector
+BEFORE INSERT OR UPDATE OF action, place, search_vector ON habits_habit
+FOR EACH ROW EXECUTE FUNCTION habits_habit_search_vector();
+
+UPDATE habits_habit SET search_vector = NULL WHERE NOT is_publish;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0012_habit_place_trgm'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, ALL_HABITS_SEARCH_VECTOR_TRIGGER),
+    ]
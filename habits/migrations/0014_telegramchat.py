@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0013_habit_search_vector_publish'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramChat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150, unique=True, verbose_name='username telegram')),
+                ('chat_id', models.BigIntegerField(verbose_name='id чата telegram')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='дата обновления')),
+            ],
+            options={
+                'verbose_name': 'чат telegram',
+                'verbose_name_plural': 'чаты telegram',
+            },
+        ),
+    ]
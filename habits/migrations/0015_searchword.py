@@ -0,0 +1,92 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+# Триграммы по каждой строке (индексы habit_publish_action_trgm_idx и habit_publish_place_trgm_idx) на большом
+# каталоге проверяли десятки тысяч строк на запрос. Вместо них похожие слова ищутся в словаре слов опубликованных
+# привычек, а привычки находятся по этим словам через поисковый вектор. Словарь пополняет триггер поискового
+# вектора, как и вектор, только для опубликованных привычек: загрузка личных привычек из файла не замедляется.
+SEARCH_WORDS_TRIGGER = """
+CREATE OR REPLACE FUNCTION habits_habit_search_vector() RETURNS trigger AS $$
+BEGIN
+    IF NEW.is_publish THEN
+        NEW.search_vector := setweight(to_tsvector('russian', coalesce(NEW.action, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.place, '')), 'B');
+        INSERT INTO habits_searchword (word)
+        SELECT DISTINCT word
+        FROM regexp_split_to_table(lower(coalesce(NEW.action, '') || ' ' || coalesce(NEW.place, '')),
+                                   '[^[:alnum:]]+') AS word
+        WHERE length(word) BETWEEN 3 AND 100
+        ON CONFLICT (word) DO NOTHING;
+    ELSE
+        NEW.search_vector := NULL;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+INSERT INTO habits_searchword (word)
+SELECT DISTINCT word
+FROM habits_habit, regexp_split_to_table(lower(action || ' ' || place), '[^[:alnum:]]+') AS word
+WHERE is_publish AND length(word) BETWEEN 3 AND 100
+ON CONFLICT (word) DO NOTHING;
+
+DROP INDEX IF EXISTS habit_publish_action_trgm_idx;
+DROP INDEX IF EXISTS habit_publish_place_trgm_idx;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS habit_search_word_trgm_idx ON habits_searchword USING gin (word gin_trgm_ops);
+    END IF;
+END
+$$;
+"""
+
+# триггер из миграции 0013_habit_search_vector_publish и триграммные индексы из 0011_habit_search и 0012
+DROP_SEARCH_WORDS_TRIGGER = """
+CREATE OR REPLACE FUNCTION habits_habit_search_vector() RETURNS trigger AS $$
+BEGIN
+    IF NEW.is_publish THEN
+        NEW.search_vector := setweight(to_tsvector('russian', coalesce(NEW.action, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.place, '')), 'B');
+    ELSE
+        NEW.search_vector := NULL;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS habit_publish_action_trgm_idx ON habits_habit
+            USING gin (action gin_trgm_ops) WHERE is_publish;
+        CREATE INDEX IF NOT EXISTS habit_publish_place_trgm_idx ON habits_habit
+            USING gin (place gin_trgm_ops) WHERE is_publish;
+    END IF;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0014_telegramchat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=100, unique=True, verbose_name='слово')),
+            ],
+            options={
+                'verbose_name': 'слово поиска',
+                'verbose_name_plural': 'слова поиска',
+            },
+        ),
+        migrations.RunSQL(SEARCH_WORDS_TRIGGER, DROP_SEARCH_WORDS_TRIGGER),
+    ]
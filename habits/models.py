@@ -1,9 +1,17 @@
-from datetime import time
+from datetime import time, timezone as dt_timezone
 
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from habits.cache import invalidate_analytics
+from habits.schedule import slot_ranges, utc_slot
+from habits.streaks import Streak
+
 NULLABLE = {'blank': True, 'null': True}
 
 
@@ -22,6 +30,71 @@ class HabitPeriodicity(models.TextChoices):
     SUNDAY = 'sunday', _('sunday')
 
 
+def reminder_text(action, time_to_action, place):
+    """
+    Текст уведомления о привычке.
+    """
+
+    return f'{action} в {time_to_action} в {place}'
+
+
+class HabitQuerySet(models.QuerySet):
+    """
+    QuerySet для модели Habit с выборками для рассылки уведомлений.
+    """
+
+    def due(self, now):
+        """
+        Привычки, которые нужно выполнить в минуту now.
+        """
+
+        return self.due_between(now, now)
+
+    def due_between(self, start, end):
+        """
+        Привычки, которые нужно выполнить в любую из минут окна [start, end] (окно короче суток).
+        Поиск идет по предрассчитанному слоту UTC и использует индекс habit_utc_slot_idx.
+        """
+
+        condition = Q()
+        for weekday, first, last in slot_ranges(start.astimezone(dt_timezone.utc), end.astimezone(dt_timezone.utc)):
+            condition |= Q(utc_minute__range=(first, last)) & (Q(utc_weekday=weekday) | Q(utc_weekday__isnull=True))
+
+        return self.filter(condition)
+
+    def reschedule(self, now=None, batch_size=1000):
+        """
+        Пересчет слотов UTC для привычек queryset с учетом часовых поясов их пользователей.
+        Сохраняются только привычки, слот которых изменился. Возвращает количество измененных привычек.
+        """
+
+        now = now or timezone.now()
+        changed = []
+        rows = self.select_related('user').only(
+            'pk', 'time_to_action', 'periodicity', 'utc_minute', 'utc_weekday', 'user__timezone'
+        )
+        for habit in rows.iterator(chunk_size=batch_size):
+            slot = habit.utc_minute, habit.utc_weekday
+            habit.update_schedule(now)
+            if (habit.utc_minute, habit.utc_weekday) != slot:
+                changed.append(habit)
+
+        self.model.objects.bulk_update(changed, ['utc_minute', 'utc_weekday'], batch_size=batch_size)
+        return len(changed)
+
+    def reminders(self, chunk_size=2000):
+        """
+        Поток пар (chat_id, text) для отправки уведомлений.
+        Пользователь подтягивается в том же запросе, строки читаются курсором по chunk_size штук.
+        """
+
+        rows = self.filter(user__telegram_id__isnull=False).values_list(
+            'user__telegram_id', 'action', 'time_to_action', 'place'
+        )
+        for chat_id, action, time_to_action, place in rows.iterator(chunk_size=chunk_size):
+            yield chat_id, reminder_text(action, time_to_action, place)
+
+
 class Habit(models.Model):
     """
     Habit model.
@@ -72,10 +145,362 @@ class Habit(models.Model):
         default=False,
         verbose_name='признак публичности'
     )
+    utc_minute = models.SmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='минута суток отправки уведомления (UTC)'
+    )
+    utc_weekday = models.SmallIntegerField(
+        **NULLABLE,
+        editable=False,
+        verbose_name='день недели отправки уведомления (UTC)'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='дата изменения'
+    )
+    current_streak = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='текущая серия выполнений'
+    )
+    best_streak = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='лучшая серия выполнений'
+    )
+    last_completed = models.DateField(
+        **NULLABLE,
+        editable=False,
+        verbose_name='дата последнего выполнения'
+    )
+    search_vector = SearchVectorField(
+        **NULLABLE,
+        editable=False,
+        verbose_name='поисковый вектор'
+    )
+
+    objects = HabitQuerySet.as_manager()
 
     def __str__(self):
-        return f'{self.action} в {self.time_to_action} в {self.place}'
+        return reminder_text(self.action, self.time_to_action, self.place)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        # Запоминаем загруженный признак публичности, чтобы при снятии публикации сбросить кэш
+        instance._loaded_is_publish = loaded.get('is_publish', False)
+        # и расписание, чтобы не пересчитывать слот UTC (и не загружать владельца) при неизменном времени
+        if 'time_to_action' in loaded and 'periodicity' in loaded:
+            instance._loaded_schedule = loaded['time_to_action'], loaded['periodicity']
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self.schedule_changed() and (update_fields is None or {'time_to_action', 'periodicity'} & {*update_fields}):
+            self.update_schedule()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'utc_minute', 'utc_weekday'}
+        super().save(*args, **kwargs)
+        # сохраненные значения становятся загруженными для следующего save() того же экземпляра
+        self._loaded_is_publish = self.is_publish
+        self._loaded_schedule = self.schedule
+
+    @property
+    def schedule(self):
+        return self._meta.get_field('time_to_action').to_python(self.time_to_action), self.periodicity
+
+    def schedule_changed(self):
+        """
+        Новая привычка или время и периодичность изменились после загрузки. Слоты существующих привычек
+        при переходе на летнее время и смене часового пояса пересчитываются отдельно (reschedule()).
+        """
+
+        loaded = getattr(self, '_loaded_schedule', None)
+        return self._state.adding or loaded is None or loaded != self.schedule
+
+    def update_schedule(self, now=None, tz_name=None):
+        """
+        Расчет слота UTC для отправки уведомления по часовому поясу пользователя. Если tz_name не передан,
+        часовой пояс берется у владельца, который загружается отдельным запросом, если еще не загружен.
+        """
+
+        if tz_name is None:
+            tz_name = self.user.timezone if self.user_id else settings.TIME_ZONE
+        time_to_action, periodicity = self.schedule
+        self.utc_minute, self.utc_weekday = utc_slot(time_to_action, periodicity, tz_name, now or timezone.now())
+
+    @property
+    def streak(self):
+        return Streak(self.current_streak, self.best_streak, self.last_completed)
+
+    def complete(self, dates):
+        """
+        Запись выполнений привычки в даты dates и обновление серий.
+        Выполнения только добавляются, повторная дата игнорируется. Если все даты не раньше последнего выполнения,
+        серия продолжается без чтения истории, иначе пересчитывается по истории выполнений.
+        """
+
+        dates = sorted(set(dates))
+        with transaction.atomic():
+            habit = Habit.objects.select_for_update().only(
+                'pk', 'user_id', 'periodicity', 'current_streak', 'best_streak', 'last_completed'
+            ).get(pk=self.pk)
+            HabitCompletion.objects.bulk_create(
+                [HabitCompletion(habit=habit, date=day) for day in dates], ignore_conflicts=True
+            )
+
+            streak = habit.streak
+            if streak.last_completed is None or dates[0] >= streak.last_completed:
+                for day in dates:
+                    streak.add(day, habit.periodicity)
+            else:
+                history = habit.completions.order_by('date').values_list('date', flat=True)
+                streak = Streak.from_dates(history, habit.periodicity)
+
+            Habit.objects.filter(pk=self.pk).update(
+                current_streak=streak.current, best_streak=streak.best, last_completed=streak.last_completed
+            )
+            if habit.user_id:
+                invalidate_analytics(habit.user_id)
+
+        self.current_streak, self.best_streak, self.last_completed = streak.current, streak.best, streak.last_completed
+        return streak
 
     class Meta:
         verbose_name = 'привычка'
         verbose_name_plural = 'привычки'
+        indexes = [
+            models.Index(fields=['utc_minute', 'utc_weekday'], name='habit_utc_slot_idx'),
+            GinIndex(fields=['search_vector'], name='habit_publish_search_idx', condition=Q(is_publish=True)),
+        ]
+
+
+class HabitCompletion(models.Model):
+    """
+    Отметка о выполнении привычки за дату. Записи только добавляются.
+    """
+
+    habit = models.ForeignKey(
+        Habit,
+        on_delete=models.CASCADE,
+        related_name='completions',
+        verbose_name='привычка'
+    )
+    date = models.DateField(
+        verbose_name='дата выполнения'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='дата создания'
+    )
+
+    def __str__(self):
+        return f'{self.habit_id}: {self.date}'
+
+    class Meta:
+        verbose_name = 'выполнение привычки'
+        verbose_name_plural = 'выполнения привычек'
+        constraints = [
+            models.UniqueConstraint(fields=['habit', 'date'], name='habit_completion_date_uniq'),
+        ]
+
+
+class SearchWord(models.Model):
+    """
+    Слово из действий и мест опубликованных привычек. По словарю ищутся слова, похожие на слова поискового
+    запроса (habits.search), словарь пополняется триггером поискового вектора.
+    """
+
+    word = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='слово'
+    )
+
+    def __str__(self):
+        return self.word
+
+    class Meta:
+        verbose_name = 'слово поиска'
+        verbose_name_plural = 'слова поиска'
+
+
+class TaskCheckpoint(models.Model):
+    """
+    Контрольная точка периодической задачи (например, offset обновлений telegram).
+    """
+
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='название'
+    )
+    value = models.BigIntegerField(
+        default=0,
+        verbose_name='значение'
+    )
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+    class Meta:
+        verbose_name = 'контрольная точка задачи'
+        verbose_name_plural = 'контрольные точки задач'
+
+
+class TelegramChat(models.Model):
+    """
+    Чат telegram, написавший боту: username (без @ и в нижнем регистре) и id.
+    Обновления бота запрашиваются один раз, поэтому id сохраняется и для тех, кто еще не зарегистрирован
+    или указал другой username, и назначается пользователю, когда username совпадет.
+    """
+
+    username = models.CharField(
+        max_length=150,
+        unique=True,
+        verbose_name='username telegram'
+    )
+    chat_id = models.BigIntegerField(
+        verbose_name='id чата telegram'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='дата обновления'
+    )
+
+    def __str__(self):
+        return f'{self.username}: {self.chat_id}'
+
+    class Meta:
+        verbose_name = 'чат telegram'
+        verbose_name_plural = 'чаты telegram'
+
+
+class HabitImportFormat(models.TextChoices):
+    """
+    Модель с константами для выбора формата файла в модели HabitImport.
+    """
+
+    NDJSON = 'ndjson', _('ndjson')
+    CSV = 'csv', _('csv')
+
+    @classmethod
+    def from_name(cls, name):
+        """
+        Формат по расширению имени файла или None.
+        """
+
+        extensions = {'.ndjson': cls.NDJSON, '.jsonl': cls.NDJSON, '.csv': cls.CSV}
+        return next((value for ext, value in extensions.items() if name.lower().endswith(ext)), None)
+
+
+class HabitImportStatus(models.TextChoices):
+    """
+    Модель с константами для выбора статуса в модели HabitImport.
+    """
+
+    PENDING = 'pending', _('pending')
+    RUNNING = 'running', _('running')
+    DONE = 'done', _('done')
+    FAILED = 'failed', _('failed')
+
+
+class HabitImportQuerySet(models.QuerySet):
+
+    def resumable(self):
+        """
+        Загрузки, которые можно продолжить: завершенные ошибкой и зависшие. Зависшая загрузка осталась
+        в статусе running, но не обновлялась дольше HABIT_IMPORT_STALE_AFTER: воркер был остановлен
+        (деплой, нехватка памяти, CELERY_TASK_TIME_LIMIT) и не успел записать ошибку.
+        """
+
+        stale = Q(status=HabitImportStatus.RUNNING, updated_at__lt=timezone.now() - settings.HABIT_IMPORT_STALE_AFTER)
+        return self.filter(Q(status=HabitImportStatus.FAILED) | stale)
+
+
+class HabitImport(models.Model):
+    """
+    Загрузка привычек из файла. Счетчики обновляются в одной транзакции с каждой вставленной пачкой,
+    поэтому прерванная загрузка продолжается со строки processed + 1.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='habit_imports',
+        verbose_name='пользователь'
+    )
+    file = models.FileField(
+        upload_to='imports/',
+        blank=True,
+        verbose_name='файл'
+    )
+    format = models.CharField(
+        max_length=6,
+        choices=HabitImportFormat.choices,
+        verbose_name='формат файла'
+    )
+    status = models.CharField(
+        max_length=7,
+        choices=HabitImportStatus.choices,
+        default=HabitImportStatus.PENDING,
+        verbose_name='статус'
+    )
+    processed = models.PositiveIntegerField(
+        default=0,
+        verbose_name='обработано строк'
+    )
+    imported = models.PositiveIntegerField(
+        default=0,
+        verbose_name='загружено привычек'
+    )
+    failed = models.PositiveIntegerField(
+        default=0,
+        verbose_name='строк с ошибками'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='дата создания'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='дата изменения'
+    )
+
+    objects = HabitImportQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.user_id}: {self.processed} ({self.status})'
+
+    class Meta:
+        verbose_name = 'загрузка привычек'
+        verbose_name_plural = 'загрузки привычек'
+
+
+class HabitImportError(models.Model):
+    """
+    Ошибки проверки строки файла загрузки привычек.
+    """
+
+    habit_import = models.ForeignKey(
+        HabitImport,
+        on_delete=models.CASCADE,
+        related_name='errors',
+        verbose_name='загрузка'
+    )
+    row = models.PositiveIntegerField(
+        verbose_name='номер строки'
+    )
+    errors = models.JSONField(
+        verbose_name='ошибки'
+    )
+
+    def __str__(self):
+        return f'{self.habit_import_id}: {self.row}'
+
+    class Meta:
+        verbose_name = 'ошибка загрузки привычек'
+        verbose_name_plural = 'ошибки загрузки привычек'
+        ordering = ('row',)
@@ -1,4 +1,11 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.response import Response
+
+from habits.search import SEARCH_MAX_RESULTS
 
 
 class MyPaginator(PageNumberPagination):
@@ -9,3 +16,71 @@ class MyPaginator(PageNumberPagination):
     page_size = 5  # Количество элементов на странице
     page_size_query_param = 'page_size'  # Параметр запроса для указания количества элементов на странице
     max_page_size = 50  # Максимальное количество элементов на странице
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Paginator Django, который считает строки не дальше max_count: подсчет всех совпадений частого слова
+    читает каждую найденную строку. Страницы за пределами max_count не отдаются.
+    """
+
+    max_count = SEARCH_MAX_RESULTS  # Столько же строк ранжирует habits.search.search_habits
+
+    @cached_property
+    def count(self):
+        return self.object_list.order_by().values('pk')[:self.max_count].count()
+
+
+class SearchPaginator(MyPaginator):
+    """
+    Постраничный вывод результатов поиска по номерам страниц, количество не больше SEARCH_MAX_RESULTS.
+    """
+
+    django_paginator_class = CappedCountPaginator
+
+
+class HabitCursorPaginator(CursorPagination):
+    """
+    Курсорная (keyset) пагинация для привычек по первичному ключу.
+    Страница выбирается условием pk > курсор, поэтому время ответа не зависит от глубины страницы.
+    Общее количество не считается по умолчанию, по запросу ?count=true возвращается оценка из плана запроса
+    (для небольших выборок - точное значение).
+    """
+
+    page_size = 5  # Количество элементов на странице
+    page_size_query_param = 'page_size'  # Параметр запроса для указания количества элементов на странице
+    max_page_size = 50  # Максимальное количество элементов на странице
+    ordering = 'pk'
+    count_query_param = 'count'  # Параметр запроса для получения количества элементов
+    exact_count_threshold = 10000  # До какого количества строк по оценке считать точное количество
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = self.estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def estimate_count(self, queryset):
+        """
+        Оценка количества строк по плану запроса без полного прохода по таблице.
+        """
+
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate < self.exact_count_threshold:
+            return queryset.count()
+        return estimate
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'] = {
+            'count': {'type': 'integer', 'example': 123},
+            **response_schema['properties'],
+        }
+        return response_schema
@@ -9,7 +9,8 @@ class IsOwner(BasePermission):
     message = 'Вы не являетесь владельцем.'
 
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.user
+        # сравнение по идентификатору не загружает пользователя привычки
+        return obj.user_id == request.user.pk
 
 
 class IsPublish(BasePermission):
@@ -0,0 +1,110 @@
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+# Скрипт атомарно проверяет все переданные корзины токенов и списывает по токену из каждой.
+# Если токена нет хотя бы в одной корзине, при ARGV[1] = 1 токены все равно списываются (корзина уходит в минус)
+# и место в очереди резервируется за запросом: возвращается время ожидания в миллисекундах до его собственного
+# слота (общего для всех корзин). Следующий запрос получает слот после него, поэтому отложенные запросы
+# не сталкиваются повторно.
+# При ARGV[1] = 0 токены списываются только если они есть во всех корзинах, иначе возвращается время ожидания.
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local reserve = tonumber(ARGV[1]) == 1
+local wait = 0
+local tokens = {}
+
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now_ms
+    available = math.min(burst, available + (now_ms - ts) * rate / 1000)
+    if available < 1 then
+        wait = math.max(wait, math.ceil((1 - available) * 1000 / rate))
+    end
+    tokens[i] = available
+end
+
+if wait > 0 and not reserve then
+    return wait
+end
+
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    -- токен расходуется в момент now + wait: если корзина успела бы заполниться раньше, излишек пропадает
+    tokens[i] = math.min(tokens[i], burst - wait * rate / 1000) - 1
+    redis.call('HSET', key, 'tokens', tokens[i], 'ts', now_ms)
+    -- корзина хранится, пока не восполнится полностью, с учетом зарезервированных токенов
+    redis.call('PEXPIRE', key, math.ceil((burst - tokens[i]) * 1000 / rate) + 1000)
+end
+return wait
+"""
+
+
+@lru_cache
+def redis_client(url):
+    """
+    Клиент Redis с общим пулом соединений на процесс.
+    """
+
+    return redis.Redis.from_url(url)
+
+
+class TelegramRateLimiter:
+    """
+    Общий для всех воркеров ограничитель запросов к telegram на основе корзин токенов в Redis.
+    Одна корзина ограничивает общее количество запросов бота в секунду, отдельные корзины - сообщения в каждый чат.
+    Также ведет счетчики отправленных и задержанных сообщений.
+    """
+
+    key_prefix = 'telegram:ratelimit'
+
+    def __init__(self, client=None, global_rate=None, chat_rate=None):
+        self.client = client or redis_client(settings.REDIS_URL)
+        self.global_rate = global_rate or settings.TG_RATE_LIMIT_GLOBAL
+        self.chat_rate = chat_rate or settings.TG_RATE_LIMIT_PER_CHAT
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def acquire(self, chat_id=None, reserve=True):
+        """
+        Попытка взять токен на запрос (для сообщения - с учетом лимита чата chat_id).
+        Возвращает 0, если запрос можно выполнять сразу, иначе количество секунд до появления токена.
+        При reserve токен списывается и в этом случае: запрос должен быть выполнен ровно через возвращенное время
+        без повторного обращения к ограничителю. Без reserve при отсутствии токена ничего не списывается.
+        """
+
+        keys = [f'{self.key_prefix}:global']
+        args = [int(reserve), self.global_rate, self.global_rate]
+        if chat_id is not None:
+            keys.append(f'{self.key_prefix}:chat:{chat_id}')
+            args += [self.chat_rate, self.chat_rate]
+
+        return self.script(keys=keys, args=args) / 1000
+
+    def record(self, metric, amount=1):
+        """
+        Увеличение счетчика метрики (sent, throttled, rate_limited, failed, dropped).
+        """
+
+        self.client.hincrby(f'{self.key_prefix}:metrics', metric, amount)
+
+    def metrics(self):
+        """
+        Текущие значения счетчиков метрик.
+        """
+
+        return {key.decode(): int(value) for key, value in self.client.hgetall(f'{self.key_prefix}:metrics').items()}
+
+    def reset(self):
+        """
+        Удаление всех корзин и счетчиков ограничителя.
+        """
+
+        keys = list(self.client.scan_iter(f'{self.key_prefix}:*'))
+        if keys:
+            self.client.delete(*keys)
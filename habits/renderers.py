@@ -0,0 +1,76 @@
+import csv
+import json
+from itertools import islice
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Рендерер для формата NDJSON: один JSON-объект на строку.
+    Используется для выбора потокового ответа через ?format=ndjson или заголовок Accept.
+    """
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(ndjson_lines(rows)).encode()
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Рендерер для формата CSV: строка заголовка с полями первого объекта и по строке на объект.
+    """
+
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        fields = list(rows[0]) if rows else []
+        return ''.join(csv_lines(rows, fields)).encode()
+
+
+class LineBuffer:
+    """
+    Буфер для csv.writer, который возвращает записанную строку, а не накапливает ее.
+    """
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(rows):
+    """
+    Строки NDJSON для итерируемого объекта словарей.
+    """
+
+    for row in rows:
+        yield json.dumps(row, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows, fields):
+    """
+    Строки CSV для итерируемого объекта словарей: заголовок из fields и значения этих полей.
+    """
+
+    writer = csv.writer(LineBuffer())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def serialize_in_chunks(queryset, serializer_class, chunk_size=500, context=None):
+    """
+    Поток сериализованных объектов queryset. Строки читаются серверным курсором
+    и сериализуются пачками по chunk_size, поэтому память не зависит от размера выборки.
+    """
+
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield from serializer_class(chunk, many=True, context=context).data
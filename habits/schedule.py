@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+MINUTES_IN_DAY = 24 * 60
+
+
+def utc_offset_minutes(tz_name, now):
+    """
+    Смещение часового пояса относительно UTC в минутах на момент now.
+    """
+
+    return int(now.astimezone(ZoneInfo(tz_name)).utcoffset().total_seconds()) // 60
+
+
+def utc_slot(time_to_action, periodicity, tz_name, now):
+    """
+    Перевод локального времени привычки в слот UTC: (минута суток, день недели).
+    Для ежедневных привычек день недели равен None.
+    Смещение часового пояса берется на момент now, при переходе на летнее/зимнее время слоты пересчитываются
+    периодической задачей rebucket_habit_schedule.
+    """
+
+    minutes = time_to_action.hour * 60 + time_to_action.minute - utc_offset_minutes(tz_name, now)
+    day_shift, minute = divmod(minutes, MINUTES_IN_DAY)
+
+    if periodicity in WEEKDAYS:
+        return minute, (WEEKDAYS.index(periodicity) + day_shift) % 7
+    return minute, None
+
+
+def minute_index(moment):
+    """
+    Номер минуты от начала эпохи Unix для момента moment.
+    """
+
+    return int(moment.timestamp()) // 60
+
+
+def from_minute_index(index):
+    """
+    Момент в UTC по номеру минуты от начала эпохи Unix.
+    """
+
+    return datetime.fromtimestamp(index * 60, tz=timezone.utc)
+
+
+def slot_ranges(start, end):
+    """
+    Разбиение окна минут [start, end] (в UTC) на отрезки в пределах суток:
+    список (день недели, первая минута суток, последняя минута суток).
+    """
+
+    start = start.replace(second=0, microsecond=0)
+    end = end.replace(second=0, microsecond=0)
+
+    ranges = []
+    day = start.replace(hour=0, minute=0)
+    while day <= end:
+        first = max(start, day)
+        last = min(end, day + timedelta(days=1, minutes=-1))
+        ranges.append((day.weekday(), first.hour * 60 + first.minute, last.hour * 60 + last.minute))
+        day += timedelta(days=1)
+    return ranges
@@ -0,0 +1,81 @@
+import re
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+from habits.models import SearchWord
+
+# конфигурация полнотекстового поиска, та же, что в триггере поискового вектора (миграция 0011_habit_search)
+SEARCH_CONFIG = 'russian'
+# сколько найденных привычек ранжируется, больше страниц результатов поиска не отдается
+SEARCH_MAX_RESULTS = 1000
+# сколько похожих слов из словаря добавляется к запросу
+SIMILAR_WORDS_LIMIT = 20
+# слова запроса, как их выделяет триггер словаря (миграция 0015_searchword); короткие слова не сравниваются
+WORD_SEPARATOR = re.compile(r'[\W_]+')
+MIN_WORD_LENGTH = 3
+
+
+@lru_cache
+def trigram_available():
+    """
+    Установлено ли расширение pg_trgm. Без него поиск идет только по словам.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def similar_words(text):
+    """
+    Слова словаря SearchWord, похожие на слова запроса по триграммам (индекс habit_search_word_trgm_idx):
+    исправления опечаток и полные слова для их начала. Сначала самые похожие.
+    """
+
+    words = [word for word in WORD_SEPARATOR.split(text.lower()) if len(word) >= MIN_WORD_LENGTH]
+    if not words:
+        return []
+
+    similarity = [TrigramWordSimilarity(word, 'word') for word in words]
+    return list(
+        SearchWord.objects.filter(reduce(or_, (Q(word__trigram_word_similar=word) for word in words)))
+        .order_by((Greatest(*similarity) if len(similarity) > 1 else similarity[0]).desc(), 'word')
+        .values_list('word', flat=True)[:SIMILAR_WORDS_LIMIT]
+    )
+
+
+def search_habits(queryset, text):
+    """
+    Поиск привычек по действию и месту с сортировкой по релевантности.
+    Слова ищутся по поисковому вектору (индекс habit_publish_search_idx), совпадение в действии весит больше,
+    чем в месте. Если установлен pg_trgm, к запросу добавляются похожие слова из словаря (similar_words),
+    что находит часть слова и опечатки. Привычки с такими словами добавляются после точных совпадений,
+    только если точных меньше SEARCH_MAX_RESULTS.
+
+    Ранжируются не больше SEARCH_MAX_RESULTS найденных строк, взятых в порядке чтения индекса: для частых слов
+    (десятки тысяч совпадений) время запроса иначе определялось чтением каждой найденной строки таблицы.
+    Лучшие совпадения частого слова могут не попасть в выборку, для них нужен более точный запрос.
+    """
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    candidates = queryset.filter(search_vector=query).order_by().values('pk')[:SEARCH_MAX_RESULTS]
+
+    words = similar_words(text) if trigram_available() else []
+    if words:
+        similar = reduce(or_, (SearchQuery(word, config=SEARCH_CONFIG) for word in words))
+        # ветки UNION ALL читаются по порядку и чтение останавливается на лимите
+        candidates = candidates.union(
+            queryset.filter(search_vector=similar).order_by().values('pk')[:SEARCH_MAX_RESULTS], all=True
+        )[:SEARCH_MAX_RESULTS]
+        query |= similar
+
+    # нормализация 1: при прочих равных выше привычки с более коротким описанием
+    rank = SearchRank(F('search_vector'), query, normalization=1)
+    # найденные строки выбираются один раз: подсчет и страница дальше читают их по первичному ключу
+    pks = [row['pk'] for row in candidates]
+    return queryset.filter(pk__in=pks).annotate(rank=rank).order_by('-rank', 'pk')
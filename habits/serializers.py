@@ -1,15 +1,47 @@
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
-from habits.models import Habit
+from habits.models import Habit, HabitImport, HabitImportError, HabitImportFormat
 from habits.validators import CheckRelatedHabitOrReward, CheckRelatedHabit, CheckPleasantHabit, CheckTimeToComplete, \
     CheckPeriodicity
 
 
+class RelatedHabitField(serializers.PrimaryKeyRelatedField):
+    """
+    Поле связанной привычки. Выбирать можно только свои привычки, загружаются только поля, нужные валидаторам.
+    При массовых операциях привычки заранее загружаются одним запросом
+    и передаются в контексте сериалайзера по ключу related_habits, иначе каждая ищется отдельным запросом.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset().only('pk', 'user_id', 'is_pleasant_habit')
+        request = self.context.get('request')
+        if request is not None:
+            queryset = queryset.filter(user_id=request.user.pk)
+        return queryset
+
+    def to_internal_value(self, data):
+        related_habits = self.context.get('related_habits')
+        if related_habits is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return related_habits[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class HabitSerializer(serializers.ModelSerializer):
     """
     Сериалайзер для модели Hebit.
     """
 
+    related_habit = RelatedHabitField(queryset=Habit.objects.all(), allow_null=True, required=False)
+
     class Meta:
         model = Habit
         fields = (
@@ -25,12 +57,159 @@ class HabitSerializer(serializers.ModelSerializer):
             'time_to_complete',
             'is_publish'
         )
+        # владелец привычки всегда текущий пользователь
+        read_only_fields = ('user',)
         validators = [
             CheckRelatedHabitOrReward(), CheckRelatedHabit(), CheckPleasantHabit(), CheckTimeToComplete(),
             CheckPeriodicity()
         ]
 
 
+class HabitReadSerializer(serializers.BaseSerializer):
+    """
+    Сериалайзер только для чтения списков привычек.
+    Принимает строки из values() (см. values) и собирает ответ напрямую, без полей ModelSerializer.
+    Вывод совпадает с HabitSerializer.
+    """
+
+    # поле ответа -> поле values()
+    sources = {
+        'pk': 'pk',
+        'user': 'user_id',
+        'place': 'place',
+        'time_to_action': 'time_to_action',
+        'action': 'action',
+        'is_pleasant_habit': 'is_pleasant_habit',
+        'related_habit': 'related_habit_id',
+        'periodicity': 'periodicity',
+        'reward': 'reward',
+        'time_to_complete': 'time_to_complete',
+        'is_publish': 'is_publish',
+    }
+    time_fields = ('time_to_action', 'time_to_complete')
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.sources.values())
+
+    def to_representation(self, row):
+        data = {field: row[source] for field, source in self.sources.items()}
+        for field in self.time_fields:
+            if data[field] is not None:
+                data[field] = data[field].isoformat()
+        return data
+
+
+class HabitCompletionSerializer(serializers.Serializer):
+    """
+    Сериалайзер отметки о выполнении привычки. Без даты выполнение отмечается сегодняшним днем пользователя,
+    дата в будущем не принимается. Сегодняшняя дата передается в контексте по ключу today.
+    """
+
+    date = serializers.DateField(required=False)
+
+    def validate_date(self, value):
+        if value > self.context['today']:
+            raise serializers.ValidationError('Нельзя отметить выполнение в будущем.')
+        return value
+
+
+class HabitBackfillSerializer(serializers.Serializer):
+    """
+    Сериалайзер загрузки истории выполнений привычки.
+    """
+
+    dates = serializers.ListField(child=serializers.DateField(), allow_empty=False, max_length=3660)
+
+    def validate_dates(self, value):
+        if max(value) > self.context['today']:
+            raise serializers.ValidationError('Нельзя отметить выполнение в будущем.')
+        return value
+
+
+class StreakSerializer(serializers.Serializer):
+    """
+    Серии выполнений привычки.
+    """
+
+    current_streak = serializers.IntegerField()
+    best_streak = serializers.IntegerField()
+    last_completed = serializers.DateField(allow_null=True)
+
+
+class HabitAnalyticsItemSerializer(serializers.Serializer):
+    """
+    Статистика выполнения одной привычки.
+    """
+
+    pk = serializers.IntegerField()
+    action = serializers.CharField()
+    completions = serializers.IntegerField()
+    completion_rate = serializers.FloatField()
+    weekdays = serializers.ListField(child=serializers.IntegerField())
+
+
+class HabitAnalyticsSerializer(serializers.Serializer):
+    """
+    Статистика выполнения привычек пользователя за период.
+    weekdays - количество выполнений по дням недели (с понедельника),
+    hours - по часам, на которые назначены выполненные привычки.
+    """
+
+    start = serializers.DateField()
+    end = serializers.DateField()
+    completions = serializers.IntegerField()
+    completion_rate = serializers.FloatField()
+    weekdays = serializers.ListField(child=serializers.IntegerField())
+    hours = serializers.ListField(child=serializers.IntegerField())
+    habits = HabitAnalyticsItemSerializer(many=True)
+
+
+class HabitImportCreateSerializer(serializers.Serializer):
+    """
+    Сериалайзер файла для загрузки привычек. Без file_format формат определяется по расширению файла.
+    """
+
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=HabitImportFormat.choices, required=False)
+
+    def validate(self, data):
+        if 'file_format' not in data:
+            file_format = HabitImportFormat.from_name(data['file'].name)
+            if file_format is None:
+                raise serializers.ValidationError({'file_format': ['Не удалось определить формат файла.']})
+            data['file_format'] = file_format
+        return data
+
+
+class HabitImportErrorSerializer(serializers.ModelSerializer):
+    """
+    Сериалайзер ошибок строки файла загрузки привычек.
+    """
+
+    class Meta:
+        model = HabitImportError
+        fields = ('row', 'errors')
+
+
+class HabitImportSerializer(serializers.ModelSerializer):
+    """
+    Сериалайзер хода загрузки привычек. В errors - первые ошибки по строкам, всего строк с ошибками - failed.
+    """
+
+    errors_limit = 100
+
+    errors = serializers.SerializerMethodField()
+
+    class Meta:
+        model = HabitImport
+        fields = ('pk', 'format', 'status', 'processed', 'imported', 'failed', 'created_at', 'updated_at', 'errors')
+
+    @extend_schema_field(HabitImportErrorSerializer(many=True))
+    def get_errors(self, habit_import):
+        return HabitImportErrorSerializer(habit_import.errors.all()[:self.errors_limit], many=True).data
+
+
 class CommonDetailSerializer(serializers.Serializer):
     """
     Сериалайзер для drf-spectacular документации.
@@ -46,3 +225,11 @@ class CommonDetailAndStatusSerializer(serializers.Serializer):
     """
     status = serializers.IntegerField()
     details = serializers.CharField()
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+    """
+    Сериалайзер для drf-spectacular документации.
+    Показывает тело запроса массового удаления привычек.
+    """
+    pks = serializers.ListField(child=serializers.IntegerField())
@@ -0,0 +1,73 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from habits.cache import invalidate, invalidate_analytics
+from habits.models import Habit
+
+# заранее собранные зависимые публичные привычки удаляемых привычек (attach_published_dependants)
+prefetched = threading.local()
+
+
+@receiver(post_save, sender=Habit)
+def invalidate_on_save(sender, instance, created, **kwargs):
+    """
+    Сброс кэша, если привычка публичная или перестала быть публичной.
+    """
+
+    if instance.is_publish or getattr(instance, '_loaded_is_publish', False):
+        invalidate(instance.pk)
+
+
+@contextmanager
+def attach_published_dependants(pks):
+    """
+    Публичные привычки, ссылающиеся на удаляемые привычки pks, одним запросом вместо запроса на каждую привычку
+    в pre_delete. Действует для удалений внутри блока with в текущем потоке.
+    """
+
+    dependants = {pk: [] for pk in pks}
+    rows = Habit.objects.filter(related_habit__in=pks, is_publish=True).values_list('related_habit', 'pk')
+    for related_habit, pk in rows:
+        dependants[related_habit].append(pk)
+
+    prefetched.dependants = dependants
+    try:
+        yield
+    finally:
+        del prefetched.dependants
+
+
+@receiver(pre_delete, sender=Habit)
+def collect_published_dependants(sender, instance, **kwargs):
+    """
+    Публичные привычки, ссылающиеся на удаляемую: у них связанная привычка обнулится без сигналов.
+    """
+
+    dependants = getattr(prefetched, 'dependants', {})
+    if instance.pk in dependants:
+        instance._published_dependants = dependants[instance.pk]
+    else:
+        instance._published_dependants = list(
+            Habit.objects.filter(related_habit=instance, is_publish=True).values_list('pk', flat=True)
+        )
+
+
+@receiver(post_delete, sender=Habit)
+def invalidate_on_delete(sender, instance, **kwargs):
+    dependants = getattr(instance, '_published_dependants', [])
+    if instance.is_publish or dependants:
+        invalidate(instance.pk, *dependants)
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_delete, sender=Habit)
+def invalidate_user_analytics(sender, instance, **kwargs):
+    """
+    Сброс статистики владельца привычки: изменились привычки, по которым она считается.
+    """
+
+    if instance.user_id:
+        invalidate_analytics(instance.user_id)
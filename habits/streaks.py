@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+from datetime import date
+
+from habits.schedule import WEEKDAYS
+
+
+def period_index(day, periodicity):
+    """
+    Номер периода привычки, в который попадает дата day: день для ежедневных привычек
+    и неделя (с понедельника) для еженедельных.
+    """
+
+    if periodicity in WEEKDAYS:
+        return (day.toordinal() - day.weekday()) // 7
+    return day.toordinal()
+
+
+@dataclass
+class Streak:
+    """
+    Серия выполнений привычки: текущая и лучшая серия в периодах и дата последнего выполнения.
+    """
+
+    current: int = 0
+    best: int = 0
+    last_completed: date | None = None
+
+    def add(self, day, periodicity):
+        """
+        Учет выполнения в дату day, не раньше последнего выполнения.
+        Несколько выполнений в одном периоде считаются одним.
+        """
+
+        if self.last_completed is None:
+            self.current = 1
+        else:
+            gap = period_index(day, periodicity) - period_index(self.last_completed, periodicity)
+            if gap < 0:
+                raise ValueError('Выполнение раньше последнего учитывается только пересчетом серии.')
+            if gap == 1:
+                self.current += 1
+            elif gap > 1:
+                self.current = 1
+
+        self.best = max(self.best, self.current)
+        self.last_completed = max(day, self.last_completed or day)
+
+    def current_on(self, today, periodicity):
+        """
+        Текущая серия на дату today: серия прервана, если в прошлом периоде выполнения не было.
+        """
+
+        if self.last_completed is None:
+            return 0
+        if period_index(today, periodicity) - period_index(self.last_completed, periodicity) > 1:
+            return 0
+        return self.current
+
+    @classmethod
+    def from_dates(cls, dates, periodicity):
+        """
+        Пересчет серии по всей истории выполнений, dates упорядочены по возрастанию.
+        """
+
+        streak = cls()
+        for day in dates:
+            streak.add(day, periodicity)
+        return streak
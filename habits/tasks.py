@@ -1,60 +1,252 @@
-import requests
-from celery import shared_task
+from datetime import datetime
+
+from celery import chord, shared_task
 from django.conf import settings
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Lower, Replace
 from django.utils import timezone
 
-from habits.models import Habit
+from habits.importer import delete_import_file, run_import
+from habits.models import Habit, HabitImport, HabitImportStatus, TaskCheckpoint, TelegramChat
+from habits.ratelimit import TelegramRateLimiter
+from habits.schedule import from_minute_index, minute_index, utc_offset_minutes
+from habits.telegram import TelegramSender, collect_usernames, get_updates
 from users.models import User
 
-WEEKDAY = {
-    0: 'monday',
-    1: 'tuesday',
-    2: 'wednesday',
-    3: 'thursday',
-    4: 'friday',
-    5: 'saturday',
-    6: 'sunday',
-}
+TELEGRAM_UPDATES_OFFSET = 'telegram_updates_offset'
+TELEGRAM_UPDATES_LIMIT = 100
+UTC_OFFSET_PREFIX = 'utc_offset:'
+TELEGRAM_DISPATCH_WATERMARK = 'telegram_dispatch_watermark'
 
 
-@shared_task
+@shared_task(query_budget=6)
 def get_telegram_user_id():
     """
     Периодическая задача для просмотра логов бота, чтобы достать id пользователя по его username.
+    Обновления запрашиваются с сохраненного offset, поэтому уже обработанные обновления повторно не загружаются.
+    Username и id отправителей сохраняются в TelegramChat, и пользователь получает id, даже если зарегистрировался
+    или указал username уже после того, как написал боту.
     """
 
-    # получаем всех пользователей, которые указали свой телеграм
-    for user in User.objects.filter(~Q(telegram=None)):
-        # обращаемся к логам и получаем id
-        response = requests.get(f'{settings.TG_URL}/bot{settings.TG_BOT_API}/getUpdates').json()
-        desired_user_id = next((item["message"]["from"]["id"] for item in response["result"] if
-                                item["message"]["from"]["username"] == user.telegram), None)
+    checkpoint, _ = TaskCheckpoint.objects.get_or_create(name=TELEGRAM_UPDATES_OFFSET)
 
-        # присваиваем id пользователю
-        if desired_user_id:
-            user.telegram_id = desired_user_id
-            user.save()
+    # получаем все новые обновления бота за один проход
+    updates = []
+    while True:
+        page = get_updates(offset=checkpoint.value + 1 if checkpoint.value else 0, limit=TELEGRAM_UPDATES_LIMIT)
+        if page:
+            updates.extend(page)
+            checkpoint.value = page[-1]['update_id']
+        if len(page) < TELEGRAM_UPDATES_LIMIT:
+            break
 
+    chats = [TelegramChat(username=username, chat_id=chat_id)
+             for username, chat_id in collect_usernames(updates).items()]
 
-@shared_task
+    # чаты из новых обновлений сохраняются вместе с offset до поиска пользователей
+    with transaction.atomic():
+        if chats:
+            TelegramChat.objects.bulk_create(
+                chats, update_conflicts=True, unique_fields=['username'], update_fields=['chat_id', 'updated_at']
+            )
+        if updates:
+            checkpoint.save(update_fields=['value'])
+
+    # выбираем только пользователей без id, username которых уже писал боту
+    users = list(
+        User.objects.filter(telegram_id=None, telegram__isnull=False)
+        .annotate(username=Lower(Replace('telegram', Value('@'), Value(''))))
+        .annotate(chat_id=Subquery(TelegramChat.objects.filter(username=OuterRef('username')).values('chat_id')))
+        .filter(chat_id__isnull=False)
+        .only('pk', 'telegram')
+    )
+    for user in users:
+        user.telegram_id = user.chat_id
+
+    # присваиваем id пользователям одним запросом
+    User.objects.bulk_update(users, ['telegram_id'])
+
+    return len(users)
+
+
+def shard_ranges(pk_min, pk_max, shards):
+    """
+    Разбиение диапазона первичных ключей [pk_min, pk_max] на не более чем shards непересекающихся диапазонов.
+    """
+
+    size = -(-(pk_max - pk_min + 1) // shards)
+    return [(start, min(start + size - 1, pk_max)) for start in range(pk_min, pk_max + 1, size)]
+
+
+@shared_task(query_budget=4)
 def telegram_integration():
     """
     Периодическая задача для отправки уведомления о привычки в telegram.
+    Задача только координирует рассылку: привычки всех минут от сохраненной отметки до текущей минуты
+    делятся на диапазоны ключей, которые отправляются группой подзадач send_reminders_shard на свободные воркеры.
+    Если предыдущий запуск опоздал или не состоялся, пропущенные минуты обрабатываются одним запросом.
     """
-    # Получение дня недели и времени текущего часового пояса
-    datetime = timezone.datetime.now()
-    weekday = datetime.date().weekday()
-    time = datetime.time().strftime('%H:%M')
-
-    # Получение привычек по заданным параметрам
-    habits = Habit.objects.filter(time_to_action=time, periodicity__in=[WEEKDAY[weekday], 'daily'])
-
-    if habits:
-        for habit in habits:
-            if habit.user.telegram_id:
-                params = {
-                    'chat_id': habit.user.telegram_id,
-                    'text': habit
-                }
-                requests.post(f'{settings.TG_URL}/bot{settings.TG_BOT_API}/sendMessage', params=params)
+    # Текущая минута в UTC, привычки ищутся по предрассчитанному слоту UTC
+    current = minute_index(timezone.now())
+
+    with transaction.atomic():
+        # Блокировка отметки не дает двум одновременным запускам разослать одни и те же минуты
+        watermark, _ = TaskCheckpoint.objects.select_for_update().get_or_create(
+            name=TELEGRAM_DISPATCH_WATERMARK, defaults={'value': current - 1}
+        )
+        if watermark.value >= current:
+            return {'shards': 0}
+
+        first = max(watermark.value + 1, current - settings.TG_CATCHUP_MINUTES + 1)
+        start, end = from_minute_index(first), from_minute_index(current)
+
+        bounds = Habit.objects.due_between(start, end).filter(user__telegram_id__isnull=False).aggregate(
+            pk_min=Min('pk'), pk_max=Max('pk')
+        )
+
+        watermark.value = current
+        watermark.save(update_fields=['value'])
+
+        if bounds['pk_min'] is None:
+            return {'shards': 0}
+
+        shards = shard_ranges(bounds['pk_min'], bounds['pk_max'], settings.TG_SEND_SHARDS)
+        dispatch = chord(
+            send_reminders_shard.s(start.isoformat(), end.isoformat(), pk_from, pk_to) for pk_from, pk_to in shards
+        )
+        # Подзадачи ставятся в очередь только после фиксации отметки: до нее другой запуск не видит
+        # новое окно, а при откате транзакции в очереди не остается подзадач незаписанного окна
+        transaction.on_commit(lambda: dispatch(collect_delivery_counts.s()))
+
+    return {'shards': len(shards)}
+
+
+@shared_task(query_budget=1)
+def send_reminders_shard(start, end, pk_from, pk_to):
+    """
+    Отправка уведомлений по привычкам минут окна [start, end] из диапазона ключей [pk_from, pk_to].
+    """
+
+    # Поток (chat_id, text) по привычкам диапазона одним запросом вместе с пользователями
+    messages = Habit.objects.due_between(datetime.fromisoformat(start), datetime.fromisoformat(end)).filter(
+        pk__range=(pk_from, pk_to)
+    ).reminders()
+
+    # Параллельная отправка уведомлений через общий пул соединений
+    with TelegramSender() as sender:
+        results = sender.send_many(messages)
+
+    deferred = defer_throttled(results)
+    sent = sum(result.ok for result in results)
+    return {'sent': sent, 'deferred': deferred, 'failed': len(results) - sent - deferred}
+
+
+def defer_throttled(results, attempt=0):
+    """
+    Постановка в очередь с задержкой retry_after сообщений, отправку которых остановило ограничение частоты.
+    Сообщение с зарезервированным слотом отправляется без повторного обращения к ограничителю.
+    Сообщения, отложенные больше TG_SEND_MAX_DEFERRALS раз, отбрасываются и учитываются в метрике dropped.
+    Возвращает количество отложенных сообщений.
+    """
+
+    deferred = dropped = 0
+    for result in results:
+        if not result.deferred:
+            continue
+        if attempt < settings.TG_SEND_MAX_DEFERRALS:
+            send_telegram_message.apply_async(
+                (result.chat_id, result.text, attempt + 1, result.reserved), countdown=result.retry_after
+            )
+            deferred += 1
+        else:
+            dropped += 1
+    if dropped:
+        TelegramRateLimiter().record('dropped', dropped)
+    return deferred
+
+
+@shared_task(query_budget=0)
+def send_telegram_message(chat_id, text, attempt=0, reserved=False):
+    """
+    Отложенная отправка одного сообщения. Если telegram снова ограничил частоту, сообщение откладывается еще раз,
+    но не больше TG_SEND_MAX_DEFERRALS раз.
+    """
+
+    with TelegramSender(concurrency=1) as sender:
+        result = sender.send(chat_id, text, reserved)
+
+    defer_throttled([result], attempt)
+    return result.ok
+
+
+@shared_task(query_budget=0)
+def collect_delivery_counts(results):
+    """
+    Сбор итоговой статистики рассылки по результатам всех подзадач.
+    """
+
+    return {
+        'shards': len(results),
+        'sent': sum(result['sent'] for result in results),
+        'deferred': sum(result['deferred'] for result in results),
+        'failed': sum(result['failed'] for result in results),
+    }
+
+
+@shared_task
+def rebucket_habit_schedule():
+    """
+    Периодическая задача для пересчета слотов UTC при переходе на летнее/зимнее время.
+    Пересчитываются только привычки пользователей из часовых поясов, смещение которых изменилось с прошлого запуска.
+    """
+
+    now = timezone.now()
+    changed = 0
+
+    for tz_name in User.objects.order_by().values_list('timezone', flat=True).distinct():
+        offset = utc_offset_minutes(tz_name, now)
+        checkpoint, created = TaskCheckpoint.objects.get_or_create(
+            name=f'{UTC_OFFSET_PREFIX}{tz_name}', defaults={'value': offset}
+        )
+        if not created and checkpoint.value == offset:
+            continue
+
+        changed += Habit.objects.filter(user__timezone=tz_name).reschedule(now)
+        checkpoint.value = offset
+        checkpoint.save(update_fields=['value'])
+
+    return changed
+
+
+@shared_task
+def import_habits(import_pk, batch_size=5000):
+    """
+    Загрузка привычек из файла, сохраненного в HabitImport. При повторном запуске загрузка продолжается
+    с первой необработанной строки.
+    """
+
+    habit_import = HabitImport.objects.select_related('user').get(pk=import_pk)
+    with habit_import.file.open('rb') as stream:
+        run_import(habit_import, stream, batch_size)
+    # файл нужен только для продолжения прерванной загрузки
+    delete_import_file(habit_import)
+
+    return {'processed': habit_import.processed, 'imported': habit_import.imported, 'failed': habit_import.failed}
+
+
+@shared_task
+def delete_stale_import_files():
+    """
+    Периодическая задача для удаления файлов загрузок, которые не продолжали дольше HABIT_IMPORT_FILE_RETENTION:
+    прерванных и зависших после остановки воркера. Зависшие загрузки отмечаются завершенными ошибкой.
+    Файлы завершенных загрузок удаляет import_habits.
+    """
+
+    stale = HabitImport.objects.filter(
+        updated_at__lt=timezone.now() - settings.HABIT_IMPORT_FILE_RETENTION,
+    ).exclude(file='')
+    for habit_import in stale.iterator():
+        if habit_import.status in (HabitImportStatus.PENDING, HabitImportStatus.RUNNING):
+            habit_import.status = HabitImportStatus.FAILED
+        delete_import_file(habit_import)
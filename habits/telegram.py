@@ -0,0 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from habits.ratelimit import TelegramRateLimiter
+
+
+@dataclass(frozen=True)
+class SendResult:
+    """
+    Результат отправки одного сообщения в telegram.
+    """
+
+    chat_id: int
+    ok: bool
+    status_code: int | None = None
+    error: str | None = None
+    text: str | None = None
+    retry_after: float | None = None
+    reserved: bool = False
+
+    @property
+    def deferred(self):
+        """
+        Сообщение не отправлено из-за ограничения частоты и должно быть отправлено через retry_after секунд.
+        Если reserved, токен уже списан ограничителем и повторно брать его не нужно.
+        """
+
+        return self.retry_after is not None
+
+
+class TelegramSender:
+    """
+    Отправка сообщений в telegram.
+    Сообщения рассылаются параллельно пулом потоков через общую keep-alive сессию,
+    количество одновременных запросов ограничено параметром concurrency.
+    Перед каждым запросом берется токен у ограничителя частоты. Если токена нет, ограничитель резервирует
+    для сообщения слот, и оно возвращается с retry_after до этого слота для отложенной отправки, не ожидая в потоке.
+    При ответе 429 сообщение также откладывается, но слот за ним не закреплен.
+    """
+
+    def __init__(self, concurrency=None, base_url=None, token=None, timeout=None, limiter=None, rate_limit=True):
+        self.limiter = (limiter or TelegramRateLimiter()) if rate_limit else None
+        self.concurrency = concurrency or settings.TG_SEND_CONCURRENCY
+        self.timeout = timeout or settings.TG_SEND_TIMEOUT
+        base_url = base_url or settings.TG_URL
+        token = token or settings.TG_BOT_API
+        self.url = f'{base_url}/bot{token}/sendMessage'
+
+        # Пул соединений не меньше количества потоков, чтобы соединения переиспользовались
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def send(self, chat_id, text, reserved=False):
+        """
+        Отправка одного сообщения. Ошибки не пробрасываются, а возвращаются в SendResult.
+        reserved - токен для сообщения уже зарезервирован при предыдущей попытке.
+        """
+
+        if self.limiter and not reserved:
+            wait = self.limiter.acquire(chat_id)
+            if wait:
+                self.limiter.record('throttled')
+                return SendResult(chat_id=chat_id, ok=False, text=text, retry_after=wait, reserved=True)
+
+        try:
+            response = self.session.post(
+                self.url,
+                params={'chat_id': chat_id, 'text': text},
+                timeout=self.timeout
+            )
+        except requests.RequestException as error:
+            result = SendResult(chat_id=chat_id, ok=False, error=str(error), text=text)
+        else:
+            result = self.parse_response(chat_id, text, response)
+
+        if self.limiter:
+            self.limiter.record('sent' if result.ok else 'rate_limited' if result.deferred else 'failed')
+        return result
+
+    @staticmethod
+    def parse_response(chat_id, text, response):
+        if response.ok:
+            return SendResult(chat_id=chat_id, ok=True, status_code=response.status_code, text=text)
+
+        retry_after = None
+        if response.status_code == 429:
+            # telegram сообщает, через сколько секунд можно повторить запрос
+            try:
+                retry_after = response.json()['parameters']['retry_after']
+            except (ValueError, KeyError, TypeError):
+                retry_after = 1
+
+        return SendResult(
+            chat_id=chat_id, ok=False, status_code=response.status_code, error=response.text, text=text,
+            retry_after=retry_after
+        )
+
+    def send_many(self, messages):
+        """
+        Параллельная отправка сообщений, messages - итерируемый объект пар (chat_id, text).
+        Возвращает список SendResult в порядке исходных сообщений.
+        """
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(lambda message: self.send(*message), messages))
+
+
+def get_updates(offset=0, limit=100):
+    """
+    Получение обновлений бота, начиная с update_id равного offset.
+    Запрос учитывается в общем лимите бота. Если токена нет, возвращается пустой список до следующего запуска.
+    """
+
+    if TelegramRateLimiter().acquire(reserve=False):
+        return []
+
+    params = {'limit': limit}
+    if offset:
+        params['offset'] = offset
+
+    response = requests.get(
+        f'{settings.TG_URL}/bot{settings.TG_BOT_API}/getUpdates',
+        params=params,
+        timeout=settings.TG_SEND_TIMEOUT
+    )
+    response.raise_for_status()
+    return response.json()['result']
+
+
+def normalize_username(username):
+    """
+    Приведение username telegram к единому виду: без @ и в нижнем регистре.
+    """
+
+    return username.lstrip('@').lower()
+
+
+def collect_usernames(updates):
+    """
+    Словарь username -> id отправителей сообщений из списка обновлений.
+    """
+
+    telegram_ids = {}
+    for update in updates:
+        message = update.get('message') or update.get('edited_message') or {}
+        sender = message.get('from') or {}
+        if sender.get('username'):
+            telegram_ids[normalize_username(sender['username'])] = sender['id']
+    return telegram_ids
@@ -1,12 +1,53 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from pathlib import Path
+from time import monotonic, sleep
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.color import no_style
 from django.db import connection
+from django.db.models import F
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase, APIClient
-
-from habits.models import Habit
+from rest_framework.test import APITestCase, APIClient, APITransactionTestCase
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from config.celery import app as celery_app
+from config.queries import QueryBudgetExceeded, metrics as query_metrics, query_budget
+from config.schema import generate_schema, schema_document
+from habits import cache as habit_cache
+from habits.api_views import HabitViewSet
+from habits.generator import FAKE_TELEGRAM_ID_BASE, generate_data
+from habits.models import Habit, HabitCompletion, HabitImport, SearchWord, TaskCheckpoint, TelegramChat
+from habits.paginators import CappedCountPaginator
+from habits.ratelimit import TelegramRateLimiter
+from habits.schedule import utc_slot
+from habits.search import trigram_available
+from habits.serializers import HabitReadSerializer, HabitSerializer
+from habits.streaks import Streak
+from habits.tasks import get_telegram_user_id, telegram_integration, send_reminders_shard, collect_delivery_counts, \
+    shard_ranges, rebucket_habit_schedule, send_telegram_message, defer_throttled, \
+    delete_stale_import_files
+from habits.telegram import SendResult, TelegramSender
+from users.authentication import invalidate_user
 from users.models import User
+from users.serializers import TokenObtainPairSerializer
 
 
+@override_settings(QUERY_BUDGET_STRICT=True)
 class HabitTestCase(APITestCase):
 
     def setUp(self):
@@ -99,7 +140,8 @@ class HabitTestCase(APITestCase):
         """
 
         response = self.client.get(
-            reverse('habits:habit-list')
+            reverse('habits:habit-list'),
+            {'count': 'true'}
         )
 
         self.assertEqual(
@@ -120,6 +162,23 @@ class HabitTestCase(APITestCase):
              'is_publish': False}
         )
 
+    def test_habit_read_serializer(self):
+        """
+        Тест, что быстрый сериалайзер списков отдает то же, что и HabitSerializer.
+        """
+
+        self.habit.related_habit = self.pleasant_habit
+        self.habit.reward = 'торт'
+        self.habit.time_to_complete = time(minute=1, second=30)
+        self.habit.save()
+
+        queryset = Habit.objects.order_by('pk')
+
+        self.assertEqual(
+            HabitReadSerializer(HabitReadSerializer.values(queryset), many=True).data,
+            HabitSerializer(queryset, many=True).data
+        )
+
     def test_habit_retrieve(self):
         """
         Тест для получения существующей привычки.
@@ -141,6 +200,96 @@ class HabitTestCase(APITestCase):
              'time_to_complete': '00:02:00', 'is_publish': False}
         )
 
+    def test_habit_list_etag(self):
+        """
+        Тест условного запроса списка привычек по ETag.
+        """
+
+        response = self.client.get(reverse('habits:habit-list'))
+        etag = response['ETag']
+
+        response = self.client.get(reverse('habits:habit-list'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(response.content, b'')
+
+        # другая страница списка имеет свой ETag
+        response = self.client.get(reverse('habits:habit-list'), {'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+
+        self.pleasant_habit.delete()
+        response = self.client.get(reverse('habits:habit-list'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_habit_retrieve_etag(self):
+        """
+        Тест условного запроса привычки по ETag.
+        """
+
+        url = reverse('habits:habit-detail', kwargs={'pk': self.habit.pk})
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+        self.habit.place = 'кухне'
+        self.habit.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+        self.assertEqual(response.json()['place'], 'кухне')
+
+    def test_habit_update_if_match(self):
+        """
+        Тест оптимистической блокировки изменения и удаления привычки по If-Match.
+        """
+
+        url = reverse('habits:habit-detail', kwargs={'pk': self.habit.pk})
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.patch(url, {'place': 'кухне'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+        self.assertNotEqual(response['ETag'], etag)
+
+        # изменение по устаревшей версии отклоняется
+        response = self.client.patch(url, {'place': 'комнате'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_412_PRECONDITION_FAILED
+        )
+
+        response = self.client.delete(url, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_412_PRECONDITION_FAILED
+        )
+        self.assertEqual(Habit.objects.get(pk=self.habit.pk).place, 'кухне')
+
     def test_another_habit_retrieve(self):
         """
         Тест для получения существующей привычки другого пользователя.
@@ -224,415 +373,2151 @@ class HabitTestCase(APITestCase):
             status.HTTP_400_BAD_REQUEST
         )
 
-    def test_related_or_reward_validator(self):
+    def test_habit_bulk_create(self):
         """
-        Тест валидатора CheckRelatedHabitOrReward,
-        проверяющего, что нельзя выбрать одновременно вознаграждение и связанную привычку.
+        Тестирование массового создания привычек: количество запросов не зависит от размера списка.
         """
 
-        data = {
-            "user": self.user.pk,
-            "place": "шкафу",
-            "time_to_action": "17:00:00",
-            "action": "разложить носки",
-            "is_pleasant_habit": False,
-            "related_habit": self.pleasant_habit.pk,
-            "reward": 'Съешь конфетку',
-        }
+        def payload(count):
+            return [
+                {'place': 'шкафу', 'time_to_action': '16:00:00', 'action': f'разложить носки {index}',
+                 'related_habit': self.pleasant_habit.pk, 'is_publish': index == 0}
+                for index in range(count)
+            ]
 
-        response = self.client.post(
-            reverse('habits:habit-list'),
-            data=data
-        )
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.post(reverse('habits:habit-bulk'), payload(2), format='json')
 
         self.assertEqual(
             response.status_code,
-            status.HTTP_400_BAD_REQUEST
+            status.HTTP_201_CREATED
         )
 
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post(reverse('habits:habit-bulk'), payload(30), format='json')
+
+        self.assertEqual(len(large), len(small))
         self.assertEqual(
-            response.json(),
-            {'non_field_errors': ['Нельзя выбрать одновременно вознаграждение и связанную привычку.']}
+            Habit.objects.filter(user=self.user, place='шкафу').count(),
+            32
         )
+        self.assertEqual(response.json()[0]['user'], self.user.pk)
+        self.assertEqual(response.json()[0]['related_habit'], self.pleasant_habit.pk)
 
-    def test_check_related_validator(self):
+        # слот UTC рассчитан, хотя bulk_create не вызывает save()
+        habit = Habit.objects.get(pk=response.json()[0]['pk'])
+        self.assertEqual((habit.utc_minute, habit.utc_weekday), (13 * 60, None))
+
+    def test_invalid_habit_bulk_create(self):
         """
-        Тест валидатора CheckRelatedHabit,
-        проверяющего, что в связанные привычки могут попадать только привычки с признаком приятной привычки.
+        Тестирование массового создания привычек с ошибками: ошибки возвращаются по элементам, ничего не создается.
         """
 
-        data = {
-            "user": self.user.pk,
-            "place": "шкафу",
-            "time_to_action": "18:00:00",
-            "action": "разложить носки",
-            "is_pleasant_habit": False,
-            "related_habit": self.habit.pk,
-        }
+        data = [
+            {'place': 'шкафу', 'time_to_action': '16:00:00', 'action': 'разложить носки'},
+            {'place': 'шкафу', 'time_to_action': '16:00:00', 'action': 'разложить носки',
+             'related_habit': self.habit.pk},
+            {'place': 'шкафу', 'action': 'разложить носки', 'related_habit': 999},
+        ]
 
-        response = self.client.post(
-            reverse('habits:habit-list'),
-            data=data
-        )
+        response = self.client.post(reverse('habits:habit-bulk'), data, format='json')
 
         self.assertEqual(
             response.status_code,
             status.HTTP_400_BAD_REQUEST
         )
 
-        self.assertEqual(
-            response.json(),
-            {'non_field_errors': ['В связанные привычки могут попадать только привычки с признаком приятной привычки.']}
-        )
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertEqual(errors[1], {'non_field_errors': [
+            'В связанные привычки могут попадать только привычки с признаком приятной привычки.'
+        ]})
+        self.assertEqual(set(errors[2]), {'time_to_action', 'related_habit'})
+        self.assertEqual(Habit.objects.count(), 4)
 
-    def test_check_pleasant_validator(self):
+    def test_habit_bulk_update(self):
         """
-        Тест валидатора CheckPleasantHabit,
-        проверяющего, что у приятной привычки не может быть вознаграждения или связанной привычки.
+        Тестирование массового изменения привычек.
         """
 
-        data = {
-            "user": self.user.pk,
-            "place": "шкафу",
-            "time_to_action": "19:00:00",
-            "action": "разложить носки",
-            "is_pleasant_habit": True,
-            "related_habit": self.pleasant_habit.pk,
-        }
-        data_1 = {
-            "user": self.user.pk,
-            "place": "шкафу",
-            "time_to_action": "19:00:00",
-            "action": "разложить носки",
-            "is_pleasant_habit": True,
-            "reward": "Съешь конфетку"
-        }
+        data = [
+            {'pk': self.habit.pk, 'time_to_action': '17:30:00'},
+            {'pk': self.habit_3.pk, 'is_publish': False},
+        ]
 
-        response = self.client.post(
-            reverse('habits:habit-list'),
-            data=data
+        response = self.client.patch(reverse('habits:habit-bulk'), data, format='json')
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
         )
 
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.time_to_action, time(17, 30))
+        self.assertEqual(self.habit.utc_minute, 14 * 60 + 30)
+        self.assertFalse(Habit.objects.get(pk=self.habit_3.pk).is_publish)
+
+        # чужая привычка и повтор одной привычки не изменяются
+        data = [
+            {'pk': self.habit_1.pk, 'place': 'кухне'},
+            {'pk': self.habit.pk, 'place': 'кухне'},
+            {'pk': self.habit.pk, 'place': 'кухне'},
+        ]
+
+        response = self.client.patch(reverse('habits:habit-bulk'), data, format='json')
+
         self.assertEqual(
             response.status_code,
             status.HTTP_400_BAD_REQUEST
         )
-
         self.assertEqual(
             response.json(),
-            {'non_field_errors': ['У приятной привычки не может быть связанной привычки.']}
+            [{'pk': ['Привычка не найдена.']}, {}, {'pk': ['Привычка указана несколько раз.']}]
         )
+        self.assertEqual(Habit.objects.get(pk=self.habit.pk).place, 'комнате')
 
-        response = self.client.post(
-            reverse('habits:habit-list'),
-            data=data_1
+        # идентификатор не целым числом - ошибка элемента, а не 500
+        response = self.client.patch(
+            reverse('habits:habit-bulk'), [{'pk': [self.habit.pk]}, {'pk': True}, {'pk': '1'}], format='json'
         )
 
         self.assertEqual(
             response.status_code,
             status.HTTP_400_BAD_REQUEST
         )
-
         self.assertEqual(
             response.json(),
-            {'non_field_errors': ['У приятной привычки не может быть вознаграждения.']}
+            [{'pk': ['Ожидается целочисленный идентификатор привычки.']}] * 3
         )
 
-    def test_check_time_validator(self):
+    def test_habit_bulk_destroy(self):
         """
-        Тест валидатора CheckTimeToComplete,
-        проверяющего, что время выполнения должно быть не больше 120 секунд.
+        Тестирование массового удаления привычек.
         """
 
-        data = {
-            "user": self.user.pk,
-            "place": "шкафу",
-            "time_to_action": "19:00:00",
-            "action": "разложить носки",
-            "is_pleasant_habit": False,
-            "time_to_complete": "00:05:00"
-        }
-
-        response = self.client.post(
-            reverse('habits:habit-list'),
-            data=data
+        response = self.client.delete(
+            reverse('habits:habit-bulk'), {'pks': [self.habit.pk, self.habit_1.pk]}, format='json'
         )
 
         self.assertEqual(
             response.status_code,
             status.HTTP_400_BAD_REQUEST
         )
+        self.assertEqual(Habit.objects.count(), 4)
 
-        self.assertEqual(
-            response.json(),
-            {'non_field_errors': [
-                f'Время выполнения должно быть не больше 120 секунд. Ваше время {data["time_to_complete"]}'
-            ]}
-        )
-
-    def test_habit_update(self):
-        """
-        Тестирование обновления привычки пользователем (валидными данными).
-        """
-
-        data = {
-            "place": "шкафу",
-            "time_to_action": "16:00:00",
-            "action": "разложить носки",
-            "is_pleasant_habit": False,
-        }
-
-        response = self.client.put(
-            reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
-            data=data
+        response = self.client.delete(
+            reverse('habits:habit-bulk'), {'pks': [self.habit.pk, self.habit_3.pk]}, format='json'
         )
 
         self.assertEqual(
             response.status_code,
-            status.HTTP_200_OK
+            status.HTTP_204_NO_CONTENT
         )
-
         self.assertEqual(
-            response.json(),
-            {'pk': 1, 'user': 1, 'place': 'шкафу', 'time_to_action': '16:00:00', 'action': 'разложить носки',
-             'is_pleasant_habit': False, 'related_habit': None, 'periodicity': 'daily', 'reward': None,
-             'time_to_complete': '00:02:00', 'is_publish': False}
+            list(Habit.objects.order_by('pk').values_list('pk', flat=True)),
+            [self.habit_1.pk, self.pleasant_habit.pk]
         )
 
-    def test_invalid_habit_update(self):
+    @override_settings(DEBUG=True)
+    def test_query_count_headers(self):
         """
-        Тестирование обновления привычки пользователем (невалидными данными).
+        Тест заголовков с количеством и временем запросов к базе в режиме DEBUG.
         """
 
-        data = {
-            "place": "шкафу",
-            "time_to_action": "16:00:00",
-            "is_pleasant_habit": False,
-        }
+        response = self.client.get(reverse('habits:habit-detail', args=[self.habit.pk]))
 
-        response = self.client.put(
-            reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
-            data=data
-        )
+        self.assertEqual(response['X-DB-Queries'], '1')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=\d+\.\d$')
 
-        self.assertEqual(
-            response.status_code,
-            status.HTTP_400_BAD_REQUEST
-        )
+        # запрос пользователя при промахе кэша аутентификации учитывается, но не входит в бюджет retrieve (1)
+        invalidate_user(self.user)
+        auth = {'Authorization': f'Bearer {TokenObtainPairSerializer.get_token(self.user).access_token}'}
+        response = APIClient().get(reverse('habits:habit-detail', args=[self.habit.pk]), headers=auth)
 
-    def test_another_habit_update(self):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-DB-Queries'], '2')
+
+    @override_settings(DEBUG=True)
+    async def test_async_query_count(self):
         """
-        Тестирование обновления привычки другого пользователя.
+        Тест учета запросов под ASGI: представление выполняется в потоке, заголовки и проверка бюджета те же.
         """
 
-        data = {
-            "place": "шкафу",
-            "time_to_action": "16:00:00",
-            "action": "разложить носки",
-            "is_pleasant_habit": False,
-        }
+        await sync_to_async(invalidate_user)(self.user)
+        auth = {'Authorization': f'Bearer {TokenObtainPairSerializer.get_token(self.user).access_token}'}
+        url = reverse('habits:habit-detail', args=[self.habit.pk])
+        response = await AsyncClient().get(url, headers=auth)
 
-        response = self.client.put(
-            reverse('habits:habit-detail', kwargs={'pk': self.habit_1.pk}),
-            data=data
-        )
+        self.assertEqual(response['X-DB-Queries'], '2')
 
-        self.assertEqual(
-            response.status_code,
-            status.HTTP_404_NOT_FOUND
-        )
+        with patch.dict(HabitViewSet.query_budgets, {'retrieve': 0}), self.assertLogs('django.request', 'ERROR'):
+            with self.assertRaisesMessage(QueryBudgetExceeded, '1 запросов к базе при бюджете 0'):
+                await AsyncClient().get(url, headers=auth)
 
-    def test_habit_patch(self):
+    def test_query_budget(self):
         """
-        Тестирование частичного обновления привычки пользователем (валидными данными).
+        Тест бюджета запросов действия HabitViewSet и задачи Celery: ошибка в тестах, запись в лог и счетчики иначе.
         """
 
-        data = {
-            "place": "шкафу",
-        }
+        url = reverse('habits:habit-detail', args=[self.habit.pk])
+        label = 'habits:habit-detail:GET'
+        with patch.dict(HabitViewSet.query_budgets, {'retrieve': 0}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, f'{label}: 1 запросов к базе при бюджете 0'):
+                self.client.get(url)
 
-        response = self.client.patch(
-            reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
-            data=data
-        )
+            query_metrics.flush()
+            calls = query_metrics.summary().get(label, {}).get('calls', 0)
+            with override_settings(QUERY_BUDGET_STRICT=False), self.assertLogs('config.queries', 'WARNING'):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        self.assertEqual(
-            response.status_code,
-            status.HTTP_200_OK
-        )
+        query_metrics.flush()
+        self.assertEqual(query_metrics.summary()[label]['calls'], calls + 1)
 
-        self.assertEqual(
-            response.json(),
-            {'pk': 1, 'user': 1, 'place': 'шкафу', 'time_to_action': '16:00:00', 'action': 'выпить стакан воды',
-             'is_pleasant_habit': False, 'related_habit': None, 'periodicity': 'daily', 'reward': None,
-             'time_to_complete': '00:02:00', 'is_publish': False}
-        )
+        with patch.object(rebucket_habit_schedule, 'query_budget', 1):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'task:habits.tasks.rebucket_habit_schedule'):
+                rebucket_habit_schedule()
 
-    def test_invalid_habit_patch(self):
+        # запрос вложенного блока (например, задачи, выполненной синхронно) засчитывается только ему
+        with query_budget(0):
+            with self.assertRaises(QueryBudgetExceeded):
+                with query_budget(0):
+                    Habit.objects.count()
+
+    def test_habit_create_queries(self):
         """
-        Тестирование частичного обновления привычки пользователем (невалидными данными).
+        Тест количества запросов при создании привычки: поиск связанной привычки и вставка.
         """
 
-        data = {
-            "time_to_action": "шоколад",
-        }
+        data = {'place': 'шкафу', 'time_to_action': '16:00:00', 'action': 'разложить носки',
+                'related_habit': self.pleasant_habit.pk}
 
-        response = self.client.patch(
-            reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
-            data=data
-        )
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('habits:habit-list'), data, format='json')
 
         self.assertEqual(
             response.status_code,
-            status.HTTP_400_BAD_REQUEST
+            status.HTTP_201_CREATED
         )
 
-    def test_another_habit_patch(self):
+    @patch('habits.api_views.timezone')
+    def test_habit_complete(self, mock_timezone):
         """
-        Тестирование частичного обновления привычки другого пользователя.
+        Тест отметки выполнения привычки и инкрементального подсчета серий.
         """
 
-        data = {
-            "place": "шкафу",
-        }
+        mock_timezone.localdate.return_value = date(2023, 12, 6)
+        url = reverse('habits:habit-complete', kwargs={'pk': self.habit.pk})
 
-        response = self.client.patch(
-            reverse('habits:habit-detail', kwargs={'pk': self.habit_1.pk}),
-            data=data
+        self.client.post(url, {'date': '2023-12-04'})
+        self.client.post(url, {'date': '2023-12-05'})
+        # повторная отметка за день не меняет серию
+        self.client.post(url, {'date': '2023-12-05'})
+
+        # отметка без даты - сегодняшний день пользователя, серия продолжается без чтения истории
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url)
+
+        self.assertFalse([query for query in queries if 'FROM "habits_habitcompletion"' in query['sql']])
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_201_CREATED
+        )
+        self.assertEqual(
+            response.json(),
+            {'current_streak': 3, 'best_streak': 3, 'last_completed': '2023-12-06'}
+        )
+        self.assertEqual(HabitCompletion.objects.filter(habit=self.habit).count(), 3)
+
+        response = self.client.post(url, {'date': '2023-12-07'})
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+        # через два дня без выполнения серия прервана, лучшая серия сохраняется
+        mock_timezone.localdate.return_value = date(2023, 12, 8)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('habits:habit-streak', kwargs={'pk': self.habit.pk}))
+
+        self.assertEqual(
+            response.json(),
+            {'current_streak': 0, 'best_streak': 3, 'last_completed': '2023-12-06'}
         )
 
+        response = self.client.post(reverse('habits:habit-complete', kwargs={'pk': self.habit_1.pk}))
+
         self.assertEqual(
             response.status_code,
             status.HTTP_404_NOT_FOUND
         )
 
-    def test_habit_delete(self):
+    @patch('habits.api_views.timezone')
+    def test_habit_backfill(self, mock_timezone):
         """
-        Тестирование удаления привычки пользователем (валидными данными).
+        Тест загрузки истории выполнений: даты раньше последнего выполнения пересчитывают серию по истории.
         """
 
-        response = self.client.delete(
-            reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
+        mock_timezone.localdate.return_value = date(2023, 12, 10)
+        self.habit.complete([date(2023, 12, 10)])
+        url = reverse('habits:habit-backfill', kwargs={'pk': self.habit.pk})
+
+        response = self.client.post(
+            url, {'dates': ['2023-12-01', '2023-12-02', '2023-12-03', '2023-12-08', '2023-12-09']}, format='json'
         )
 
         self.assertEqual(
             response.status_code,
-            status.HTTP_204_NO_CONTENT
+            status.HTTP_200_OK
+        )
+        self.assertEqual(
+            response.json(),
+            {'current_streak': 3, 'best_streak': 3, 'last_completed': '2023-12-10'}
         )
+        self.assertEqual(HabitCompletion.objects.filter(habit=self.habit).count(), 6)
+
+    @patch('habits.api_views.timezone')
+    def test_habit_analytics(self, mock_timezone):
+        """
+        Тест статистики выполнения привычек и ее кэширования до новых выполнений.
+        """
+
+        mock_timezone.localdate.return_value = date(2023, 12, 6)
+        self.pleasant_habit.periodicity = 'monday'
+        self.pleasant_habit.save()
+        self.habit.complete([date(2023, 12, 4), date(2023, 12, 5), date(2023, 12, 6), date(2023, 11, 1)])
+        self.pleasant_habit.complete([date(2023, 12, 4), date(2023, 12, 5)])
+        self.habit_1.complete([date(2023, 12, 5)])
+
+        response = self.client.get(reverse('habits:habit-analytics'), {'days': 7})
 
         self.assertEqual(
-            Habit.objects.all().count(),
-            3
+            response.status_code,
+            status.HTTP_200_OK
         )
 
-    def test_invalid_habit_delete(self):
+        data = response.json()
+        self.assertEqual(
+            {key: data[key] for key in ('start', 'end', 'completions', 'completion_rate', 'weekdays')},
+            {'start': '2023-11-30', 'end': '2023-12-06', 'completions': 5, 'completion_rate': 0.25,
+             'weekdays': [2, 2, 1, 0, 0, 0, 0]}
+        )
+        self.assertEqual(data['hours'][16], 5)
+        self.assertEqual(
+            data['habits'],
+            [
+                {'pk': 1, 'action': 'выпить стакан воды', 'completions': 3, 'completion_rate': 0.4286,
+                 'weekdays': [1, 1, 1, 0, 0, 0, 0]},
+                {'pk': 3, 'action': 'убрать спорт инвентарь на места', 'completions': 0, 'completion_rate': 0.0,
+                 'weekdays': [0, 0, 0, 0, 0, 0, 0]},
+                {'pk': 4, 'action': 'сохранить все файлы перед окончанием рабочего дня', 'completions': 2,
+                 'completion_rate': 0.5, 'weekdays': [1, 1, 0, 0, 0, 0, 0]},
+            ]
+        )
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('habits:habit-analytics'), {'days': 7})
+
+        self.habit_3.complete([date(2023, 12, 6)])
+        response = self.client.get(reverse('habits:habit-analytics'), {'days': 7})
+
+        self.assertEqual(response.json()['completions'], 6)
+
+        response = self.client.get(reverse('habits:habit-analytics'), {'days': 1000})
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    def test_habit_export_ndjson(self):
         """
-        Тестирование удаления привычки пользователем (невалидными данными).
+        Тест потоковой выгрузки привычек пользователя с историей выполнений в формате NDJSON.
         """
 
-        response = self.client.delete(
-            reverse('habits:habit-detail', kwargs={'pk': 999}),
+        self.habit.complete([date(2023, 12, 5), date(2023, 12, 4)])
+        self.habit_1.complete([date(2023, 12, 5)])
+        self.pleasant_habit.complete([date(2023, 12, 6)])
+
+        response = self.client.get(reverse('habits:habit-export'))
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="habits.ndjson"')
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(
+            [(row['pk'], row['completions']) for row in rows],
+            [(1, ['2023-12-04', '2023-12-05']), (3, []), (4, ['2023-12-06'])]
+        )
+        self.assertEqual(
+            {key: value for key, value in rows[0].items() if key != 'completions'},
+            HabitSerializer(self.habit).data
         )
 
+    def test_habit_export_csv_gzip(self):
+        """
+        Тест выгрузки привычек в формате CSV со сжатием gzip на лету.
+        """
+
+        self.habit.complete([date(2023, 12, 4), date(2023, 12, 5)])
+
+        response = self.client.get(reverse('habits:habit-export'), {'format': 'csv'}, HTTP_ACCEPT_ENCODING='gzip')
+
         self.assertEqual(
             response.status_code,
-            status.HTTP_404_NOT_FOUND
+            status.HTTP_200_OK
         )
 
-    def test_another_habit_delete(self):
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        self.assertEqual([row['pk'] for row in rows], ['1', '3', '4'])
+        self.assertEqual(rows[0]['completions'], '2023-12-04 2023-12-05')
+        self.assertEqual(rows[0]['time_to_action'], '16:00:00')
+
+    def test_habit_import(self):
         """
-        Тестирование удаления привычки другого пользователя.
+        Тест загрузки привычек из файла NDJSON фоновой задачей с отчетом об ошибках по строкам.
         """
 
-        response = self.client.delete(
-            reverse('habits:habit-detail', kwargs={'pk': self.habit_1.pk}),
+        rows = [
+            {'place': 'дома', 'time_to_action': '07:30', 'action': 'зарядка', 'periodicity': 'monday',
+             'related_habit': self.pleasant_habit.pk},
+            {'place': 'дома', 'time_to_action': '08:00', 'action': 'чай', 'is_pleasant_habit': True,
+             'reward': 'торт'},
+            {'place': 'парке', 'time_to_action': '09:00', 'action': 'прогулка', 'related_habit': self.habit_1.pk},
+            {'place': 'дома', 'action': 'без времени'},
+            {'place': 'работе', 'time_to_action': '18:00', 'action': 'выключить\tкомпьютер', 'is_publish': True},
+        ]
+        content = '\n'.join(json.dumps(row, ensure_ascii=False) for row in rows[:2]) + '\n{не json\n\n'
+        content += '\n'.join(json.dumps(row, ensure_ascii=False) for row in rows[2:])
+
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('habits:habit-import'),
+                    {'file': SimpleUploadedFile('habits.ndjson', content.encode())},
+                    format='multipart'
+                )
+
+            # после завершения загрузки файл удаляется из хранилища
+            self.assertEqual(list((Path(media_root) / 'imports').iterdir()), [])
+            self.assertFalse(HabitImport.objects.get().file)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_202_ACCEPTED
+        )
+
+        response = self.client.get(reverse('habits:habit-import-detail', kwargs={'import_pk': response.json()['pk']}))
+        data = response.json()
+
+        self.assertEqual(
+            {key: data[key] for key in ('format', 'status', 'processed', 'imported', 'failed')},
+            {'format': 'ndjson', 'status': 'done', 'processed': 6, 'imported': 2, 'failed': 4}
+        )
+        self.assertEqual(
+            data['errors'],
+            [
+                {'row': 2, 'errors': {'non_field_errors': ['У приятной привычки не может быть вознаграждения.']}},
+                {'row': 3, 'errors': {'non_field_errors': ['Строка не является объектом привычки.']}},
+                {'row': 4, 'errors': {
+                    'related_habit': [f'Недопустимый первичный ключ "{self.habit_1.pk}" - объект не существует.']
+                }},
+                {'row': 5, 'errors': {'time_to_action': ['Обязательное поле.']}},
+            ]
+        )
+
+        habit = Habit.objects.get(action='зарядка')
+        self.assertEqual(
+            (habit.user, habit.related_habit, habit.periodicity, habit.time_to_complete),
+            (self.user, self.pleasant_habit, 'monday', time(minute=2))
         )
+        self.assertEqual(
+            (habit.utc_minute, habit.utc_weekday),
+            utc_slot(habit.time_to_action, habit.periodicity, self.user.timezone, habit.updated_at)
+        )
+        self.assertEqual(Habit.objects.get(place='работе', time_to_action='18:00').action, 'выключить\tкомпьютер')
+
+        response = self.client.get(reverse('habits:habit-import-detail', kwargs={'import_pk': data['pk'] + 1}))
 
         self.assertEqual(
             response.status_code,
             status.HTTP_404_NOT_FOUND
         )
 
-    def test_publish_habit_list(self):
+    def test_stale_import_files(self):
         """
-        Тест на получение списка публичных привычек.
+        Тест удаления файлов давно прерванных и зависших загрузок: свежая прерванная загрузка сохраняет файл,
+        зависшая отмечается завершенной ошибкой, а загрузку без файла продолжить нельзя.
         """
 
-        response = self.client.get(
-            '/habit/publish/',
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            stale, fresh = (
+                HabitImport.objects.create(
+                    user=self.user, format='csv', status=import_status,
+                    file=SimpleUploadedFile(f'{name}.csv', b'place,time_to_action,action\n')
+                )
+                for name, import_status in (('stale', 'running'), ('fresh', 'failed'))
+            )
+            HabitImport.objects.filter(pk=stale.pk).update(
+                updated_at=datetime.now(dt_timezone.utc) - settings.HABIT_IMPORT_FILE_RETENTION - timedelta(minutes=1)
+            )
+
+            delete_stale_import_files()
+
+            stale.refresh_from_db()
+            fresh.refresh_from_db()
+            self.assertEqual((bool(stale.file), stale.status), (False, 'failed'))
+            self.assertTrue(fresh.file)
+            self.assertEqual(list((Path(media_root) / 'imports').iterdir()), [Path(fresh.file.path)])
+
+        response = self.client.post(reverse('habits:habit-import-resume', kwargs={'import_pk': stale.pk}))
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    def test_resume_stuck_import(self):
+        """
+        Тест продолжения загрузки, зависшей в статусе running после остановки воркера.
+        Загрузку, которую воркер еще обновляет, продолжить нельзя.
+        """
+
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        content = 'place,time_to_action,action\nдома,07:30:00,зарядка\n'.encode()
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            habit_import = HabitImport.objects.create(
+                user=self.user, format='csv', status='running', file=SimpleUploadedFile('habits.csv', content)
+            )
+            url = reverse('habits:habit-import-resume', kwargs={'import_pk': habit_import.pk})
+
+            self.assertEqual(self.client.post(url).status_code, status.HTTP_400_BAD_REQUEST)
+
+            HabitImport.objects.filter(pk=habit_import.pk).update(
+                updated_at=datetime.now(dt_timezone.utc) - settings.HABIT_IMPORT_STALE_AFTER - timedelta(minutes=1)
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        habit_import.refresh_from_db()
+        self.assertEqual((habit_import.status, habit_import.imported), ('done', 1))
+
+    def test_import_habits_command_resume(self):
+        """
+        Тест загрузки привычек из CSV командой import_habits и продолжения прерванной загрузки.
+        """
+
+        content = (
+            'pk,place,time_to_action,action,is_pleasant_habit,reward,completions\n'
+            '10,дома,07:30:00,зарядка,False,,2023-12-04\n'
+            '11,дома,08:00:00,"чай, с лимоном",True,,\n'
+            '12,кухне,20:00:00,помыть посуду,False,десерт,\n'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8') as file:
+            file.write(content)
+            file.flush()
+
+            call_command('import_habits', file.name, user=self.user.email, batch_size=2, stdout=io.StringIO())
+            habit_import = HabitImport.objects.get()
+
+            self.assertEqual(
+                (habit_import.format, habit_import.status, habit_import.processed, habit_import.imported),
+                ('csv', 'done', 3, 3)
+            )
+            self.assertEqual(
+                list(Habit.objects.filter(user=self.user, pk__gt=4).order_by('pk').values_list('action', 'reward')),
+                [('зарядка', None), ('чай, с лимоном', None), ('помыть посуду', 'десерт')]
+            )
+
+            # прерванная после первой пачки загрузка продолжается с третьей строки
+            Habit.objects.filter(pk__gt=4).delete()
+            HabitImport.objects.filter(pk=habit_import.pk).update(status='failed', processed=2, imported=2)
+            call_command('import_habits', file.name, resume=habit_import.pk, stdout=io.StringIO())
+
+        habit_import.refresh_from_db()
+        self.assertEqual((habit_import.status, habit_import.processed, habit_import.imported), ('done', 3, 3))
+        self.assertEqual(
+            list(Habit.objects.filter(user=self.user, pk__gt=4).values_list('action', flat=True)),
+            ['помыть посуду']
+        )
+
+    def test_generate_data_command(self):
+        """
+        Тест генерации пользователей и привычек командой generate_data: корректность связей и повторяемость по seed.
+        """
+
+        def generated():
+            return list(
+                Habit.objects.filter(user__email__startswith='user').order_by('pk').values_list(
+                    'pk', 'user__email', 'user__timezone', 'place', 'time_to_action', 'action', 'is_pleasant_habit',
+                    'related_habit', 'periodicity', 'reward', 'time_to_complete', 'is_publish', 'utc_minute',
+                    'utc_weekday',
+                )
+            )
+
+        call_command('generate_data', users=30, habits=300, seed=7, batch_size=10, workers=1, stdout=io.StringIO())
+        habits = Habit.objects.filter(user__email__startswith='user')
+
+        self.assertEqual(User.objects.filter(email__startswith='user').count(), 30)
+        self.assertEqual(habits.count(), 300)
+        self.assertTrue(habits.filter(is_publish=True).exists() and habits.filter(is_publish=False).exists())
+        self.assertTrue(habits.filter(related_habit__isnull=False).exists())
+        # данные проходят валидаторы привычки
+        self.assertFalse(habits.filter(related_habit__isnull=False, reward__isnull=False).exists())
+        self.assertFalse(habits.filter(is_pleasant_habit=True).exclude(related_habit=None, reward=None).exists())
+        self.assertFalse(
+            habits.filter(related_habit__isnull=False).exclude(
+                related_habit__is_pleasant_habit=True, related_habit__user=F('user')
+            ).exists()
+        )
+        habit = habits.select_related('user').last()
+        self.assertEqual(
+            (habit.utc_minute, habit.utc_weekday),
+            utc_slot(habit.time_to_action, habit.periodicity, habit.user.timezone, habit.updated_at)
+        )
+
+        # тот же seed на той же базе дает те же данные
+        first_run = generated()
+        self.assertFalse(User.objects.filter(email__startswith='user', telegram_id__isnull=False).exists())
+        User.objects.filter(email__startswith='user').delete()
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Habit]):
+                cursor.execute(sql)
+        call_command('generate_data', users=30, habits=300, seed=7, batch_size=10, workers=1, stdout=io.StringIO())
+        self.assertEqual(generated(), first_run)
+
+        # последовательности ключей сдвинуты за созданные строки
+        self.assertGreater(User.objects.create(email='new@test.ru').pk, habits.last().user_id)
+
+        # пользователи, созданные приложением во время генерации, не конфликтуют с зарезервированными ключами
+        generate_data(20, 100, seed=8, batch_size=5,
+                      progress=lambda users, habits: User.objects.create(email=f'live{users}@test.ru'))
+        self.assertEqual(User.objects.filter(email__startswith='live').count(), 4)
+
+        # пользователи с telegram создаются только по --with-telegram
+        call_command('generate_data', users=10, habits=0, seed=7, with_telegram=True, telegram_share=1,
+                     stdout=io.StringIO())
+        self.assertEqual(
+            User.objects.filter(email__startswith='user', telegram_id__gte=FAKE_TELEGRAM_ID_BASE).count(), 10
+        )
+        self.assertTrue(
+            all('-' in username for username in User.objects.filter(telegram_id__isnull=False).values_list(
+                'telegram', flat=True))
         )
 
+    def test_habit_update_queries(self):
+        """
+        Тест количества запросов при изменении привычки: привычка, связанная привычка и обновление.
+        """
+
+        with self.assertNumQueries(3):
+            response = self.client.patch(
+                reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
+                {'related_habit': self.pleasant_habit.pk, 'place': 'кухне'},
+                format='json'
+            )
+
         self.assertEqual(
             response.status_code,
             status.HTTP_200_OK
         )
 
+    def test_habit_save_schedule_queries(self):
+        """
+        Тест, что сохранение привычки без изменения расписания не загружает владельца и не меняет слот UTC,
+        а изменение времени пересчитывает слот.
+        """
+
+        habit = Habit.objects.get(pk=self.habit.pk)
+        slot = habit.utc_minute, habit.utc_weekday
+        habit.place = 'кухне'
+        with self.assertNumQueries(1):
+            habit.save()
+
+        habit.time_to_action = '09:00:00'
+        with self.assertNumQueries(2):
+            habit.save(update_fields=['time_to_action'])
+
+        habit.refresh_from_db()
+        self.assertNotEqual((habit.utc_minute, habit.utc_weekday), slot)
         self.assertEqual(
-            response.json(),
-            [{'pk': 3, 'user': 1, 'place': 'спортзале', 'time_to_action': '16:00:00',
-              'action': 'убрать спорт инвентарь на места', 'is_pleasant_habit': False, 'related_habit': None,
-              'periodicity': 'daily', 'reward': None, 'time_to_complete': '00:02:00', 'is_publish': True}]
+            (habit.utc_minute, habit.utc_weekday),
+            utc_slot(habit.time_to_action, habit.periodicity, self.user.timezone, habit.updated_at)
         )
 
-    def test_invalid_publish_habit_list(self):
+    def test_another_user_related_habit(self):
         """
-        Тест на получение списка публичных привычек (используя другой метод запроса).
+        Тест, что связанной привычкой нельзя выбрать привычку другого пользователя.
         """
 
-        response = self.client.post(
-            '/habit/publish/',
+        pleasant_habit = Habit.objects.create(user=self.user2, place='парке', time_to_action='10:00:00',
+                                              action='погулять', is_pleasant_habit=True)
+        data = {'place': 'шкафу', 'time_to_action': '16:00:00', 'action': 'разложить носки',
+                'related_habit': pleasant_habit.pk}
+
+        response = self.client.post(reverse('habits:habit-list'), data, format='json')
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST
         )
+        self.assertIn('related_habit', response.json())
+
+        response = self.client.post(reverse('habits:habit-bulk'), [data], format='json')
 
         self.assertEqual(
             response.status_code,
-            status.HTTP_405_METHOD_NOT_ALLOWED
+            status.HTTP_400_BAD_REQUEST
         )
+        self.assertIn('related_habit', response.json()[0])
 
-    def test_publish_habit_detail(self):
+    def test_related_or_reward_validator(self):
         """
-        Тест на получение деталей публичной привычки (передавая валидный идентификатор).
+        Тест валидатора CheckRelatedHabitOrReward,
+        проверяющего, что нельзя выбрать одновременно вознаграждение и связанную привычку.
         """
 
-        response = self.client.get(
-            f'/habit/{self.habit_3.pk}/publish/detail/',
+        data = {
+            "user": self.user.pk,
+            "place": "шкафу",
+            "time_to_action": "17:00:00",
+            "action": "разложить носки",
+            "is_pleasant_habit": False,
+            "related_habit": self.pleasant_habit.pk,
+            "reward": 'Съешь конфетку',
+        }
+
+        response = self.client.post(
+            reverse('habits:habit-list'),
+            data=data
         )
 
         self.assertEqual(
             response.status_code,
-            status.HTTP_200_OK
+            status.HTTP_400_BAD_REQUEST
         )
 
         self.assertEqual(
             response.json(),
-            {'pk': 3, 'user': 1, 'place': 'спортзале', 'time_to_action': '16:00:00',
-             'action': 'убрать спорт инвентарь на места', 'is_pleasant_habit': False, 'related_habit': None,
-             'periodicity': 'daily', 'reward': None, 'time_to_complete': '00:02:00', 'is_publish': True}
+            {'non_field_errors': ['Нельзя выбрать одновременно вознаграждение и связанную привычку.']}
         )
 
-    def test_invalid_publish_habit_detail(self):
+    def test_check_related_validator(self):
         """
-        Тест на получение деталей публичной привычки (передавая невалидный идентификатор).
+        Тест валидатора CheckRelatedHabit,
+        проверяющего, что в связанные привычки могут попадать только привычки с признаком приятной привычки.
         """
 
-        response = self.client.get(
-            '/habit/999/publish/detail/',
+        data = {
+            "user": self.user.pk,
+            "place": "шкафу",
+            "time_to_action": "18:00:00",
+            "action": "разложить носки",
+            "is_pleasant_habit": False,
+            "related_habit": self.habit.pk,
+        }
+
+        response = self.client.post(
+            reverse('habits:habit-list'),
+            data=data
         )
 
         self.assertEqual(
             response.status_code,
-            status.HTTP_404_NOT_FOUND
+            status.HTTP_400_BAD_REQUEST
         )
 
-    def test_invalid_publish_habit_post(self):
+        self.assertEqual(
+            response.json(),
+            {'non_field_errors': ['В связанные привычки могут попадать только привычки с признаком приятной привычки.']}
+        )
+
+    def test_check_pleasant_validator(self):
         """
-        Тест на получение деталей публичной привычки (используя другой метод запроса).
+        Тест валидатора CheckPleasantHabit,
+        проверяющего, что у приятной привычки не может быть вознаграждения или связанной привычки.
         """
 
+        data = {
+            "user": self.user.pk,
+            "place": "шкафу",
+            "time_to_action": "19:00:00",
+            "action": "разложить носки",
+            "is_pleasant_habit": True,
+            "related_habit": self.pleasant_habit.pk,
+        }
+        data_1 = {
+            "user": self.user.pk,
+            "place": "шкафу",
+            "time_to_action": "19:00:00",
+            "action": "разложить носки",
+            "is_pleasant_habit": True,
+            "reward": "Съешь конфетку"
+        }
+
         response = self.client.post(
-            f'/habit/{self.habit_3.pk}/publish/detail/',
+            reverse('habits:habit-list'),
+            data=data
         )
 
         self.assertEqual(
             response.status_code,
-            status.HTTP_405_METHOD_NOT_ALLOWED
+            status.HTTP_400_BAD_REQUEST
+        )
+
+        self.assertEqual(
+            response.json(),
+            {'non_field_errors': ['У приятной привычки не может быть связанной привычки.']}
+        )
+
+        response = self.client.post(
+            reverse('habits:habit-list'),
+            data=data_1
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+        self.assertEqual(
+            response.json(),
+            {'non_field_errors': ['У приятной привычки не может быть вознаграждения.']}
+        )
+
+    def test_check_time_validator(self):
+        """
+        Тест валидатора CheckTimeToComplete,
+        проверяющего, что время выполнения должно быть не больше 120 секунд.
+        """
+
+        data = {
+            "user": self.user.pk,
+            "place": "шкафу",
+            "time_to_action": "19:00:00",
+            "action": "разложить носки",
+            "is_pleasant_habit": False,
+            "time_to_complete": "00:05:00"
+        }
+
+        response = self.client.post(
+            reverse('habits:habit-list'),
+            data=data
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+        self.assertEqual(
+            response.json(),
+            {'non_field_errors': [
+                f'Время выполнения должно быть не больше 120 секунд. Ваше время {data["time_to_complete"]}'
+            ]}
+        )
+
+    def test_habit_update(self):
+        """
+        Тестирование обновления привычки пользователем (валидными данными).
+        """
+
+        data = {
+            "place": "шкафу",
+            "time_to_action": "16:00:00",
+            "action": "разложить носки",
+            "is_pleasant_habit": False,
+        }
+
+        response = self.client.put(
+            reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
+            data=data
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+
+        self.assertEqual(
+            response.json(),
+            {'pk': 1, 'user': 1, 'place': 'шкафу', 'time_to_action': '16:00:00', 'action': 'разложить носки',
+             'is_pleasant_habit': False, 'related_habit': None, 'periodicity': 'daily', 'reward': None,
+             'time_to_complete': '00:02:00', 'is_publish': False}
+        )
+
+    def test_invalid_habit_update(self):
+        """
+        Тестирование обновления привычки пользователем (невалидными данными).
+        """
+
+        data = {
+            "place": "шкафу",
+            "time_to_action": "16:00:00",
+            "is_pleasant_habit": False,
+        }
+
+        response = self.client.put(
+            reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
+            data=data
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    def test_another_habit_update(self):
+        """
+        Тестирование обновления привычки другого пользователя.
+        """
+
+        data = {
+            "place": "шкафу",
+            "time_to_action": "16:00:00",
+            "action": "разложить носки",
+            "is_pleasant_habit": False,
+        }
+
+        response = self.client.put(
+            reverse('habits:habit-detail', kwargs={'pk': self.habit_1.pk}),
+            data=data
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    def test_habit_patch(self):
+        """
+        Тестирование частичного обновления привычки пользователем (валидными данными).
+        """
+
+        data = {
+            "place": "шкафу",
+        }
+
+        response = self.client.patch(
+            reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
+            data=data
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+
+        self.assertEqual(
+            response.json(),
+            {'pk': 1, 'user': 1, 'place': 'шкафу', 'time_to_action': '16:00:00', 'action': 'выпить стакан воды',
+             'is_pleasant_habit': False, 'related_habit': None, 'periodicity': 'daily', 'reward': None,
+             'time_to_complete': '00:02:00', 'is_publish': False}
+        )
+
+    def test_invalid_habit_patch(self):
+        """
+        Тестирование частичного обновления привычки пользователем (невалидными данными).
+        """
+
+        data = {
+            "time_to_action": "шоколад",
+        }
+
+        response = self.client.patch(
+            reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
+            data=data
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    def test_another_habit_patch(self):
+        """
+        Тестирование частичного обновления привычки другого пользователя.
+        """
+
+        data = {
+            "place": "шкафу",
+        }
+
+        response = self.client.patch(
+            reverse('habits:habit-detail', kwargs={'pk': self.habit_1.pk}),
+            data=data
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    def test_habit_delete(self):
+        """
+        Тестирование удаления привычки пользователем (валидными данными).
+        """
+
+        response = self.client.delete(
+            reverse('habits:habit-detail', kwargs={'pk': self.habit.pk}),
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_204_NO_CONTENT
+        )
+
+        self.assertEqual(
+            Habit.objects.all().count(),
+            3
+        )
+
+    def test_invalid_habit_delete(self):
+        """
+        Тестирование удаления привычки пользователем (невалидными данными).
+        """
+
+        response = self.client.delete(
+            reverse('habits:habit-detail', kwargs={'pk': 999}),
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    def test_another_habit_delete(self):
+        """
+        Тестирование удаления привычки другого пользователя.
+        """
+
+        response = self.client.delete(
+            reverse('habits:habit-detail', kwargs={'pk': self.habit_1.pk}),
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    def test_publish_habit_list(self):
+        """
+        Тест на получение списка публичных привычек.
+        """
+
+        response = self.client.get(
+            '/habit/publish/',
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+
+        self.assertEqual(
+            response.json(),
+            {'next': None, 'previous': None, 'results': [
+                {'pk': 3, 'user': 1, 'place': 'спортзале', 'time_to_action': '16:00:00',
+                 'action': 'убрать спорт инвентарь на места', 'is_pleasant_habit': False, 'related_habit': None,
+                 'periodicity': 'daily', 'reward': None, 'time_to_complete': '00:02:00', 'is_publish': True}
+            ]}
+        )
+
+    def test_publish_habit_list_pagination(self):
+        """
+        Тест на получение списка публичных привычек постранично.
+        """
+
+        for index in range(6):
+            Habit.objects.create(user=self.user2, place='парке', time_to_action='10:00:00',
+                                 action=f'пробежка {index}', is_publish=True)
+
+        response = self.client.get(
+            '/habit/publish/',
+            {'count': 'true'}
+        )
+
+        self.assertEqual(
+            response.json()['count'],
+            7
+        )
+
+        self.assertEqual(
+            [habit['pk'] for habit in response.json()['results']],
+            [3, 5, 6, 7, 8]
+        )
+
+        # следующая страница по курсору
+        response = self.client.get(
+            response.json()['next'],
+        )
+
+        self.assertEqual(
+            [habit['pk'] for habit in response.json()['results']],
+            [9, 10]
+        )
+
+        self.assertIsNone(response.json()['next'])
+
+    def test_publish_habit_search(self):
+        """
+        Тест полнотекстового поиска по публичным привычкам: словоформы, релевантность и постраничный вывод.
+        """
+
+        Habit.objects.create(user=self.user2, place='парке', time_to_action='10:00:00', action='пробежка',
+                             is_publish=True)
+        Habit.objects.create(user=self.user2, place='спортзале', time_to_action='10:00:00',
+                             action='растяжка после пробежки', is_publish=True)
+        Habit.objects.create(user=self.user2, place='спортзале', time_to_action='10:00:00', action='пробежки утром',
+                             is_publish=False)
+        Habit.objects.create(user=self.user2, place='стадионе', time_to_action='10:00:00',
+                             action='пробежка по стадиону', is_publish=True)
+        Habit.objects.create(user=self.user2, place='доме', time_to_action='10:00:00', action='прогулка по парку',
+                             is_publish=True)
+
+        response = self.client.get(reverse('habits:habit-publish_list'), {'search': 'пробежка', 'page_size': 2})
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['results'][0]['action'], 'пробежка')
+
+        response = self.client.get(data['next'])
+
+        # порядок остальных зависит от триграмм (pg_trgm), набор - нет
+        self.assertEqual(
+            {habit['action'] for habit in data['results'] + response.json()['results']},
+            {'пробежка', 'растяжка после пробежки', 'пробежка по стадиону'}
+        )
+
+        # совпадение в действии выше совпадения в месте
+        response = self.client.get(reverse('habits:habit-publish_list'), {'search': 'парк'})
+
+        self.assertEqual(
+            [habit['action'] for habit in response.json()['results']],
+            ['прогулка по парку', 'пробежка']
+        )
+
+        # вектор пересчитывается при изменении действия
+        Habit.objects.filter(action='пробежка').update(action='прогулка')
+        response = self.client.get(reverse('habits:habit-publish_list'), {'search': 'прогулки'})
+
+        self.assertEqual([habit['action'] for habit in response.json()['results']], ['прогулка', 'прогулка по парку'])
+
+        # у личных привычек вектора нет и их слова не попадают в словарь поиска, вектор появляется при публикации
+        private = Habit.objects.get(action='пробежки утром', is_publish=False)
+        self.assertIsNone(Habit.objects.values_list('search_vector', flat=True).get(pk=private.pk))
+        self.assertTrue(SearchWord.objects.filter(word='стадиону').exists())
+        self.assertFalse(SearchWord.objects.filter(word='утром').exists())
+
+        Habit.objects.filter(pk=private.pk).update(is_publish=True)
+        response = self.client.get(reverse('habits:habit-publish_list'), {'search': 'пробежка'})
+
+        self.assertIn(private.pk, [habit['pk'] for habit in response.json()['results']])
+        self.assertTrue(SearchWord.objects.filter(word='утром').exists())
+
+    def test_publish_habit_search_limit(self):
+        """
+        Тест ограничения поиска: ранжируется и считается не больше SEARCH_MAX_RESULTS найденных привычек.
+        """
+
+        for index in range(3):
+            Habit.objects.create(user=self.user2, place='парке', time_to_action='10:00:00', action=f'пробежка {index}',
+                                 is_publish=True)
+
+        with patch('habits.search.SEARCH_MAX_RESULTS', 2), patch.object(CappedCountPaginator, 'max_count', 2):
+            response = self.client.get(reverse('habits:habit-publish_list'), {'search': 'пробежка', 'page_size': 5})
+
+        data = response.json()
+        self.assertEqual((data['count'], len(data['results']), data['next']), (2, 2, None))
+
+    def test_publish_habit_search_trigram(self):
+        """
+        Тест поиска по триграммам: слово с опечаткой находится и в действии, и в месте.
+        """
+
+        if not trigram_available():
+            # в CI база с pg_trgm (postgres из docker), там пропуск теста - ошибка окружения
+            if os.getenv('CI'):
+                self.fail('расширение pg_trgm не установлено')
+            self.skipTest('расширение pg_trgm не установлено')
+
+        Habit.objects.create(user=self.user2, place='стадионе', time_to_action='10:00:00', action='пробежка',
+                             is_publish=True)
+        Habit.objects.create(user=self.user2, place='парке', time_to_action='10:00:00', action='прогулка',
+                             is_publish=True)
+
+        response = self.client.get(reverse('habits:habit-publish_list'), {'search': 'пробешка'})
+
+        self.assertEqual([habit['action'] for habit in response.json()['results']], ['пробежка'])
+
+        response = self.client.get(reverse('habits:habit-publish_list'), {'search': 'стадоне'})
+
+        self.assertEqual([habit['place'] for habit in response.json()['results']], ['стадионе'])
+
+        # начало слова дополняется словом из словаря
+        response = self.client.get(reverse('habits:habit-publish_list'), {'search': 'прогул'})
+
+        self.assertEqual([habit['action'] for habit in response.json()['results']], ['прогулка'])
+
+    def test_publish_habit_list_ndjson(self):
+        """
+        Тест на получение всех публичных привычек потоком в формате NDJSON.
+        """
+
+        for index in range(6):
+            Habit.objects.create(user=self.user2, place='парке', time_to_action='10:00:00',
+                                 action=f'пробежка {index}', is_publish=True)
+
+        response = self.client.get(
+            '/habit/publish/?format=ndjson',
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(
+            [row['pk'] for row in rows],
+            [3, 5, 6, 7, 8, 9, 10]
+        )
+
+        self.assertEqual(
+            rows[0],
+            {'pk': 3, 'user': 1, 'place': 'спортзале', 'time_to_action': '16:00:00',
+             'action': 'убрать спорт инвентарь на места', 'is_pleasant_habit': False, 'related_habit': None,
+             'periodicity': 'daily', 'reward': None, 'time_to_complete': '00:02:00', 'is_publish': True}
+        )
+
+    def test_invalid_publish_habit_list(self):
+        """
+        Тест на получение списка публичных привычек (используя другой метод запроса).
+        """
+
+        response = self.client.post(
+            '/habit/publish/',
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+
+    def test_publish_habit_detail(self):
+        """
+        Тест на получение деталей публичной привычки (передавая валидный идентификатор).
+        """
+
+        response = self.client.get(
+            f'/habit/{self.habit_3.pk}/publish/detail/',
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+
+        self.assertEqual(
+            response.json(),
+            {'pk': 3, 'user': 1, 'place': 'спортзале', 'time_to_action': '16:00:00',
+             'action': 'убрать спорт инвентарь на места', 'is_pleasant_habit': False, 'related_habit': None,
+             'periodicity': 'daily', 'reward': None, 'time_to_complete': '00:02:00', 'is_publish': True}
+        )
+
+    def test_invalid_publish_habit_detail(self):
+        """
+        Тест на получение деталей публичной привычки (передавая невалидный идентификатор).
+        """
+
+        response = self.client.get(
+            '/habit/999/publish/detail/',
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    def test_publish_habit_detail_cache(self):
+        """
+        Тест на кэширование деталей публичной привычки и сброс кэша при ее изменении.
+        """
+
+        stats = habit_cache.stats()['detail']
+        self.client.get(f'/habit/{self.habit_3.pk}/publish/detail/')
+
+        # повторный запрос отдается из кэша без обращения к базе данных
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/habit/{self.habit_3.pk}/publish/detail/')
+
+        self.assertEqual(response.json()['action'], 'убрать спорт инвентарь на места')
+        self.assertEqual(habit_cache.stats()['detail']['hits'], stats['hits'] + 1)
+        self.assertEqual(habit_cache.stats()['detail']['misses'], stats['misses'] + 1)
+
+        self.client.patch(f'/habit/{self.habit_3.pk}/', {'action': 'сложить гантели'})
+        response = self.client.get(f'/habit/{self.habit_3.pk}/publish/detail/')
+
+        self.assertEqual(response.json()['action'], 'сложить гантели')
+
+        # после снятия публикации привычка не отдается из кэша
+        self.client.patch(f'/habit/{self.habit_3.pk}/', {'is_publish': False})
+        response = self.client.get(f'/habit/{self.habit_3.pk}/publish/detail/')
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    def test_publish_habit_list_cache(self):
+        """
+        Тест на сброс кэша списка публичных привычек при их изменении и удалении.
+        """
+
+        self.client.get('/habit/publish/')
+        with self.assertNumQueries(0):
+            self.client.get('/habit/publish/')
+
+        # изменение непубличной привычки не сбрасывает кэш
+        self.habit.place = 'кухне'
+        self.habit.save()
+        with self.assertNumQueries(0):
+            self.client.get('/habit/publish/')
+
+        self.habit.is_publish = True
+        self.habit.save()
+        response = self.client.get('/habit/publish/')
+
+        self.assertEqual(
+            [habit['pk'] for habit in response.json()['results']],
+            [1, 3]
+        )
+
+        # удаление связанной привычки обнуляет ссылку у публичной привычки без сигнала post_save
+        self.habit_3.related_habit = self.pleasant_habit
+        self.habit_3.reward = None
+        self.habit_3.save()
+        self.client.get(f'/habit/{self.habit_3.pk}/publish/detail/')
+        self.pleasant_habit.delete()
+        response = self.client.get(f'/habit/{self.habit_3.pk}/publish/detail/')
+
+        self.assertIsNone(response.json()['related_habit'])
+
+        self.habit.delete()
+        response = self.client.get('/habit/publish/')
+
+        self.assertEqual(
+            [habit['pk'] for habit in response.json()['results']],
+            [3]
+        )
+
+    def test_publish_cache_round_trips(self):
+        """
+        Тест, что попадание в кэш списка - одно обращение к кэшу: версия и страница читаются вместе,
+        а счетчики попаданий не пишутся в общий кэш на каждый запрос.
+        """
+
+        self.client.get('/habit/publish/')
+        with patch('habits.cache.cache', wraps=django_cache) as mock_cache:
+            response = self.client.get('/habit/publish/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([call[0] for call in mock_cache.method_calls], ['get_many'])
+
+        # после изменения публичной привычки старая страница не отдается
+        self.client.patch(f'/habit/{self.habit_3.pk}/', {'action': 'сложить гантели'})
+        response = self.client.get('/habit/publish/')
+        self.assertIn('сложить гантели', [habit['action'] for habit in response.json()['results']])
+
+    def test_unpublished_habit_saved_twice(self):
+        """
+        Тест, что повторное сохранение снятой с публикации привычки не сбрасывает кэш списка еще раз.
+        """
+
+        habit = Habit.objects.get(pk=self.habit_3.pk)
+        habit.is_publish = False
+        with patch('habits.signals.invalidate') as mock_invalidate:
+            habit.save()
+            habit.save()
+
+        mock_invalidate.assert_called_once_with(habit.pk)
+
+    def test_invalid_publish_habit_post(self):
+        """
+        Тест на получение деталей публичной привычки (используя другой метод запроса).
+        """
+
+        response = self.client.post(
+            f'/habit/{self.habit_3.pk}/publish/detail/',
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+
+
+class HabitConcurrentUpdateTestCase(APITransactionTestCase):
+
+    def setUp(self):
+        """
+        Создание пользователя и привычки. Запросы выполняются в разных потоках с отдельными соединениями.
+        """
+        self.user = User.objects.create(email='concurrent@test.ru')
+        self.habit = Habit.objects.create(user=self.user, place='комнате', time_to_action='08:00:00', action='зарядка')
+        self.url = reverse('habits:habit-detail', kwargs={'pk': self.habit.pk})
+
+    def patch_in_thread(self, data, etag, responses):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        try:
+            responses[data['place']] = client.patch(self.url, data, HTTP_IF_MATCH=etag)
+        finally:
+            connection.close()
+
+    def test_concurrent_if_match(self):
+        """
+        Тест двух изменений с одним ETag: пока первый запрос сохраняет привычку, второй ждет блокировки строки
+        и получает 412, а не перезаписывает изменения первого.
+        """
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        etag = client.get(self.url)['ETag']
+
+        first_locked, release_first = threading.Event(), threading.Event()
+        perform_update = HabitViewSet.perform_update
+
+        def slow_perform_update(view, serializer):
+            # первый запрос останавливается после проверки ETag, но до сохранения
+            if serializer.validated_data['place'] == 'кухне':
+                first_locked.set()
+                release_first.wait(5)
+            perform_update(view, serializer)
+
+        responses = {}
+        with patch.object(HabitViewSet, 'perform_update', slow_perform_update):
+            first = threading.Thread(target=self.patch_in_thread, args=({'place': 'кухне'}, etag, responses))
+            first.start()
+            self.assertTrue(first_locked.wait(5))
+
+            second = threading.Thread(target=self.patch_in_thread, args=({'place': 'балконе'}, etag, responses))
+            second.start()
+            second.join(0.5)
+            # второй запрос ждет завершения транзакции первого
+            self.assertTrue(second.is_alive())
+
+            release_first.set()
+            first.join(5)
+            second.join(5)
+
+        self.assertEqual(responses['кухне'].status_code, status.HTTP_200_OK)
+        self.assertEqual(responses['балконе'].status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(Habit.objects.get(pk=self.habit.pk).place, 'кухне')
+
+
+class TelegramSenderTestCase(SimpleTestCase):
+
+    def setUp(self):
+        """
+        Запуск локального сервера, имитирующего telegram.
+        """
+        TelegramRateLimiter().reset()
+        self.server = FakeTelegramServer(failing_chats=[2]).start()
+        self.sender = TelegramSender(concurrency=4, base_url=self.server.url, token='TOKEN', timeout=5)
+
+    def tearDown(self):
+        self.sender.close()
+        self.server.stop()
+
+    def test_send_many(self):
+        """
+        Тест параллельной отправки: результат возвращается для каждого сообщения в исходном порядке.
+        """
+
+        messages = [(chat_id, f'сообщение {chat_id}') for chat_id in range(1, 11)]
+
+        results = self.sender.send_many(messages)
+
+        self.assertEqual(
+            [result.chat_id for result in results],
+            list(range(1, 11))
+        )
+
+        self.assertEqual(
+            [result.chat_id for result in results if not result.ok],
+            [2]
+        )
+
+        self.assertEqual(
+            results[1].status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+        self.assertEqual(
+            len(self.server.messages),
+            9
+        )
+
+    def test_send_connection_error(self):
+        """
+        Тест отправки на недоступный сервер: ошибка соединения возвращается в результате, а не пробрасывается.
+        """
+
+        self.server.stop()
+
+        result = self.sender.send(1, 'сообщение')
+
+        self.assertFalse(result.ok)
+        self.assertIsNone(result.status_code)
+        self.assertTrue(result.error)
+
+        # повторный запуск, чтобы tearDown корректно остановил сервер
+        self.server = FakeTelegramServer().start()
+
+
+@override_settings(TG_RATE_LIMIT_PER_CHAT=100, QUERY_BUDGET_STRICT=True)
+class TelegramIntegrationTestCase(TestCase):
+
+    def setUp(self):
+        """
+        Создание пользователей с telegram и привычек на разное время и дни недели.
+        """
+        TelegramRateLimiter().reset()
+
+        self.users = [
+            User.objects.create(email=f'tg{index}@test.ru', telegram=f'tg{index}', telegram_id=100 + index)
+            for index in range(3)
+        ]
+        self.user_without_tg = User.objects.create(email='no_tg@test.ru')
+
+        # 2023-12-04 - понедельник, 08:00 по Москве
+        self.monday_8 = datetime(2023, 12, 4, 5, 0, 30, tzinfo=dt_timezone.utc)
+
+        for user in self.users + [self.user_without_tg]:
+            Habit.objects.create(user=user, place='дома', time_to_action='08:00:00', action='зарядка')
+            Habit.objects.create(user=user, place='дома', time_to_action='08:00:00', action='почитать',
+                                 periodicity='monday')
+            Habit.objects.create(user=user, place='дома', time_to_action='08:00:00', action='погулять',
+                                 periodicity='tuesday')
+            Habit.objects.create(user=user, place='дома', time_to_action='08:01:00', action='умыться')
+
+    def test_due_reminders(self):
+        """
+        Тест выборки уведомлений: только привычки текущей минуты и дня недели у пользователей с telegram_id.
+        """
+
+        reminders = list(Habit.objects.due(self.monday_8).reminders())
+
+        self.assertEqual(
+            sorted(reminders),
+            sorted(
+                [(user.telegram_id, 'зарядка в 08:00:00 в дома') for user in self.users]
+                + [(user.telegram_id, 'почитать в 08:00:00 в дома') for user in self.users]
+            )
+        )
+
+    def test_due_reminders_query_count(self):
+        """
+        Тест количества запросов: выборка уведомлений выполняется одним запросом независимо от количества привычек.
+        """
+
+        with self.assertNumQueries(1):
+            list(Habit.objects.due(self.monday_8).reminders())
+
+        for user in self.users:
+            for _ in range(10):
+                Habit.objects.create(user=user, place='дома', time_to_action='08:00:00', action='зарядка')
+
+        with self.assertNumQueries(1):
+            reminders = list(Habit.objects.due(self.monday_8).reminders())
+
+        self.assertEqual(
+            len(reminders),
+            36
+        )
+
+    def test_telegram_integration(self):
+        """
+        Тест периодической задачи: уведомления текущей минуты отправляются в telegram группой подзадач.
+        """
+
+        # подзадачи выполняются синхронно в текущем процессе
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+        with FakeTelegramServer() as server, override_settings(TG_URL=server.url, TG_SEND_SHARDS=4), \
+                patch('habits.tasks.timezone') as mock_timezone:
+            mock_timezone.now.return_value = self.monday_8
+
+            with self.captureOnCommitCallbacks() as callbacks:
+                result = telegram_integration()
+
+            # до фиксации транзакции подзадачи в очередь не ставятся
+            self.assertEqual(server.messages, [])
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(
+            result,
+            {'shards': 4}
+        )
+
+        self.assertEqual(
+            sorted(server.messages),
+            sorted(
+                [(str(user.telegram_id), 'зарядка в 08:00:00 в дома') for user in self.users]
+                + [(str(user.telegram_id), 'почитать в 08:00:00 в дома') for user in self.users]
+            )
+        )
+
+    def test_telegram_integration_catch_up(self):
+        """
+        Тест задержки рассылки: пропущенные минуты досылаются следующим запуском без потерь и повторов.
+        """
+
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+        with FakeTelegramServer() as server, override_settings(TG_URL=server.url), \
+                patch('habits.tasks.timezone') as mock_timezone:
+            mock_timezone.now.return_value = self.monday_8
+            with self.captureOnCommitCallbacks(execute=True):
+                telegram_integration()
+
+            # воркер был занят, запуски в 08:01 и 08:02 не состоялись
+            mock_timezone.now.return_value = datetime(2023, 12, 4, 5, 3, 10, tzinfo=dt_timezone.utc)
+            with self.captureOnCommitCallbacks(execute=True):
+                telegram_integration()
+
+            # повторный запуск в ту же минуту ничего не отправляет
+            mock_timezone.now.return_value = datetime(2023, 12, 4, 5, 3, 50, tzinfo=dt_timezone.utc)
+            self.assertEqual(telegram_integration(), {'shards': 0})
+
+        self.assertEqual(
+            sorted(server.messages),
+            sorted(
+                [(str(user.telegram_id), 'зарядка в 08:00:00 в дома') for user in self.users]
+                + [(str(user.telegram_id), 'почитать в 08:00:00 в дома') for user in self.users]
+                + [(str(user.telegram_id), 'умыться в 08:01:00 в дома') for user in self.users]
+            )
+        )
+
+    def test_due_between_midnight(self):
+        """
+        Тест выборки за окно через полночь UTC: ежедневная привычка попадает в выборку один раз.
+        """
+
+        user = self.users[0]
+        Habit.objects.all().delete()
+        # 03:00 по Москве - 00:00 UTC
+        Habit.objects.create(user=user, place='дома', time_to_action='03:00:00', action='проснуться')
+
+        start = datetime(2023, 12, 3, 23, 50, tzinfo=dt_timezone.utc)
+        end = datetime(2023, 12, 4, 0, 10, tzinfo=dt_timezone.utc)
+
+        self.assertEqual(
+            list(Habit.objects.due_between(start, end).reminders()),
+            [(user.telegram_id, 'проснуться в 03:00:00 в дома')]
+        )
+
+    def test_telegram_integration_without_habits(self):
+        """
+        Тест периодической задачи: если привычек на текущую минуту нет, подзадачи не создаются.
+        """
+
+        with patch('habits.tasks.timezone') as mock_timezone, patch('habits.tasks.chord') as mock_chord:
+            mock_timezone.now.return_value = datetime(2023, 12, 4, 9, 0, tzinfo=dt_timezone.utc)
+
+            result = telegram_integration()
+
+        self.assertEqual(result, {'shards': 0})
+        mock_chord.assert_not_called()
+
+    def test_send_reminders_shard(self):
+        """
+        Тест подзадачи: отправляются только привычки из своего диапазона ключей, итоги суммируются.
+        """
+
+        pks = sorted(Habit.objects.due(self.monday_8).values_list('pk', flat=True))
+        ranges = shard_ranges(pks[0], pks[-1], 2)
+
+        with FakeTelegramServer(failing_chats=[100]) as server, override_settings(TG_URL=server.url):
+            results = [
+                send_reminders_shard(self.monday_8.isoformat(), self.monday_8.isoformat(), pk_from, pk_to)
+                for pk_from, pk_to in ranges
+            ]
+
+        self.assertEqual(
+            collect_delivery_counts(results),
+            {'shards': 2, 'sent': 4, 'deferred': 0, 'failed': 2}
+        )
+
+    def test_shard_ranges(self):
+        """
+        Тест разбиения диапазона ключей на непересекающиеся диапазоны.
+        """
+
+        self.assertEqual(shard_ranges(1, 10, 3), [(1, 4), (5, 8), (9, 10)])
+        self.assertEqual(shard_ranges(5, 5, 8), [(5, 5)])
+
+
+class TelegramRateLimiterTestCase(SimpleTestCase):
+
+    def setUp(self):
+        """
+        Сброс состояния ограничителя и запуск локального telegram-сервера с ограничениями частоты.
+        """
+        self.limiter = TelegramRateLimiter(global_rate=5, chat_rate=1)
+        self.limiter.reset()
+        self.server = FakeTelegramServer(global_rate=5, chat_rate=1).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_acquire(self):
+        """
+        Тест корзин токенов: общий лимит и лимит на чат.
+        """
+
+        self.assertEqual(
+            [self.limiter.acquire(chat_id) for chat_id in range(5)],
+            [0, 0, 0, 0, 0]
+        )
+
+        self.assertGreater(self.limiter.acquire(5), 0)
+
+        wait = TelegramRateLimiter(global_rate=100, chat_rate=1).acquire(0)
+        self.assertTrue(0 < wait <= 1)
+
+    def test_sender_respects_limits(self):
+        """
+        Тест отправки: сообщения сверх лимита откладываются, не доходя до telegram.
+        """
+
+        with TelegramSender(concurrency=4, base_url=self.server.url, token='TOKEN', limiter=self.limiter) as sender:
+            results = sender.send_many([(chat_id, 'сообщение') for chat_id in range(10)])
+
+        self.assertEqual(sum(result.ok for result in results), 5)
+        self.assertEqual(sum(result.deferred for result in results), 5)
+        self.assertEqual(self.server.rate_limited, 0)
+
+        self.assertEqual(
+            self.limiter.metrics(),
+            {'sent': 5, 'throttled': 5}
+        )
+
+    def test_retry_after(self):
+        """
+        Тест ответа 429: сообщение откладывается на retry_after из ответа telegram.
+        """
+
+        limiter = TelegramRateLimiter(global_rate=100, chat_rate=100)
+        self.server.global_rate = 2
+
+        with TelegramSender(concurrency=1, base_url=self.server.url, token='TOKEN', limiter=limiter) as sender:
+            results = sender.send_many([(chat_id, 'сообщение') for chat_id in range(3)])
+
+        self.assertEqual(
+            [(result.ok, result.retry_after) for result in results],
+            [(True, None), (True, None), (False, 1)]
+        )
+
+        self.assertEqual(
+            limiter.metrics(),
+            {'sent': 2, 'rate_limited': 1}
+        )
+
+    def test_deferred_send(self):
+        """
+        Тест отложенной отправки: при повторном ограничении сообщение снова ставится в очередь с задержкой.
+        """
+
+        self.limiter.acquire(1)
+
+        with override_settings(TG_URL=self.server.url, TG_RATE_LIMIT_GLOBAL=5, TG_RATE_LIMIT_PER_CHAT=1), \
+                patch.object(send_telegram_message, 'apply_async') as mock_apply_async:
+            self.assertFalse(send_telegram_message(1, 'сообщение', 1))
+
+        args, kwargs = mock_apply_async.call_args
+        self.assertEqual(args, ((1, 'сообщение', 2, True),))
+        self.assertTrue(0 < kwargs['countdown'] <= 1)
+
+    def test_acquire_reserve(self):
+        """
+        Тест резервирования: каждый следующий запрос получает свой слот, без резервирования токен не списывается.
+        """
+
+        for chat_id in range(5):
+            self.limiter.acquire(chat_id)
+
+        waits = [self.limiter.acquire(chat_id) for chat_id in range(5, 8)]
+        self.assertEqual(waits, sorted(waits))
+        self.assertAlmostEqual(waits[2] - waits[0], 0.4, delta=0.05)
+
+        self.assertGreater(self.limiter.acquire(8, reserve=False), waits[2])
+        self.assertAlmostEqual(self.limiter.acquire(8, reserve=False), self.limiter.acquire(9), delta=0.05)
+
+    def test_burst_delivered(self):
+        """
+        Тест рассылки пачки больше емкости корзины при лимитах по умолчанию: отложенные сообщения отправляются
+        в своих слотах без повторных задержек, ни одно сообщение не теряется.
+        """
+
+        limiter = TelegramRateLimiter()
+        limiter.reset()
+        server = FakeTelegramServer().start()
+        self.addCleanup(server.stop)
+        # 80 чатов и еще 2 сообщения в чат 0 (лимит 1 сообщение в секунду на чат)
+        messages = [(chat_id, 'сообщение') for chat_id in range(80)] + [(0, 'сообщение')] * 2
+
+        queue = []
+
+        def apply_async(args, countdown):
+            queue.append((monotonic() + countdown, args))
+
+        started = monotonic()
+        chat_sent_at = []
+        with override_settings(TG_URL=server.url), patch.object(send_telegram_message, 'apply_async', apply_async):
+            with TelegramSender(concurrency=8, base_url=server.url, token='TOKEN', limiter=limiter) as sender:
+                results = sender.send_many(messages)
+            chat_sent_at += [started for result in results if result.ok and result.chat_id == 0]
+            deferred = defer_throttled(results)
+
+            while queue:
+                queue.sort(key=lambda item: item[0])
+                due, args = queue.pop(0)
+                sleep(max(0.0, due - monotonic()))
+                if send_telegram_message(*args) and args[0] == 0:
+                    chat_sent_at.append(monotonic())
+        elapsed = monotonic() - started
+
+        self.assertEqual(len(server.messages), len(messages))
+        # зарезервированные сообщения повторно не задерживаются
+        self.assertEqual(
+            limiter.metrics(),
+            {'sent': len(messages), 'throttled': deferred}
+        )
+        # сообщения сверх емкости растянуты по времени согласно лимитам
+        rate = settings.TG_RATE_LIMIT_GLOBAL
+        self.assertGreater(elapsed, (len(messages) - rate) / rate * 0.9)
+        self.assertEqual(len(chat_sent_at), 3)
+        self.assertTrue(all(later - earlier > 0.9 for earlier, later in zip(chat_sent_at, chat_sent_at[1:])))
+
+    def test_dropped_after_max_deferrals(self):
+        """
+        Тест отбрасывания сообщения после TG_SEND_MAX_DEFERRALS откладываний: учитывается в метрике dropped.
+        """
+
+        result = SendResult(chat_id=1, ok=False, text='сообщение', retry_after=1)
+
+        with patch.object(send_telegram_message, 'apply_async') as mock_apply_async:
+            self.assertEqual(defer_throttled([result], settings.TG_SEND_MAX_DEFERRALS), 0)
+
+        mock_apply_async.assert_not_called()
+        self.assertEqual(self.limiter.metrics(), {'dropped': 1})
+
+
+class HabitScheduleTestCase(TestCase):
+
+    def setUp(self):
+        """
+        Создание пользователей из разных часовых поясов.
+        """
+        self.moscow_user = User.objects.create(email='moscow@test.ru', telegram_id=1)
+        self.tokyo_user = User.objects.create(email='tokyo@test.ru', telegram_id=2, timezone='Asia/Tokyo')
+        self.ny_user = User.objects.create(email='ny@test.ru', telegram_id=3, timezone='America/New_York')
+
+    def test_utc_slot(self):
+        """
+        Тест расчета слота UTC, в том числе с переходом через полночь для привычек по дням недели.
+        """
+
+        winter = datetime(2023, 12, 4, tzinfo=dt_timezone.utc)
+
+        self.assertEqual(utc_slot(time(8, 0), 'daily', 'Europe/Moscow', winter), (5 * 60, None))
+        self.assertEqual(utc_slot(time(1, 30), 'monday', 'Europe/Moscow', winter), (22 * 60 + 30, 6))
+        self.assertEqual(utc_slot(time(22, 0), 'sunday', 'America/New_York', winter), (3 * 60, 0))
+
+    def test_due_in_user_timezone(self):
+        """
+        Тест выборки уведомлений: привычка срабатывает в 08:00 по времени своего пользователя.
+        """
+
+        with patch('habits.models.timezone') as mock_models_timezone:
+            mock_models_timezone.now.return_value = datetime(2023, 12, 4, tzinfo=dt_timezone.utc)
+            for user in (self.moscow_user, self.tokyo_user, self.ny_user):
+                Habit.objects.create(user=user, place='дома', time_to_action='08:00:00', action='зарядка')
+
+        def due_chats(hour):
+            moment = datetime(2023, 12, 4, hour, 0, tzinfo=dt_timezone.utc)
+            return [chat_id for chat_id, _ in Habit.objects.due(moment).reminders()]
+
+        self.assertEqual(due_chats(23), [2])
+        self.assertEqual(due_chats(5), [1])
+        self.assertEqual(due_chats(13), [3])
+
+    def test_user_timezone_change(self):
+        """
+        Тест смены часового пояса пользователя: слоты его привычек пересчитываются.
+        """
+
+        habit = Habit.objects.create(user=self.moscow_user, place='дома', time_to_action='08:00:00', action='зарядка')
+
+        user = User.objects.get(pk=self.moscow_user.pk)
+        user.timezone = 'Asia/Tokyo'
+        user.save()
+
+        habit.refresh_from_db()
+        self.assertEqual(habit.utc_minute, 23 * 60)
+
+    def test_rebucket_habit_schedule(self):
+        """
+        Тест пересчета слотов при переходе на летнее время: меняются только привычки затронутого часового пояса.
+        """
+
+        winter = datetime(2024, 3, 9, 12, 0, tzinfo=dt_timezone.utc)
+        summer = datetime(2024, 3, 10, 12, 0, tzinfo=dt_timezone.utc)
+
+        with patch('habits.models.timezone') as mock_models_timezone:
+            mock_models_timezone.now.return_value = winter
+            ny_habit = Habit.objects.create(user=self.ny_user, place='дома', time_to_action='08:00:00',
+                                            action='зарядка')
+            Habit.objects.create(user=self.moscow_user, place='дома', time_to_action='08:00:00', action='зарядка')
+
+        with patch('habits.tasks.timezone') as mock_timezone:
+            mock_timezone.now.return_value = winter
+            self.assertEqual(rebucket_habit_schedule(), 0)
+
+            mock_timezone.now.return_value = summer
+            self.assertEqual(rebucket_habit_schedule(), 1)
+
+        ny_habit.refresh_from_db()
+        self.assertEqual(ny_habit.utc_minute, 12 * 60)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class TelegramUserIdTestCase(TestCase):
+
+    def setUp(self):
+        """
+        Создание пользователей с указанным telegram и запуск локального telegram-сервера.
+        """
+        self.alice = User.objects.create(email='alice@test.ru', telegram='@Alice')
+        self.bob = User.objects.create(email='bob@test.ru', telegram='bob')
+        self.carol = User.objects.create(email='carol@test.ru', telegram='carol', telegram_id=300)
+
+        TelegramRateLimiter().reset()
+        self.server = FakeTelegramServer().start()
+        self.settings_override = override_settings(TG_URL=self.server.url)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.server.stop()
+
+    def test_get_telegram_user_id(self):
+        """
+        Тест получения id: один запрос getUpdates за запуск и обновление только пользователей без id.
+        """
+
+        self.server.add_message_update(100, 'alice')
+        self.server.add_message_update(200, 'Bob')
+        self.server.add_message_update(301, 'carol')
+
+        with CaptureQueriesContext(connection) as queries:
+            updated = get_telegram_user_id()
+
+        self.assertEqual(updated, 2)
+
+        self.assertEqual(
+            [method for method, _ in self.server.requests],
+            ['getUpdates']
+        )
+
+        # пользователи сохраняются одним запросом
+        self.assertEqual(
+            len([query for query in queries if query['sql'].startswith('UPDATE "users_user"')]),
+            1
+        )
+
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.carol.refresh_from_db()
+        self.assertEqual(
+            (self.alice.telegram_id, self.bob.telegram_id, self.carol.telegram_id),
+            (100, 200, 300)
+        )
+
+        self.assertEqual(
+            TaskCheckpoint.objects.get(name='telegram_updates_offset').value,
+            3
+        )
+
+    def test_get_telegram_user_id_offset(self):
+        """
+        Тест offset: обработанные обновления повторно не запрашиваются.
+        """
+
+        self.server.add_message_update(100, 'someone')
+        get_telegram_user_id()
+
+        self.server.add_message_update(200, 'bob')
+        updated = get_telegram_user_id()
+
+        self.assertEqual(updated, 1)
+
+        self.assertEqual(
+            self.server.requests[-1][1]['offset'],
+            '2'
+        )
+
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.telegram_id, 200)
+
+    def test_get_telegram_user_id_later_registration(self):
+        """
+        Тест сохранения чатов: id назначается пользователю, который зарегистрировался или указал username
+        после того, как написал боту, без повторного запроса обработанных обновлений.
+        """
+
+        self.server.add_message_update(400, 'Dave')
+        self.server.add_message_update(500, 'erin')
+
+        self.assertEqual(get_telegram_user_id(), 0)
+        self.assertEqual(TelegramChat.objects.get(username='dave').chat_id, 400)
+
+        dave = User.objects.create(email='dave@test.ru', telegram='@dave')
+        self.bob.telegram = 'Erin'
+        self.bob.save()
+
+        self.assertEqual(get_telegram_user_id(), 2)
+
+        dave.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((dave.telegram_id, self.bob.telegram_id), (400, 500))
+
+        # второй запрос getUpdates продолжил с offset, старые обновления не загружались
+        self.assertEqual(self.server.requests[-1][1]['offset'], '3')
+
+
+class StreakTestCase(SimpleTestCase):
+
+    def test_daily_streak(self):
+        """
+        Тест серии ежедневной привычки.
+        """
+
+        streak = Streak.from_dates([date(2023, 12, 1), date(2023, 12, 2), date(2023, 12, 4), date(2023, 12, 5),
+                                    date(2023, 12, 6)], 'daily')
+
+        self.assertEqual((streak.current, streak.best), (3, 3))
+        self.assertEqual(streak.current_on(date(2023, 12, 7), 'daily'), 3)
+        self.assertEqual(streak.current_on(date(2023, 12, 8), 'daily'), 0)
+
+        with self.assertRaises(ValueError):
+            streak.add(date(2023, 12, 3), 'daily')
+
+    def test_weekly_streak(self):
+        """
+        Тест серии еженедельной привычки: несколько выполнений за неделю считаются одним.
+        """
+
+        streak = Streak.from_dates([date(2023, 12, 4), date(2023, 12, 6), date(2023, 12, 11), date(2023, 12, 17),
+                                    date(2024, 1, 1)], 'monday')
+
+        self.assertEqual((streak.current, streak.best), (1, 2))
+        self.assertEqual(streak.current_on(date(2024, 1, 14), 'monday'), 1)
+        self.assertEqual(streak.current_on(date(2024, 1, 15), 'monday'), 0)
+
+
+class OpenApiSchemaTestCase(SimpleTestCase):
+
+    def setUp(self):
+        """
+        Файлы схемы создаются во временном каталоге, готовые схемы процесса сбрасываются.
+        """
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(SCHEMA_DIR=Path(directory.name) / 'schema')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schema_document.cache_clear()
+        self.addCleanup(schema_document.cache_clear)
+
+    def test_schema_generated_without_file(self):
+        """
+        Тест, что без файла схема генерируется один раз и отдается с ETag.
+        """
+
+        with patch('config.schema.generate_schema', wraps=generate_schema) as generate:
+            response = self.client.get(reverse('schema'))
+            etag = response['ETag']
+            self.client.get(reverse('schema'))
+
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+        self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi; charset=utf-8')
+        self.assertIn(b'/habit/publish/', response.content)
+
+        response = self.client.get(reverse('schema'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(response.content, b'')
+
+    def test_schema_from_file(self):
+        """
+        Тест, что схема из файлов build_schema отдается без генерации и сжимается gzip.
+        """
+
+        call_command('build_schema', stdout=io.StringIO())
+        content = (settings.SCHEMA_DIR / 'openapi.json').read_bytes()
+
+        with patch('config.schema.generate_schema') as generate:
+            response = self.client.get(reverse('schema'), {'format': 'json'}, HTTP_ACCEPT_ENCODING='gzip, br')
+
+        generate.assert_not_called()
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
         )
+        self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi+json')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), content)
+        self.assertEqual(json.loads(content)['info']['title'], 'Habit tracker')
@@ -2,8 +2,6 @@ from datetime import time
 
 from rest_framework.serializers import ValidationError
 
-from habits.models import Habit
-
 
 class CheckRelatedHabitOrReward:
     """
@@ -25,12 +23,11 @@ class CheckRelatedHabit:
 
     def __call__(self, data):
         related_habit = data.get('related_habit')
-        if related_habit:
-            habit = Habit.objects.get(pk=related_habit.pk)
-            if not habit.is_pleasant_habit:
-                raise ValidationError(
-                    'В связанные привычки могут попадать только привычки с признаком приятной привычки.'
-                )
+        # привычка уже загружена полем сериалайзера, повторный запрос не нужен
+        if related_habit and not related_habit.is_pleasant_habit:
+            raise ValidationError(
+                'В связанные привычки могут попадать только привычки с признаком приятной привычки.'
+            )
 
 
 class CheckPleasantHabit:
@@ -4,7 +4,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView as BaseTokenObtai
 from rest_framework_simplejwt.views import TokenRefreshView as BaseTokenRefreshView
 
 from habits.serializers import CommonDetailSerializer, CommonDetailAndStatusSerializer
-from users.serializers import TokenDetailAndStatusSerializer, TokenDetailSerializer
+from users.serializers import TokenDetailAndStatusSerializer, TokenDetailSerializer, TokenObtainPairSerializer
 from users.serializers import UserSerializer
 
 
@@ -36,7 +36,7 @@ class UserCreateAPIView(generics.CreateAPIView):
     }
 )
 class TokenObtainPairView(BaseTokenObtainPairView):
-    pass
+    serializer_class = TokenObtainPairSerializer
 
 
 @extend_schema(
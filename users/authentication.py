@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import OrderedDict
+from copy import copy
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from config.queries import exclude_from_budget
+
+TOKEN_VERSION_CLAIM = 'token_version'
+KEY_PREFIX = 'users:auth'
+OUTCOMES = ('local_hit', 'hit', 'miss')
+
+
+def user_key(user_id, version):
+    return f'{KEY_PREFIX}:user:{user_id}:{version}'
+
+
+class LocalUserCache:
+    """
+    LRU-кэш пользователей в памяти процесса с временем жизни записей.
+    Каждый запрос получает свою копию пользователя: изменения request.user в представлении
+    не должны попадать в кэш и в другие запросы.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        return copy(user)
+
+    def set(self, key, user):
+        user = copy(user)
+        with self.lock:
+            self.entries[key] = (user, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalUserCache(settings.AUTH_USER_LOCAL_CACHE_SIZE, settings.AUTH_USER_LOCAL_CACHE_TIMEOUT)
+
+
+class AuthCacheStats:
+    """
+    Счетчики попаданий в кэш пользователей. Копятся в памяти процесса и сбрасываются в общий кэш
+    каждые flush_every запросов, чтобы не обращаться к redis при каждом попадании в локальный кэш.
+    """
+
+    flush_every = 100
+
+    def __init__(self):
+        self.counts = dict.fromkeys(OUTCOMES, 0)
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def record(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+            self.pending += 1
+            if self.pending < self.flush_every:
+                return
+            counts, self.counts, self.pending = self.counts, dict.fromkeys(OUTCOMES, 0), 0
+        self.flush(counts)
+
+    def flush(self, counts=None):
+        if counts is None:
+            with self.lock:
+                counts, self.counts, self.pending = self.counts, dict.fromkeys(OUTCOMES, 0), 0
+        for outcome, count in counts.items():
+            if count:
+                key = f'{KEY_PREFIX}:stats:{outcome}'
+                cache.add(key, 0, None)
+                cache.incr(key, count)
+
+    @staticmethod
+    def summary():
+        """
+        Сводка по всем процессам: количество запросов по исходам и доля попаданий в кэш.
+        """
+
+        result = {outcome: cache.get(f'{KEY_PREFIX}:stats:{outcome}', 0) for outcome in OUTCOMES}
+        total = sum(result.values())
+        result['hit_rate'] = (result['local_hit'] + result['hit']) / total if total else 0.0
+        return result
+
+
+stats = AuthCacheStats()
+
+
+def invalidate_user(user):
+    """
+    Сброс закэшированного пользователя. В кэше может быть только текущая версия токенов
+    или предыдущая, если версия только что увеличилась.
+    В других процессах локальная запись живет не дольше AUTH_USER_LOCAL_CACHE_TIMEOUT,
+    а токены с прежней версией после смены пароля туда уже не попадут.
+    """
+
+    local_cache.delete_prefix(f'{KEY_PREFIX}:user:{user.pk}:')
+    cache.delete_many([user_key(user.pk, user.token_version), user_key(user.pk, user.token_version - 1)])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Аутентификация по JWT с получением пользователя из кэша вместо запроса к базе на каждый запрос.
+    Пользователь ищется сначала в LRU-кэше процесса, затем в общем кэше (redis) и только потом в базе.
+    Ключ кэша включает версию токенов пользователя: после смены пароля версия растет
+    и токены с прежней версией отклоняются.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+        key = user_key(user_id, version)
+
+        user = local_cache.get(key)
+        if user is not None:
+            stats.record('local_hit')
+        else:
+            user = cache.get(key)
+            if user is not None:
+                stats.record('hit')
+            else:
+                stats.record('miss')
+                # запрос пользователя при промахе кэша не входит в бюджет запросов представления (config.queries)
+                with exclude_from_budget():
+                    user = super().get_user(validated_token)
+                if user.token_version != version:
+                    raise AuthenticationFailed(_('Token is invalid or expired'), code='token_not_valid')
+                cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+            local_cache.set(key, user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
@@ -0,0 +1,12 @@
+import json
+
+from django.core.management import BaseCommand
+
+from users.authentication import stats
+
+
+class Command(BaseCommand):
+    help = 'Статистика кэша пользователей для аутентификации (попадания, промахи, доля попаданий) в формате JSON.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(stats.summary()))
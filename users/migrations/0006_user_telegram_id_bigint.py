@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='telegram_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='id пользователя telegram'),
+        ),
+    ]
@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from users.validators import validate_timezone
+
 NULLABLE = {'blank': True, 'null': True}
 
 
@@ -21,9 +24,37 @@ class User(AbstractUser):
     country = models.CharField(max_length=50, verbose_name='страна', **NULLABLE)
     avatar = models.ImageField(upload_to='users/', verbose_name='аватар', **NULLABLE)
     telegram = models.CharField(max_length=150, verbose_name='telegram', **NULLABLE)
-    telegram_id = models.IntegerField(verbose_name='id пользователя telegram', **NULLABLE)
+    telegram_id = models.BigIntegerField(verbose_name='id пользователя telegram', **NULLABLE)
+    timezone = models.CharField(max_length=63, verbose_name='часовой пояс', default=settings.TIME_ZONE,
+                                validators=[validate_timezone])
 
     role = models.CharField(max_length=15, verbose_name='роль', choices=UserRole.choices, default=UserRole.MEMBER)
+    token_version = models.PositiveIntegerField(verbose_name='версия токенов', default=0, editable=False)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        # Запоминаем загруженный часовой пояс, чтобы при его изменении пересчитать слоты привычек
+        instance._loaded_timezone = loaded.get('timezone')
+        # и пароль, чтобы при его смене отозвать выданные токены
+        instance._loaded_password = loaded.get('password')
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded_password = getattr(self, '_loaded_password', None)
+        if loaded_password is not None and loaded_password != self.password:
+            # Токены с прежней версией перестают приниматься
+            self.token_version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'token_version'}
+        super().save(*args, **kwargs)
+        self._loaded_password = self.password
+
+        loaded_timezone = getattr(self, '_loaded_timezone', None)
+        if loaded_timezone is not None and loaded_timezone != self.timezone:
+            self.habit_set.reschedule()
+        self._loaded_timezone = self.timezone
@@ -0,0 +1,9 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """
+    Описание схемы аутентификации CachedJWTAuthentication для drf-spectacular (как у JWTAuthentication).
+    """
+
+    target_class = 'users.authentication.CachedJWTAuthentication'
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
 
+from users.authentication import TOKEN_VERSION_CLAIM
 from users.models import User
 
 
@@ -10,7 +12,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = ('email', 'password', 'phone', 'country', 'avatar', 'telegram',)
+        fields = ('email', 'password', 'phone', 'country', 'avatar', 'telegram', 'timezone',)
 
     password = serializers.CharField(write_only=True)
 
@@ -27,6 +29,19 @@ class UserSerializer(serializers.ModelSerializer):
             return instance
 
 
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    """
+    Сериалайзер получения пары токенов с версией токенов пользователя.
+    Версия переносится в access-токены при обновлении и проверяется при аутентификации.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
 class TokenDetailAndStatusSerializer(serializers.Serializer):
     """
     Сериалайзер для drf-spectacular документации для токена.
@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.authentication import invalidate_user
+from users.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Сброс пользователя в кэше аутентификации при любом изменении (пароль, активность, профиль).
+    Сброс повторяется после фиксации транзакции, чтобы параллельный запрос не оставил в кэше старые данные.
+    """
+
+    invalidate_user(instance)
+    transaction.on_commit(lambda: invalidate_user(instance))
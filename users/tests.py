@@ -1 +1,132 @@
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from users.authentication import local_cache, stats
+from users.models import User
+
+
+class CachedJWTAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        """
+        Метод для установки тестовых данных.
+        """
+
+        local_cache.clear()
+        self.user = User.objects.create(email='member@test.ru', is_active=True)
+        self.user.set_password('test')
+        self.user.save()
+
+    def obtain_token(self, password='test'):
+        response = self.client.post(
+            reverse('user:token_obtain_pair'),
+            {'email': 'member@test.ru', 'password': password}
+        )
+        return response.json()['access']
+
+    def get_habits(self, token):
+        return self.client.get(reverse('habits:habit-list'), HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def user_queries(self, token):
+        """
+        Количество запросов к таблице пользователей при одном запросе к API.
+        """
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_habits(token)
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_200_OK
+        )
+        return len([query for query in queries if 'FROM "users_user"' in query['sql']])
+
+    def test_user_cached(self):
+        """
+        Тест, что пользователь загружается из базы только при первом запросе.
+        """
+
+        token = self.obtain_token()
+
+        self.assertEqual(self.user_queries(token), 1)
+        self.assertEqual(self.user_queries(token), 0)
+
+        # без локального кэша пользователь берется из общего кэша
+        local_cache.clear()
+        self.assertEqual(self.user_queries(token), 0)
+
+    def test_password_change(self):
+        """
+        Тест, что после смены пароля старые токены отклоняются.
+        """
+
+        token = self.obtain_token()
+        self.get_habits(token)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new')
+        user.save()
+
+        self.assertEqual(
+            self.get_habits(token).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+        self.assertEqual(
+            self.get_habits(self.obtain_token('new')).status_code,
+            status.HTTP_200_OK
+        )
+
+    def test_deactivation(self):
+        """
+        Тест, что деактивированный пользователь не проходит аутентификацию по закэшированной записи.
+        """
+
+        token = self.obtain_token()
+        self.get_habits(token)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+
+        self.assertEqual(
+            self.get_habits(token).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_stats(self):
+        """
+        Тест подсчета попаданий в кэш пользователей.
+        """
+
+        stats.flush()
+        before = stats.summary()
+        token = self.obtain_token()
+        for _ in range(3):
+            self.get_habits(token)
+        stats.flush()
+        after = stats.summary()
+
+        self.assertEqual(after['miss'] - before['miss'], 1)
+        self.assertEqual(after['local_hit'] - before['local_hit'], 2)
+
+    def test_local_cache_copies(self):
+        """
+        Тест, что запросы получают из локального кэша разные копии пользователя.
+        """
+
+        token = self.obtain_token()
+        self.get_habits(token)
+        key, (cached, _) = next(iter(local_cache.entries.items()))
+
+        user = local_cache.get(key)
+        user.first_name = 'изменено'
+        user._state.fields_cache['marker'] = True
+
+        other = local_cache.get(key)
+        self.assertIsNot(user, other)
+        self.assertIsNot(other, cached)
+        self.assertEqual(other.first_name, '')
+        self.assertNotIn('marker', other._state.fields_cache)
@@ -0,0 +1,23 @@
+from functools import lru_cache
+from zoneinfo import available_timezones
+
+from django.core.exceptions import ValidationError
+
+
+@lru_cache(maxsize=None)
+def known_timezones():
+    """
+    Часовые пояса IANA. available_timezones() обходит каталоги базы часовых поясов, поэтому список
+    собирается один раз на процесс.
+    """
+
+    return frozenset(available_timezones())
+
+
+def validate_timezone(value):
+    """
+    Проверка, что часовой пояс есть в базе часовых поясов IANA.
+    """
+
+    if value not in known_timezones():
+        raise ValidationError(f'Неизвестный часовой пояс {value}.')